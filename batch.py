@@ -0,0 +1,229 @@
+import os
+import glob
+import json
+import time
+import argparse
+import hashlib
+from datetime import datetime, timezone
+
+
+def find_pdfs(inputs):
+    """
+    Expands directories and glob patterns into the list of PDF files to process.
+
+    Args:
+        inputs (list): Directories (every PDF inside them), glob patterns or PDF paths.
+
+    Returns:
+        list: Sorted, unique paths of the PDF files.
+    """
+    paths = set()
+    for entry in inputs:
+        if os.path.isdir(entry):
+            paths.update(os.path.join(entry, name) for name in os.listdir(entry) if name.lower().endswith(".pdf"))
+        else:
+            paths.update(path for path in glob.glob(entry) if path.lower().endswith(".pdf"))
+    return sorted({os.path.normpath(path) for path in paths})
+
+
+def input_names(paths):
+    """
+    Names the input PDFs by their path relative to the deepest directory containing all of them, so files with
+    the same name in different directories keep distinct manifest entries and briefings.
+
+    Args:
+        paths (list): Paths of the PDF files.
+
+    Returns:
+        dict: Path mapped to its name, e.g. "2024/paper.pdf", or just "paper.pdf" when all share a directory.
+    """
+    if not paths:
+        return {}
+    root = os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in paths])
+    return {path: os.path.relpath(os.path.abspath(path), root).replace(os.sep, "/") for path in paths}
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _write_atomic(path, text):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+class BatchManifest:
+    """
+    Summary of a batch directory: one entry per input PDF with its status, latency, token usage and the
+    fingerprints used to decide whether its briefing is up to date. Saved after every file, so an interrupted
+    batch keeps the results it already has.
+
+    Attributes:
+        path (str): JSON file of the manifest.
+        entries (dict): Input name (see `input_names`) mapped to its entry.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        if os.path.isfile(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f).get("files", {})
+
+    def is_up_to_date(self, name, input_sha256, config_hash, output_path):
+        entry = self.entries.get(name)
+        return (
+            entry is not None
+            and entry["status"] == "ok"
+            and entry["input_sha256"] == input_sha256
+            and entry["config_hash"] == config_hash
+            and os.path.isfile(output_path)
+        )
+
+    def update(self, name, **entry):
+        self.entries[name] = entry
+        _write_atomic(self.path, json.dumps({"files": self.entries}, indent=2, ensure_ascii=False))
+
+
+def run_batch(controller, inputs, output_dir, workers=4, user_topic='', force=False,
+              requests_per_minute=None, tokens_per_minute=None, row_timeout=None):
+    """
+    Generates the evidence briefing of every PDF in `inputs`, writing each one to `output_dir` as soon as it is ready.
+
+    PDFs are parsed by the process pool of the controller's `DataLoader` while the briefings are generated by an
+    `EvalRunner` thread pool, within the given rate limits and with retries. Inputs whose briefing was already
+    generated from the same file content and configuration are skipped.
+
+    Args:
+        controller (Controller): Controller used to generate the briefings.
+        inputs (list): Directories, glob patterns or PDF paths.
+        output_dir (str): Directory of the briefings ("<name>.md", in the subdirectories of the inputs when they
+                          come from several directories) and of "manifest.json".
+        workers (int, optional): Number of briefings generated concurrently. Default is 4.
+        user_topic (str, optional): Custom topic used to refine the retrieved context.
+        force (bool, optional): Regenerate every briefing, even the up-to-date ones. Default is False.
+        requests_per_minute (float, optional): Request budget per minute. Default is no limit.
+        tokens_per_minute (float, optional): Token budget per minute. Default is no limit.
+        row_timeout (float, optional): Time limit per paper in seconds, retries included. Default is no limit.
+
+    Returns:
+        dict: Number of 'ok', 'skipped' and 'failed' inputs, and the total 'seconds'.
+    """
+    from eval_runner import EvalRunner
+    from run_log import text_hash
+
+    start = time.perf_counter()
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = BatchManifest(os.path.join(output_dir, "manifest.json"))
+    controller.vector_db.vectorstore  # syncs the index, so its version is known
+    # the evaluation run description, plus the options that only change the briefings generated here
+    config_hash = text_hash(json.dumps({
+        **controller.eval_run_config(user_topic, []),
+        'token_budget': controller.token_budget,
+        'completion_tokens': controller.completion_tokens,
+        'pdf_parser': controller.data_loader.parser_version,
+        'max_paper_tokens': controller.max_paper_tokens,
+    }, sort_keys=True))
+
+    stats = {"ok": 0, "skipped": 0, "failed": 0}
+    todo = {}
+    for path, name in input_names(find_pdfs(inputs)).items():
+        output_path = os.path.join(output_dir, *(os.path.splitext(name)[0] + ".md").split("/"))
+        input_sha256 = _file_sha256(path)
+        if not force and manifest.is_up_to_date(name, input_sha256, config_hash, output_path):
+            stats["skipped"] += 1
+            continue
+        todo[path] = (name, output_path, input_sha256)
+    print(f"{len(todo)} artigos para processar, {stats['skipped']} já atualizados em '{output_dir}'.")
+
+    def generate(item):
+        path, pages = item
+        token_report = {}
+        started = time.perf_counter()
+        briefing = controller.process(user_topic=user_topic, paper_content=" ".join(pages), token_report=token_report)
+        return briefing, token_report, time.perf_counter() - started
+
+    def finished_at():
+        return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+    runner = EvalRunner(
+        max_workers=workers,
+        requests_per_minute=requests_per_minute,
+        tokens_per_minute=tokens_per_minute,
+        row_timeout=row_timeout,
+        request_level=True
+    )
+    data_loader = controller.data_loader
+    for _, (path, _), result, error in runner.run_iter(generate, data_loader.iter_pdfs(list(todo))):
+        name, output_path, input_sha256 = todo[path]
+        if error is not None:
+            print(f"Aviso: Falha ao gerar o briefing de '{name}': {error}")
+            manifest.update(name, status="failed", error=str(error), input_sha256=input_sha256,
+                            config_hash=config_hash, finished_at=finished_at())
+            stats["failed"] += 1
+            continue
+        briefing, token_report, latency = result
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        _write_atomic(output_path, briefing)
+        manifest.update(name, status="ok", output=os.path.splitext(name)[0] + ".md", latency=round(latency, 3),
+                        tokens=token_report, input_sha256=input_sha256, config_hash=config_hash,
+                        finished_at=finished_at())
+        stats["ok"] += 1
+        print(f"[{stats['ok'] + stats['failed']}/{len(todo)}] {name} ({latency:.1f} s)")
+
+    for path, message in data_loader.errors.items():
+        if path in todo:
+            name, _, input_sha256 = todo[path]
+            manifest.update(name, status="failed", error=message, input_sha256=input_sha256,
+                            config_hash=config_hash, finished_at=finished_at())
+            stats["failed"] += 1
+
+    stats["seconds"] = time.perf_counter() - start
+    return stats
+
+
+def main(argv=None):
+    import config
+    from resources import get_configured_controller
+
+    parser = argparse.ArgumentParser(description="Gera Evidence Briefings em lote a partir de um diretório de artigos.")
+    parser.add_argument("inputs", nargs="+", help="diretórios, padrões glob (ex.: 'files/*.pdf') ou arquivos PDF")
+    parser.add_argument("-o", "--output-dir", default="batch_output", help="diretório dos briefings gerados")
+    parser.add_argument("-w", "--workers", type=int, default=config.eval_max_workers,
+                        help="briefings gerados em paralelo")
+    parser.add_argument("--user-topic", default="", help="tópico para refinar o contexto recuperado")
+    parser.add_argument("--force", action="store_true", help="regera também os briefings já atualizados")
+    parser.add_argument("--fake-model", action="store_true", help="usa o FakeChatModel (sem chamadas à API)")
+    parser.add_argument("--refresh-cache", action="store_true",
+                        help="ignora as respostas em cache e as substitui por novas")
+    args = parser.parse_args(argv)
+
+    overrides = {}
+    if args.fake_model:
+        from fake_model import FakeChatModel
+        overrides["chat_model"] = FakeChatModel()
+    if args.refresh_cache:
+        overrides["refresh_cache"] = True
+    controller = get_configured_controller(**overrides)
+    stats = run_batch(
+        controller, args.inputs, args.output_dir,
+        workers=args.workers,
+        user_topic=args.user_topic,
+        force=args.force,
+        requests_per_minute=config.eval_requests_per_minute,
+        tokens_per_minute=config.eval_tokens_per_minute,
+        row_timeout=config.eval_row_timeout
+    )
+    print(f"Concluído em {stats['seconds']:.1f} s: {stats['ok']} gerados, {stats['skipped']} ignorados (atualizados), "
+          f"{stats['failed']} com falha. Resumo em '{os.path.join(args.output_dir, 'manifest.json')}'.")
+    return 1 if stats["failed"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
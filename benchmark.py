@@ -0,0 +1,468 @@
+import os
+import json
+import time
+import random
+import argparse
+import tempfile
+import platform
+import tracemalloc
+from contextlib import contextmanager
+
+# words of the synthetic papers and briefings; topics of the briefings share them, so retrieval has matches
+VOCABULARY = (
+    "software engineering requirements testing developers agile scrum team project process quality defect "
+    "prediction model study survey interview practitioners evidence results findings analysis data metrics "
+    "code review maintenance architecture design pattern tool support industry academic students teaching "
+    "learning experiment participants effort estimation productivity continuous integration deployment "
+    "open source repository issue tracker commit smell refactoring technical debt performance security "
+    "usability user stories specification validation verification systematic mapping literature review "
+    "case study framework approach evaluation benchmark accuracy precision recall baseline dataset "
+    "empirical qualitative quantitative method practice challenge benefit risk cost time communication "
+    "collaboration knowledge product line configuration variability microservices cloud mobile game"
+).split()
+
+# headings recognized by `chunking.BRIEFING_SECTIONS`
+BRIEFING_HEADINGS = (
+    "Main Findings",
+    "Who is this briefing for?",
+    "Where the findings come from?",
+    "What is included in this briefing?",
+    "What is not included in this briefing?",
+)
+
+def synthetic_text(rng, words):
+    """
+    Returns `words` random words of `VOCABULARY`, in sentences of 8 to 20 words.
+    """
+    sentences, remaining = [], words
+    while remaining > 0:
+        length = min(remaining, rng.randint(8, 20))
+        sentence = " ".join(rng.choice(VOCABULARY) for _ in range(length))
+        sentences.append(sentence[0].upper() + sentence[1:] + ".")
+        remaining -= length
+    return " ".join(sentences)
+
+
+def _escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pdf(path, pages, line_width=90, line_height=12):
+    """
+    Writes a minimal PDF with one text page per entry of `pages`, in the standard Helvetica font.
+
+    Args:
+        path (str): Path of the PDF file.
+        pages (list): ASCII text of each page, wrapped at `line_width` characters.
+        line_width (int, optional): Maximum characters per line. Default is 90.
+        line_height (int, optional): Distance between lines in points. Default is 12.
+    """
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for text in pages:
+        lines, current = [], ""
+        for word in text.split():
+            if current and len(current) + 1 + len(word) > line_width:
+                lines.append(current)
+                current = word
+            else:
+                current = f"{current} {word}" if current else word
+        if current:
+            lines.append(current)
+        stream = f"BT /F1 10 Tf {line_height} TL 50 800 Td " + " ".join(f"({_escape(line)}) '" for line in lines) + " ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Resources << /Font << /F1 3 0 R >> >> "
+            f"/Contents {len(objects)} 0 R >>"
+        )
+        page_ids.append(len(objects))
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(f'{page_id} 0 R' for page_id in page_ids)}] /Count {len(page_ids)} >>"
+
+    content = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(content))
+        content += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(content)
+    content += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    content += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode("latin-1")
+    content += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    with open(path, "wb") as f:
+        f.write(content)
+
+
+def make_corpus(directory, papers=8, pages=6, words_per_page=350, briefing_words=400, seed=0):
+    """
+    Creates a synthetic corpus laid out like the real one: the human-made briefings in "briefings" (indexed for
+    retrieval) and the evaluation pairs in "briefings/x" (papers) and "briefings/y" (briefings of the same name).
+
+    Args:
+        directory (str): Root directory of the corpus.
+        papers (int, optional): Number of paper/briefing pairs. Default is 8.
+        pages (int, optional): Pages per paper. Default is 6.
+        words_per_page (int, optional): Words per paper page. Default is 350.
+        briefing_words (int, optional): Words per briefing, split among its sections. Default is 400.
+        seed (int, optional): Seed of the random text. Default is 0.
+
+    Returns:
+        list: Paths of the synthetic papers.
+    """
+    rng = random.Random(seed)
+    for folder in ("briefings", os.path.join("briefings", "x"), os.path.join("briefings", "y")):
+        os.makedirs(os.path.join(directory, folder), exist_ok=True)
+    section_words = max(1, briefing_words // (len(BRIEFING_HEADINGS) + 1))
+    paper_paths = []
+    for index in range(papers):
+        name = f"paper-{index:04d}.pdf"
+        paper_path = os.path.join(directory, "briefings", "x", name)
+        write_pdf(paper_path, [synthetic_text(rng, words_per_page) for _ in range(pages)])
+        paper_paths.append(paper_path)
+        briefing = [f"Evidence Briefing {index}. " + synthetic_text(rng, section_words)]
+        briefing += [f"{heading} " + synthetic_text(rng, section_words) for heading in BRIEFING_HEADINGS]
+        # two pages, like the real briefings
+        middle = len(briefing) // 2
+        briefing_pages = [" ".join(briefing[:middle]), " ".join(briefing[middle:])]
+        write_pdf(os.path.join(directory, "briefings", "y", name), briefing_pages)
+        write_pdf(os.path.join(directory, "briefings", name), briefing_pages)
+    return paper_paths
+
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    if not values:
+        return None
+    position = fraction * (len(values) - 1)
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+DEFAULT_BASELINE = "benchmark_baseline.json"
+
+
+class StageRecorder:
+    """
+    Measures the stages of a benchmark run: wall-clock time, throughput and per-item latency, or peak memory.
+
+    Tracing allocations slows Python code down, so a recorder measures either time or memory: with
+    `trace_memory`, the memory peak is the largest amount traced by `tracemalloc` during the stage, above what
+    was allocated when the stage started, and the times are not meaningful.
+
+    Attributes:
+        stages (dict): Stage name mapped to its results.
+        trace_memory (bool): Measure the memory peak of the stages, which must run while `tracemalloc` traces.
+    """
+
+    def __init__(self, trace_memory=False):
+        self.stages = {}
+        self.trace_memory = trace_memory
+
+    @contextmanager
+    def stage(self, name, unit):
+        """
+        Measures the enclosed block. The block receives a dict in which it sets 'items' (the number of `unit`
+        processed) and, optionally, 'latencies' (the seconds taken by each item).
+
+        Args:
+            name (str): Name of the stage.
+            unit (str): What the throughput counts, e.g. "pages" or "papers".
+        """
+        record = {"items": 0, "latencies": []}
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            baseline_memory = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        yield record
+        seconds = time.perf_counter() - start
+        self.stages[name] = {
+            "seconds": seconds,
+            "items": record["items"],
+            "unit": unit,
+            "throughput": record["items"] / seconds if seconds > 0 else None,
+            "peak_mib": None,
+        }
+        self.set_latencies(name, record["latencies"])
+        if self.trace_memory:
+            self.stages[name]["peak_mib"] = (tracemalloc.get_traced_memory()[1] - baseline_memory) / (1 << 20)
+            print(f"{name:<13} {self.stages[name]['peak_mib']:>8.1f} MiB", flush=True)
+        else:
+            print(f"{name:<13} {seconds:>8.2f} s", flush=True)
+
+    def set_latencies(self, name, latencies):
+        """
+        Sets the p50 and p95 latency of a recorded stage from the seconds taken by each of its items.
+        """
+        self.stages[name]["p50_ms"] = None if not latencies else 1000 * _percentile(latencies, 0.5)
+        self.stages[name]["p95_ms"] = None if not latencies else 1000 * _percentile(latencies, 0.95)
+
+    @staticmethod
+    def timed(record, function, *args, **kwargs):
+        """
+        Calls `function` and appends its duration to the latencies of `record`.
+        """
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        record["latencies"].append(time.perf_counter() - start)
+        return result
+
+
+def run_benchmark(papers=8, pages=6, words_per_page=350, briefing_words=400, latency=0.05, workers=4,
+                  queries=20, seed=0, vector_store="numpy", metrics=None, memory=True, workdir=None):
+    """
+    Runs the real ingestion, indexing, retrieval, prompt, generation and scoring code paths on a synthetic corpus,
+    fully offline: embeddings use the "hashing" backend and the briefings come from a `FakeChatModel`.
+
+    The stages are timed without tracing allocations. Their memory peaks are measured by a second pass over a
+    new copy of the corpus, traced by `tracemalloc`. Each pass happens in a subdirectory of `workdir` (a new
+    temporary directory by default), so every cache, index and log starts empty and nothing outside it is touched.
+
+    Args:
+        papers (int, optional): Number of synthetic paper/briefing pairs. Default is 8.
+        pages (int, optional): Pages per paper. Default is 6.
+        words_per_page (int, optional): Words per paper page. Default is 350.
+        briefing_words (int, optional): Words per synthetic briefing. Default is 400.
+        latency (float, optional): Seconds each fake model call takes. Default is 0.05.
+        workers (int, optional): Concurrent requests of `process_eval`. Default is 4.
+        queries (int, optional): Distinct retrieval queries. Default is 20.
+        seed (int, optional): Seed of the synthetic corpus. Default is 0.
+        vector_store (str, optional): Vector store of the index, "numpy" or "chroma". Default is "numpy".
+        metrics (tuple, optional): Metrics computed by the scoring stages. Default is ROUGE, BLEU and METEOR.
+        memory (bool, optional): Run the memory pass. Without it, 'peak_mib' is None. Default is True.
+        workdir (str, optional): Directory of the run. Default is a new temporary directory.
+
+    Returns:
+        dict: 'params' of the run, 'environment' and per-stage results in 'stages' ('seconds', 'items',
+              'unit', 'throughput', 'p50_ms', 'p95_ms' and 'peak_mib').
+    """
+    from metrics import DEFAULT_METRICS
+
+    metrics = tuple(metrics or DEFAULT_METRICS)
+    params = {
+        "papers": papers, "pages": pages, "words_per_page": words_per_page, "briefing_words": briefing_words,
+        "latency": latency, "workers": workers, "queries": queries, "seed": seed, "vector_store": vector_store,
+        "metrics": list(metrics),
+    }
+    workdir = workdir or tempfile.mkdtemp(prefix="briefing-bench-")
+    stages = _run_stages(os.path.join(workdir, "time"), StageRecorder(), papers, pages, words_per_page,
+                         briefing_words, latency, workers, queries, seed, vector_store, metrics)
+    if memory:
+        print("Medindo a memória de cada etapa (tracemalloc)...", flush=True)
+        memory_stages = _run_stages(os.path.join(workdir, "memory"), StageRecorder(trace_memory=True), papers, pages,
+                                    words_per_page, briefing_words, latency, workers, queries, seed, vector_store,
+                                    metrics)
+        for name, stage in stages.items():
+            stage["peak_mib"] = memory_stages[name]["peak_mib"]
+
+    return {
+        "params": params,
+        "environment": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "stages": stages,
+    }
+
+
+def _run_stages(workdir, recorder, papers, pages, words_per_page, briefing_words, latency, workers, queries, seed,
+                vector_store, metrics):
+    import config
+    from controller import Controller
+    from data_loader import DataLoader
+    from evaluator import Evaluator
+    from fake_model import FakeChatModel
+    from prompter import Prompter
+
+    previous_directory = os.getcwd()
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+    if recorder.trace_memory:
+        tracemalloc.start()
+    try:
+        paper_paths = make_corpus(".", papers, pages, words_per_page, briefing_words, seed)
+        # an absolute path keeps the retriever of each pass apart in the process-wide resources
+        controller = Controller(
+            os.path.abspath("briefings"), "hashing", "fake", None, config.topics, config.topics_chunk_size,
+            chat_model=FakeChatModel(latency=latency),
+            token_budget=config.token_budget,
+            completion_tokens=config.completion_tokens,
+            topics_priority=config.topics_priority,
+            embedding_backend="hashing",
+            vector_store=vector_store,
+            index_chunk_size=config.index_chunk_size
+        )
+
+        with recorder.stage("ingest", "pages") as record:
+            data_loader = DataLoader(cache_dir=None)
+            paper_pages = [recorder.timed(record, data_loader.load_single_pdf, path) for path in paper_paths]
+            record["items"] = sum(len(paper) for paper in paper_pages)
+
+        with recorder.stage("index", "chunks") as record:
+            record["items"] = controller.vector_db.vectorstore.count()
+
+        rng = random.Random(seed)
+        user_topics = [" ".join(rng.choice(VOCABULARY) for _ in range(3)) for _ in range(queries)]
+        with recorder.stage("retrieve", "queries") as record:
+            contexts = [
+                recorder.timed(record, controller.vector_db.get_context_by_topic,
+                               controller.topics, controller.topics_chunk_size, user_topic)
+                for user_topic in user_topics
+            ]
+            record["items"] = len(contexts)
+
+        with recorder.stage("prompt", "papers") as record:
+            for index, paper in enumerate(paper_pages):
+                recorder.timed(record, Prompter.build_messages, contexts[index % len(contexts)], " ".join(paper),
+                               controller.token_budget, completion_tokens=controller.completion_tokens,
+                               priority=controller.topics_priority, model_name="gpt-4o-mini")
+            record["items"] = len(paper_pages)
+
+        with recorder.stage("process", "papers") as record:
+            for paper in paper_pages:
+                recorder.timed(record, controller.process, paper_content=" ".join(paper))
+            record["items"] = len(paper_pages)
+
+        with recorder.stage("process_eval", "papers") as record:
+            results_df, aggregated_scores = controller.process_eval(max_workers=workers, metrics=metrics, trace=False)
+            record["items"] = len(results_df)
+            record["latencies"] = results_df['latency'].dropna().tolist() if len(results_df) else []
+        # regression check: every pair must be generated and scored, not only timed
+        if len(results_df) != papers or len(aggregated_scores) != len(metrics):
+            raise RuntimeError(f"process_eval scored {len(results_df)} of {papers} pairs "
+                               f"with {len(aggregated_scores)} of {len(metrics)} metrics")
+
+        import pandas as pd
+
+        evaluator = Evaluator(metrics)
+        references = {row['id']: row['brief'] for row in evaluator.iter_eval_dataset()}
+        scored_df = pd.DataFrame({
+            'brief': [references[row_id] for row_id in results_df['id']],
+            'generated_brief': results_df['generated_brief'],
+        })
+        with recorder.stage("evaluate", "papers") as record:
+            evaluator.evaluate(scored_df)
+            record["items"] = len(scored_df)
+        # the batch above scores the pairs together; the latency is that of scoring one pair, as process_eval does
+        if not recorder.trace_memory:
+            latencies = {"latencies": []}
+            for generated_brief, brief in zip(scored_df['generated_brief'], scored_df['brief']):
+                brief = brief if isinstance(brief, str) else " ".join(brief)
+                recorder.timed(latencies, evaluator.score_row, generated_brief, brief)
+            recorder.set_latencies("evaluate", latencies["latencies"])
+    finally:
+        if recorder.trace_memory:
+            tracemalloc.stop()
+        os.chdir(previous_directory)
+    return recorder.stages
+
+
+def compare(results, baseline, threshold=0.2, min_latency_ms=1.0, min_memory_mib=1.0):
+    """
+    Compares a benchmark run with a baseline run.
+
+    A stage regresses when its p50 or p95 latency or its peak memory grew, or its throughput dropped, by more
+    than `threshold`. Latency and memory differences below `min_latency_ms` and `min_memory_mib` are ignored,
+    being within the noise of a run.
+
+    Args:
+        results (dict): Results of `run_benchmark`.
+        baseline (dict): Results of an earlier `run_benchmark`, with the same parameters.
+        threshold (float, optional): Tolerated relative change. Default is 0.2 (20%).
+        min_latency_ms (float, optional): Smallest latency increase reported. Default is 1 ms.
+        min_memory_mib (float, optional): Smallest memory increase reported. Default is 1 MiB.
+
+    Returns:
+        list: One message per regression; empty if there is none.
+    """
+    regressions = []
+    for name, stage in results["stages"].items():
+        reference = baseline.get("stages", {}).get(name)
+        if reference is None:
+            continue
+        for key, floor in (("p50_ms", min_latency_ms), ("p95_ms", min_latency_ms), ("peak_mib", min_memory_mib)):
+            value, expected = stage.get(key), reference.get(key)
+            if value is None or expected is None:
+                continue
+            if value > expected * (1 + threshold) and value - expected > floor:
+                regressions.append(f"{name}.{key}: {expected:.2f} -> {value:.2f} (+{100 * (value / expected - 1):.0f}%)"
+                                   if expected else f"{name}.{key}: {expected:.2f} -> {value:.2f}")
+        value, expected = stage.get("throughput"), reference.get("throughput")
+        if value is not None and expected and value < expected * (1 - threshold):
+            regressions.append(f"{name}.throughput: {expected:.2f} -> {value:.2f} {stage['unit']}/s "
+                               f"({100 * (value / expected - 1):.0f}%)")
+    return regressions
+
+
+def format_results(results):
+    """
+    Formats the per-stage results as a table.
+    """
+    lines = [
+        f"{'etapa':<13} {'itens':>7} {'vazão':>16} {'p50 ms':>9} {'p95 ms':>9} {'pico MiB':>9}",
+    ]
+    for name, stage in results["stages"].items():
+        throughput = "-" if stage["throughput"] is None else f"{stage['throughput']:.1f} {stage['unit']}/s"
+        p50 = "-" if stage["p50_ms"] is None else f"{stage['p50_ms']:.1f}"
+        p95 = "-" if stage["p95_ms"] is None else f"{stage['p95_ms']:.1f}"
+        peak = "-" if stage["peak_mib"] is None else f"{stage['peak_mib']:.1f}"
+        lines.append(f"{name:<13} {stage['items']:>7} {throughput:>16} {p50:>9} {p95:>9} {peak:>9}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark offline do pipeline de geração de Evidence Briefings.")
+    parser.add_argument("--papers", type=int, default=8, help="pares artigo/briefing sintéticos")
+    parser.add_argument("--pages", type=int, default=6, help="páginas por artigo")
+    parser.add_argument("--words-per-page", type=int, default=350, help="palavras por página de artigo")
+    parser.add_argument("--briefing-words", type=int, default=400, help="palavras por briefing")
+    parser.add_argument("--latency", type=float, default=0.05, help="segundos por chamada ao modelo falso")
+    parser.add_argument("--workers", type=int, default=4, help="requisições paralelas do process_eval")
+    parser.add_argument("--queries", type=int, default=20, help="consultas distintas de recuperação")
+    parser.add_argument("--seed", type=int, default=0, help="semente do corpus sintético")
+    parser.add_argument("--vector-store", default="numpy", help="'numpy' ou 'chroma'")
+    parser.add_argument("--workdir", help="diretório da execução (padrão: diretório temporário novo)")
+    parser.add_argument("-o", "--output", default="benchmark_results.json", help="arquivo JSON dos resultados")
+    parser.add_argument("--baseline", help="resultados de referência (JSON) para detectar regressões")
+    parser.add_argument("--threshold", type=float, default=0.2, help="variação relativa tolerada (padrão: 0.2)")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help=f"salva os resultados também como baseline (em --baseline ou, sem ela, em {DEFAULT_BASELINE})")
+    parser.add_argument("--no-memory", action="store_true",
+                        help="não mede a memória das etapas (dispensa a segunda passada, com tracemalloc)")
+    parser.add_argument("--smoke", action="store_true",
+                        help="verificação rápida: corpus mínimo, sem latência e sem baseline; falha se alguma etapa quebrar")
+    args = parser.parse_args(argv)
+    if args.smoke:
+        args.papers, args.pages, args.queries, args.latency = 2, 1, 2, 0.0
+        args.baseline, args.save_baseline, args.no_memory = None, False, True
+    if args.save_baseline and not args.baseline:
+        args.baseline = DEFAULT_BASELINE
+
+    results = run_benchmark(
+        papers=args.papers, pages=args.pages, words_per_page=args.words_per_page,
+        briefing_words=args.briefing_words, latency=args.latency, workers=args.workers, queries=args.queries,
+        seed=args.seed, vector_store=args.vector_store, memory=not args.no_memory, workdir=args.workdir
+    )
+    print(format_results(results))
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Resultados salvos em: {args.output}")
+
+    if not args.baseline:
+        return 0
+    if args.save_baseline or not os.path.isfile(args.baseline):
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline salvo em: {args.baseline}")
+        return 0
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get("params") != results["params"]:
+        print("Aviso: Os parâmetros diferem dos do baseline; a comparação pode não ser significativa.")
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print(f"Regressões acima de {100 * args.threshold:.0f}% em relação a '{args.baseline}':")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    print(f"Nenhuma regressão acima de {100 * args.threshold:.0f}% em relação a '{args.baseline}'.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
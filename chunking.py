@@ -0,0 +1,94 @@
+import re
+from functools import lru_cache
+
+INTRO_SECTION = "Intro"
+
+# headings of the Evidence Briefings, in document order, with the patterns that recognize them; the text before the
+# first heading is the intro. The patterns match on the structure of the headings rather than on their exact words,
+# because the PDF text extraction garbles letters ("Who is this briefin  or?", "Where the fidiins come  rom?"),
+# and they cover the Portuguese briefings too.
+_TAIL = r"[\w-]+(?:\s+[\w-]+)?\s*\?"
+BRIEFING_SECTIONS = {
+    "Main Findings": (r"Main\s+Findings", r"MAIN\s+FINDINGS", r"FINDINGS"),
+    "Who is this briefing for": (r"Wh\w\s+is\s+this\s+" + _TAIL, r"Para\s+quem\s+\S+\s+\S+\s+" + _TAIL),
+    "Where the findings come from": (
+        r"Where\s+(?:do\s+)?the\s+\S+\s+c\w+\s+\w*\s*\?",
+        r"De\s+\w+\s+v\S*\s+os\s+\w+\s*\?",
+    ),
+    "What is not included in this briefing": (
+        r"What\s+is\s+\w{2,3}\s+\w+\s+\w+\s+this\s+" + _TAIL,
+        r"O\s+que\s+\S+\s+est\S*\s+\S+\s+\S+\s+" + _TAIL,
+    ),
+    "What is included in this briefing": (
+        r"What\s+is\s+\w+\s+\w+\s+this\s+" + _TAIL,
+        r"O\s+que\s+est\S*\s+\S+\s+\S+\s+" + _TAIL,
+    ),
+}
+
+
+@lru_cache(maxsize=None)
+def get_splitter(chunk_size):
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    return RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=0)
+
+
+@lru_cache(maxsize=None)
+def _heading_pattern(sections):
+    alternatives = [
+        f"(?P<s{index}>{'|'.join(patterns)})" for index, (_, patterns) in enumerate(sections)
+    ]
+    return re.compile(r"(?<!\w)(?:" + "|".join(alternatives) + r")(?!\w)")
+
+
+def split_sections(pages, sections=BRIEFING_SECTIONS):
+    """
+    Splits the pages of a briefing at its section headings.
+
+    Args:
+        pages (list): Page texts of the briefing.
+        sections (dict, optional): Section name mapped to the regular expressions of its heading.
+                                   Default is `BRIEFING_SECTIONS`.
+
+    Yields:
+        tuple: (page number, section, text) for each non-empty piece of a page, in document order.
+               Text before the first heading belongs to `INTRO_SECTION`.
+    """
+    pattern = _heading_pattern(tuple((name, tuple(patterns)) for name, patterns in sections.items()))
+    names = list(sections)
+    current = INTRO_SECTION
+    for page_number, text in enumerate(pages):
+        position = 0
+        for match in pattern.finditer(text):
+            segment = text[position:match.start()].strip()
+            if segment:
+                yield page_number, current, segment
+            current = names[int(match.lastgroup[1:])]
+            position = match.end()
+        segment = text[position:].strip()
+        if segment:
+            yield page_number, current, segment
+
+
+def chunk_pages(pages, chunk_size=1000, sections=BRIEFING_SECTIONS):
+    """
+    Cuts a briefing into chunks that never cross a section heading, each tagged with its section.
+
+    Args:
+        pages (list): Page texts of the briefing.
+        chunk_size (int, optional): Maximum size of a chunk in characters. Default is 1000.
+        sections (dict, optional): Section name mapped to the regular expressions of its heading.
+                                   Default is `BRIEFING_SECTIONS`.
+
+    Returns:
+        list: Dicts with the 'page', its 'section', the 'index' of the chunk within its page and the chunk 'text'.
+    """
+    splitter = get_splitter(chunk_size)
+    chunks = []
+    index_in_page = {}
+    for page_number, section, segment in split_sections(pages, sections):
+        for text in splitter.split_text(segment):
+            index = index_in_page.get(page_number, 0)
+            index_in_page[page_number] = index + 1
+            chunks.append({"page": page_number, "section": section, "index": index, "text": text})
+    return chunks
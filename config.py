@@ -0,0 +1,103 @@
+import os
+from dotenv import load_dotenv
+
+## human made evidence briefings path ##
+directory_path = "briefings"
+## embedding model ##
+embedding_model = "all-MiniLM-L6-v2"
+## embedding backend on CPU: "torch" (full precision), "onnx" or "int8" (quantized ONNX); changing it rebuilds the index ##
+## compare them with `python embeddings.py` ##
+embedding_backend = "torch"
+embedding_batch_size = 64
+embedding_threads = None
+## maximum size in characters of the chunks cut at index time; changing it rebuilds the index ##
+index_chunk_size = 1000
+## vector store of the index: "chroma" or "numpy" (exact search over a memory-mapped matrix); changing it rebuilds the index ##
+vector_store = "chroma"
+## retrieval of the context: "dense" (embeddings), "bm25" (lexical index, no embedding) or "hybrid" ##
+## (BM25 candidates re-ranked by their embeddings, fused by reciprocal rank); compare them with `python retriever.py` ##
+retrieval_mode = "dense"
+## PDF text extraction: "langchain" (original PyPDFLoader), "pypdf" (same parser, page by page, no splitting) ##
+## or "pymupdf" (native MuPDF parser, fastest; needs `pip install pymupdf`); compare them with `python data_loader.py` ##
+pdf_backend = "pypdf"
+## stop extracting an uploaded paper once it reaches this many tokens (None: whole paper, long ones are summarized by section) ##
+max_paper_tokens = None
+## briefing generation: "single" (one request writes the whole briefing) or "sections" (one concurrent request per ##
+## element, each with the context of its own topics, joined in order); compare them with `python sweep.py --generation-modes single,sections` ##
+generation_mode = "single"
+## openai model name ##
+openai_model_name = "gpt-4o-mini"
+## temperature of the chat model ##
+temperature = 0.5
+## chat model backend: "openai" (API) or "local" (small instruct model on CPU with transformers, runs offline) ##
+## compare their throughput with `python local_model.py` ##
+chat_backend = "openai"
+local_model_name = "Qwen/Qwen2.5-0.5B-Instruct"
+## requests generated together by the local model, and its CPU threads (None: PyTorch default) ##
+local_batch_size = 4
+local_threads = None
+topics = [
+    "Intro",
+    "Main Findings",
+    "Who is this briefing for",
+    "Where the findings come from",
+    "What is included in this briefing",
+    "What is not included in this briefing"
+]
+## characters of retrieved context for each topic (topics named after a briefing section only search that section) ##
+topics_chunk_size = [
+    300,
+    4000,
+    200,
+    300,
+    300,
+    300
+]
+## topics from most to least important, used when the context must be trimmed ##
+topics_priority = [
+    "Main Findings",
+    "Intro",
+    "Who is this briefing for",
+    "Where the findings come from",
+    "What is included in this briefing",
+    "What is not included in this briefing"
+]
+## token budget of a request (prompt + answer) and tokens reserved for the answer ##
+token_budget = 16000
+completion_tokens = 1500
+
+## evaluation concurrency and rate limits ##
+eval_max_workers = 4
+eval_requests_per_minute = 500
+eval_tokens_per_minute = 200000
+eval_row_timeout = 300
+## time limit of one OpenAI request in seconds and retries made by the client itself (none during evaluations, ##
+## batches and sweeps, whose runner retries the requests within its rate limits) ##
+request_timeout = 120
+request_max_retries = 2
+## evaluation metrics, by name in `metrics.registry` (offline: "rouge", "bleu", "meteor"; hub: "evaluate:<name>") ##
+eval_metrics = ("rouge", "bleu", "meteor")
+## persistent cache of model responses (None disables it) ##
+response_cache_path = ".response_cache.sqlite"
+## ignore the cached responses and overwrite them with fresh ones (e.g. after changing the prompts) ##
+refresh_cache = False
+## background briefing jobs of the web interface: job table and briefings generated at the same time by the server ##
+jobs_path = ".jobs.sqlite"
+job_workers = 2
+## tracing of the pipeline stages (parsing, retrieval, prompt, model call, scoring): spans appended to a JSONL file, ##
+## per-stage metrics in the Prometheus text format, written to a file and/or served at http://<host>:<port>/metrics ##
+trace_enabled = False
+trace_jsonl_path = "traces/spans.jsonl"
+trace_prometheus_path = "traces/metrics.prom"
+trace_prometheus_port = None
+
+
+def get_openai_api_key():
+    """
+    Loads the OpenAI API key from the `env.env` file.
+
+    Returns:
+        str: The API key, or None if it is not configured.
+    """
+    load_dotenv(dotenv_path='env.env')
+    return os.getenv("openai_api_key")
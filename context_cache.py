@@ -0,0 +1,120 @@
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+class ContextCache:
+    """
+    Bounded LRU cache for the topic context assembled by `Retriever.get_context_by_topic`, persisted on disk.
+
+    The context only depends on the retrieval configuration and on the content of the index, never on the
+    paper being summarized, so it can be reused across requests, evaluation rows and process restarts.
+    Every entry remembers the index version it was built from; entries of older versions are dropped
+    when the index changes.
+
+    Attributes:
+        path (str): JSON file where the cache is persisted.
+        max_entries (int): Maximum number of contexts kept; the least recently used one is evicted first.
+        hits (int): Number of lookups answered from the cache.
+        misses (int): Number of lookups that had to run the retrieval.
+    """
+
+    def __init__(self, path, max_entries=128):
+        """
+        Initializes the ContextCache class, loading the entries persisted in `path`.
+
+        Args:
+            path (str): JSON file where the cache is persisted.
+            max_entries (int, optional): Maximum number of cached contexts. Default is 128.
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if os.path.isfile(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self._entries = OrderedDict(json.load(f))
+
+    @staticmethod
+    def make_key(topics, topics_chunk_size, user_topic, embedding_model, index_version, num_chunks=5, options=None):
+        """
+        Builds the cache key of a retrieval configuration.
+
+        Args:
+            topics (list): Topics used to build the queries.
+            topics_chunk_size (list): Chunk sizes for each topic.
+            user_topic (str): Custom topic provided by the user.
+            embedding_model (str): Name of the embedding model of the index.
+            index_version (str): Version stamp of the index content.
+            num_chunks (int, optional): Number of passages retrieved per topic. Default is 5.
+            options (list, optional): Other retrieval settings that change the context. Default is none.
+
+        Returns:
+            str: SHA-256 of the configuration.
+        """
+        payload = json.dumps([list(topics), list(topics_chunk_size), user_topic, embedding_model, index_version, num_chunks]
+                             + ([options] if options is not None else []))
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """
+        Returns the cached context for `key`, or None if it is not cached.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry["context"]
+
+    def put(self, key, context, index_version):
+        """
+        Stores `context` under `key`, evicting the least recently used entries above `max_entries`.
+
+        Args:
+            key (str): Key built by `make_key`.
+            context: Assembled topic context (any JSON-serializable value).
+            index_version (str): Version stamp of the index the context was retrieved from.
+        """
+        with self._lock:
+            self._entries[key] = {"context": context, "index_version": index_version}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._save()
+
+    def invalidate(self, index_version):
+        """
+        Drops every entry that was not built from `index_version`.
+
+        Args:
+            index_version (str): Current version stamp of the index.
+        """
+        with self._lock:
+            stale = [key for key, entry in self._entries.items() if entry["index_version"] != index_version]
+            for key in stale:
+                del self._entries[key]
+            if stale:
+                self._save()
+
+    def stats(self):
+        """
+        Returns:
+            dict: Number of hits, misses and cached entries.
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        # one temporary file per process: the web interface, batch and sweep may save the same cache at once
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(list(self._entries.items()), f)
+        os.replace(tmp_path, self.path)
@@ -1,12 +1,15 @@
 import os
+import time
+import contextvars
 from data_loader import DataLoader
-from model import OpenAiModel
+from eval_runner import model_request
+from model import CHAT_BACKENDS, OpenAiModel
 from prompter import Prompter
 from retriever import Retriever
-from evaluator import Evaluator
-from tqdm import tqdm
-import pandas as pd
-from dotenv import load_dotenv
+from resources import configured_options, get_resource, startup_report
+from tracing import tracer
+
+GENERATION_MODES = ("single", "sections")
 
 class Controller:
 
@@ -16,15 +19,24 @@ class Controller:
 
     Attributes:
         data_loader (DataLoader): Handles loading of PDF documents.
-        all_briefings (list): Collection of all briefings loaded from the specified directory.
-        vector_db (Retriever): Vector database used to retrieve relevant contexts based on embeddings.
-        openai_model (OpenAiModel): Interface with the OpenAI model to process prompts and generate responses.
+        vector_db (Retriever): Vector database, indexed incrementally from the specified directory,
+                               used to retrieve relevant contexts based on embeddings. Built on first use
+                               and shared by every Controller of the process with the same configuration.
+        openai_model (OpenAiModel): Interface with the chat model to process prompts and generate responses: the
+                                    OpenAI model, or a `LocalModel` with the "local" backend.
+                                    Built on first use and shared like `vector_db`.
         topics (list): List of topics that guide context retrieval.
         topics_chunk_size (list): Chunk sizes associated with each topic in the vector database.
     """
 
 
-    def __init__(self, data_path, embedding_model, openai_model_name, openai_api_key, topics, topics_chunk_size):
+    def __init__(self, data_path, embedding_model, openai_model_name, openai_api_key, topics, topics_chunk_size, chat_model=None,
+                 response_cache_path=None, refresh_cache=False, token_budget=16000, completion_tokens=1500,
+                 topics_priority=None, map_workers=4, embedding_backend="torch", embedding_batch_size=32,
+                 embedding_threads=None, vector_store="chroma", index_chunk_size=1000, temperature=0.5,
+                 chat_backend="openai", local_model_name="Qwen/Qwen2.5-0.5B-Instruct", local_batch_size=4,
+                 local_threads=None, retrieval_mode="dense", pdf_backend="pypdf", max_paper_tokens=None,
+                 generation_mode="single", request_timeout=None, request_max_retries=2):
 
         """
         Initializes the Controller class with the required data and configuration.
@@ -36,96 +48,510 @@ class Controller:
             openai_api_key (str): API key used to authenticate with the OpenAI service.
             topics (list): List of topics for context retrieval.
             topics_chunk_size (list): List of chunk sizes corresponding to each topic.
+            chat_model (optional): Object exposing `talk_to_model` used instead of the OpenAI model,
+                                   e.g. a `FakeChatModel` for offline runs.
+            response_cache_path (str, optional): SQLite file caching the model responses. None disables the cache.
+            refresh_cache (bool, optional): Ignore cached responses and overwrite them with fresh ones.
+            token_budget (int, optional): Maximum tokens of a request, prompt and answer included. Default is 16000.
+            completion_tokens (int, optional): Tokens reserved for the answer within the budget. Default is 1500.
+            topics_priority (list, optional): Topics from most to least important when the context must be trimmed.
+                                              Defaults to the order of `topics`.
+            map_workers (int, optional): Concurrent section summaries for papers that exceed the budget. Default is 4.
+            embedding_backend (str, optional): Embedding backend, "torch", "onnx", "int8" or "hashing". Default is "torch".
+            embedding_batch_size (int, optional): Number of texts encoded per forward pass. Default is 32.
+            embedding_threads (int, optional): Number of CPU threads of the encoder. Defaults to the backend's setting.
+            vector_store (str, optional): Vector store of the index, "chroma" or "numpy". Default is "chroma".
+            index_chunk_size (int, optional): Maximum size of the chunks cut at index time. Default is 1000.
+            temperature (float, optional): Temperature of the chat model. Default is 0.5.
+            chat_backend (str, optional): "openai" (API) or "local" (`LocalModel` on CPU). Default is "openai".
+            local_model_name (str, optional): Hugging Face model of the local backend.
+                                              Default is "Qwen/Qwen2.5-0.5B-Instruct".
+            local_batch_size (int, optional): Requests generated together by the local backend. Default is 4.
+            local_threads (int, optional): CPU threads of the local backend. Defaults to the PyTorch setting.
+            retrieval_mode (str, optional): Retrieval of the context, "dense", "bm25" or "hybrid". Default is "dense".
+            pdf_backend (str, optional): PDF extraction backend, "langchain", "pypdf" or "pymupdf". Default is "pypdf".
+            max_paper_tokens (int, optional): Stop extracting a paper given by path once it reaches this many tokens.
+                                              Default is the whole paper.
+            generation_mode (str, optional): "single" (one request writes the whole briefing) or "sections"
+                                             (concurrent requests, one per element of the briefing). Default is "single".
+            request_timeout (float, optional): Time limit of one OpenAI request in seconds, enforced by the client.
+                                               Default is no limit.
+            request_max_retries (int, optional): Retries made by the OpenAI client itself. Default is 2.
+
+        Raises:
+            ValueError: If `chat_backend` is not one of `CHAT_BACKENDS` or `generation_mode` not one of `GENERATION_MODES`.
         """
-        self.data_loader = DataLoader()
-        self.all_briefings = self.data_loader.load_pdfs_from_directory(data_path)
-        self.vector_db = Retriever(documents=self.all_briefings, embedding_model=embedding_model)
-        self.openai_model = OpenAiModel(model_name=openai_model_name, key=openai_api_key)
+        if chat_backend not in CHAT_BACKENDS:
+            raise ValueError(f"Unknown chat backend '{chat_backend}'. Available: {', '.join(CHAT_BACKENDS)}")
+        if generation_mode not in GENERATION_MODES:
+            raise ValueError(f"Unknown generation mode '{generation_mode}'. Available: {', '.join(GENERATION_MODES)}")
+        self.data_loader = DataLoader(backend=pdf_backend)
+        self.data_path = data_path
+        self.embedding_model = embedding_model
+        self.openai_model_name = openai_model_name
+        self.openai_api_key = openai_api_key
         self.topics = topics
         self.topics_chunk_size = topics_chunk_size
+        self.chat_model = chat_model
+        self.response_cache_path = response_cache_path
+        self.refresh_cache = refresh_cache
+        self.token_budget = token_budget
+        self.completion_tokens = completion_tokens
+        self.topics_priority = topics_priority
+        self.map_workers = map_workers
+        self.embedding_backend = embedding_backend
+        self.embedding_batch_size = embedding_batch_size
+        self.embedding_threads = embedding_threads
+        self.vector_store = vector_store
+        self.index_chunk_size = index_chunk_size
+        self.temperature = temperature
+        self.chat_backend = chat_backend
+        self.local_model_name = local_model_name
+        self.local_batch_size = local_batch_size
+        self.local_threads = local_threads
+        self.retrieval_mode = retrieval_mode
+        self.max_paper_tokens = max_paper_tokens
+        self.generation_mode = generation_mode
+        self.request_timeout = request_timeout
+        self.request_max_retries = request_max_retries
+
+    @property
+    def vector_db(self):
+        return get_resource(
+            ("Retriever", self.data_path, self.embedding_model, self.embedding_backend, self.embedding_batch_size,
+             self.embedding_threads, self.vector_store, self.index_chunk_size, self.retrieval_mode),
+            lambda: Retriever(
+                data_path=self.data_path,
+                data_loader=self.data_loader,
+                embedding_model=self.embedding_model,
+                embedding_backend=self.embedding_backend,
+                embedding_batch_size=self.embedding_batch_size,
+                embedding_threads=self.embedding_threads,
+                vector_store=self.vector_store,
+                chunk_size=self.index_chunk_size,
+                retrieval_mode=self.retrieval_mode
+            )
+        )
+
+    @property
+    def openai_model(self):
+        if self.chat_model is not None:
+            return self.chat_model
+        if self.chat_backend == "local":
+            from local_model import LocalModel
+
+            return get_resource(
+                ("LocalModel", self.local_model_name, self.temperature, self.completion_tokens, self.local_batch_size,
+                 self.local_threads),
+                lambda: LocalModel(
+                    model_name=self.local_model_name,
+                    temperature=self.temperature,
+                    max_new_tokens=self.completion_tokens,
+                    batch_size=self.local_batch_size,
+                    threads=self.local_threads
+                )
+            )
+        return get_resource(
+            ("OpenAiModel", self.openai_model_name, self.temperature, self.openai_api_key, self.response_cache_path,
+             self.refresh_cache, self.request_timeout, self.request_max_retries),
+            lambda: OpenAiModel(
+                model_name=self.openai_model_name,
+                key=self.openai_api_key,
+                temperature=self.temperature,
+                cache=self.response_cache,
+                refresh_cache=self.refresh_cache,
+                timeout=self.request_timeout,
+                max_retries=self.request_max_retries
+            )
+        )
+
+    @property
+    def response_cache(self):
+        if self.response_cache_path is None:
+            return None
+        from response_cache import ResponseCache
+
+        return get_resource(("ResponseCache", self.response_cache_path), lambda: ResponseCache(self.response_cache_path))
+
+    def warm_up(self):
+        """
+        Builds every lazily initialized subsystem right away, e.g. before serving the first request.
+        """
+        with startup_report.timed("init:retriever"):
+            self.vector_db.warm_up()
+        with startup_report.timed("init:openai_model"):
+            self.openai_model.warm_up()
+
+    def _prepare(self, paper_path, user_topic, paper_content, report, sections=False):
+        """
+        Retrieves the context, loads the paper and plans the prompt within the token budget. A paper that does
+        not fit is summarized section by section first.
+
+        Returns:
+            tuple: The context by topic, the plan (`Prompter.build_messages`, or `Prompter.plan_parts` with
+                   `sections`), the paper as given to the model (its section summaries for map-reduce) and the
+                   human message of a single-call briefing (None with `sections`).
+        """
+        context_by_topic = self.vector_db.get_context_by_topic(self.topics, self.topics_chunk_size, user_topic)
+        if paper_content.strip() == '':
+            paper_content = " ".join(self.data_loader.load_single_pdf(paper_path, max_tokens=self.max_paper_tokens))
+        model_name = getattr(self.openai_model, 'model_name', self.openai_model_name)
+        with tracer.span("build_prompt") as span:
+            if sections:
+                # the messages of the elements are built from the paper or its summaries once they are known
+                plan = Prompter.plan_parts(
+                    paper_content, self.token_budget, completion_tokens=self.completion_tokens, model_name=model_name
+                )
+            else:
+                plan = Prompter.build_messages(
+                    context_by_topic, paper_content, self.token_budget,
+                    completion_tokens=self.completion_tokens, priority=self.topics_priority, model_name=model_name
+                )
+            span.set(mode=plan['mode'])
+        report.update(plan['tokens'])
+        report['mode'] = plan['mode']
+        human_message = plan.get('human_message')
+
+        if plan['mode'] == "map_reduce":
+            # the paper does not fit in the budget: summarize its sections in parallel, then brief from the summaries
+            from concurrent.futures import ThreadPoolExecutor
+
+            map_system = Prompter.get_section_summary_system()
+            map_system_tokens = Prompter.count_tokens(map_system, model_name)
+            total = len(plan['sections'])
+
+            def summarize(index, section):
+                prompt_tokens = map_system_tokens + report['sections'][index - 1]
+                with tracer.span("llm:section_summary", prompt_tokens=prompt_tokens):
+                    return model_request(
+                        self.openai_model.talk_to_model, map_system, Prompter.get_section_summary_human(section, index, total),
+                        tokens=prompt_tokens + self.completion_tokens
+                    )
 
-    def process(self, paper_path = '', user_topic = '',paper_content = ''):
+            # each summary runs in a copy of the caller's context, so an `EvalRunner` charges and retries it
+            with ThreadPoolExecutor(max_workers=self.map_workers) as executor:
+                futures = [
+                    executor.submit(contextvars.copy_context().run, summarize, index, section)
+                    for index, section in enumerate(plan['sections'], start=1)
+                ]
+                summaries = [future.result() for future in futures]
+            report['section_summaries'] = [Prompter.count_tokens(summary, model_name) for summary in summaries]
+            if sections:
+                summaries = Prompter.fit_summaries(summaries, plan['max_paper_tokens'], model_name)
+                return context_by_topic, plan, Prompter.format_summaries(summaries), None
+            # the summaries may be longer than planned: fit the reduce request in the budget again
+            reduce = Prompter.build_reduce_messages(
+                context_by_topic, summaries, self.token_budget, completion_tokens=self.completion_tokens,
+                priority=self.topics_priority, model_name=model_name
+            )
+            plan['system_message'] = reduce['system_message']
+            human_message = reduce['human_message']
+            report.update(reduce['tokens'])
+            paper_content = Prompter.format_summaries(reduce['summaries'])
+        return context_by_topic, plan, paper_content, human_message
+
+    def _build_messages(self, paper_path, user_topic, paper_content, token_report=None):
+        report = {}
+        _, plan, _, human_message = self._prepare(paper_path, user_topic, paper_content, report)
+        if token_report is not None:
+            token_report.update(report)
+        return plan['system_message'], human_message
+
+    def _build_part_messages(self, paper_path, user_topic, paper_content, token_report=None):
+        report = {}
+        context_by_topic, _, paper, _ = self._prepare(paper_path, user_topic, paper_content, report, sections=True)
+        with tracer.span("build_prompt:sections"):
+            parts = Prompter.build_part_messages(
+                context_by_topic, paper, self.token_budget, completion_tokens=self.completion_tokens,
+                priority=self.topics_priority, model_name=getattr(self.openai_model, 'model_name', self.openai_model_name)
+            )
+        report['parts'] = {part['name']: part['tokens'] for part in parts}
+        report['system'] = sum(part['tokens']['system'] for part in parts)
+        report['human'] = sum(part['tokens']['human'] for part in parts)
+        if token_report is not None:
+            token_report.update(report)
+        return parts
+
+    def _generate_parts(self, parts):
+        """
+        Requests the elements of the briefing concurrently and yields their texts in reading order.
+
+        Every element is a request of its own: within an `EvalRunner` row it is charged to the runner's budget
+        and concurrency, and a failed element is retried alone.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        def generate(part):
+            prompt_tokens = part['tokens']['system'] + part['tokens']['human']
+            with tracer.span(f"llm:{part['name']}", prompt_tokens=prompt_tokens):
+                return model_request(
+                    self.openai_model.talk_to_model, part['system_message'], part['human_message'],
+                    tokens=prompt_tokens + self.completion_tokens
+                )
+
+        # each element runs in a copy of the caller's context, so an `EvalRunner` charges and retries it
+        with ThreadPoolExecutor(max_workers=len(parts)) as executor:
+            futures = [executor.submit(contextvars.copy_context().run, generate, part) for part in parts]
+            for future in futures:
+                yield future.result()
+
+    def process(self, paper_path = '', user_topic = '',paper_content = '', token_report=None):
         """
         Processes a PDF file to generate an evidence briefing.
 
+        The prompt is assembled within `token_budget`: the retrieved context is trimmed by topic priority and
+        papers that still do not fit are summarized section by section before the briefing is written.
+        In "sections" generation mode every element of the briefing is requested concurrently, with the context
+        of its own topics, and the elements are joined in order (see `Prompter.assemble_briefing`).
+
         Args:
             paper_path (str): Path to the PDF file to be processed.
             user_topic (str): Custom topic provided by the user to refine the query.
+            paper_content (str, optional): Content of the paper, used instead of `paper_path` when given.
+            token_report (dict, optional): Filled with the token counts of each stage of the prompt.
 
         Returns:
             str: The generated evidence briefing as a text output.
         """
-        additional_context = self.vector_db.get_context(self.topics, self.topics_chunk_size, user_topic)
-        system_message = Prompter.get_researcher_system(additional_context)
-        if paper_content.strip() == '':
-            paper_content = " ".join(self.data_loader.load_single_pdf(paper_path))
-        human_message = Prompter.get_researcher_human(paper_content)
-        result = self.openai_model.talk_to_model(system_message, human_message)
+        with tracer.span("process") as span:
+            report = {}
+            if self.generation_mode == "sections":
+                parts = self._build_part_messages(paper_path, user_topic, paper_content, report)
+                generate = lambda: Prompter.assemble_briefing(self._generate_parts(parts))
+            else:
+                system_message, human_message = self._build_messages(paper_path, user_topic, paper_content, report)
+                generate = lambda: model_request(
+                    self.openai_model.talk_to_model, system_message, human_message,
+                    tokens=report['system'] + report['human'] + self.completion_tokens
+                )
+            with tracer.span("llm", prompt_tokens=report['system'] + report['human']) as llm_span:
+                result = generate()
+            if token_report is not None or tracer.enabled:
+                report['completion'] = Prompter.count_tokens(result, getattr(self.openai_model, 'model_name', self.openai_model_name))
+                llm_span.set(completion_tokens=report['completion'])
+            span.set(mode=report['mode'])
+        if token_report is not None:
+            token_report.update(report)
         return result
+
+    def process_stream(self, paper_path = '', user_topic = '', paper_content = '', stats=None, token_report=None):
+        """
+        Processes a PDF file to generate an evidence briefing, yielding the text as the model produces it.
+        In "sections" generation mode each element of the briefing is yielded whole, in order, as soon as it
+        and the elements before it are ready.
+
+        Args:
+            paper_path (str): Path to the PDF file to be processed.
+            user_topic (str): Custom topic provided by the user to refine the query.
+            paper_content (str, optional): Content of the paper, used instead of `paper_path` when given.
+            stats (dict, optional): Filled with the time to first token and the tokens per second of the request.
+            token_report (dict, optional): Filled with the token counts of each stage of the prompt.
+
+        Yields:
+            str: Pieces of the generated evidence briefing, in order.
+        """
+        stats = {} if stats is None else stats
+        with tracer.span("process") as span:
+            report = {}
+            if self.generation_mode == "sections":
+                parts = self._build_part_messages(paper_path, user_topic, paper_content, report)
+                stream = self._stream_parts(parts, stats)
+            else:
+                system_message, human_message = self._build_messages(paper_path, user_topic, paper_content, report)
+                stream = self.openai_model.stream_model(system_message, human_message, stats=stats)
+            span.set(mode=report['mode'])
+            with tracer.span("llm", prompt_tokens=report['system'] + report['human']) as llm_span:
+                yield from stream
+                llm_span.set(completion_tokens=stats.get('tokens'), cache_hit=stats.get('cached', False),
+                             time_to_first_token=stats.get('time_to_first_token'))
+        if token_report is not None:
+            token_report.update(report)
     
-    def process_eval(self,user_topic = ''):
-        """
-        Creates a dataset containing evaluation metrics for each article present in the briefings
-        """
-        eval = Evaluator()
-        eval.create_eval_dataset(self.data_loader)
-        eval_dataframe = eval.load_eval_dataset()
-        required_cols = ['article', 'brief']
-        if not all(col in eval_dataframe.columns for col in required_cols):
-            raise ValueError(f"Eval dataframe must contain: {required_cols}")
-
-        generated_briefs = []
-        
-        
-        
-        
-        for index, row in tqdm(eval_dataframe.iterrows(), total=eval_dataframe.shape[0], desc="Processing evaluation"):
-            generated_brief = self.process(paper_content=row['article'])
-            generated_briefs.append(generated_brief)
-
-        eval_dataframe['generated_brief'] = generated_briefs
-        # save inference for future tests
-        output_path = os.path.join(os.getcwd(), 'eval_dataset_with_inference')
-        eval_dataframe.to_csv(output_path, index=False, encoding='utf-8')
-        
-        results_df, aggregated_scores = eval.evaluate(eval_dataframe)
-        
-        return results_df, aggregated_scores
+    def _stream_parts(self, parts, stats):
+        # same statistics as `OpenAiModel.stream_model`, the first token being the first element
+        start = time.perf_counter()
+        first_token_time = None
+        pieces = []
+        for piece in Prompter.iter_briefing_parts(self._generate_parts(parts)):
+            if first_token_time is None:
+                first_token_time = time.perf_counter() - start
+            pieces.append(piece)
+            yield piece
+        total_time = time.perf_counter() - start
+        tokens = Prompter.count_tokens("".join(pieces), getattr(self.openai_model, 'model_name', self.openai_model_name))
+        generation_time = total_time - (first_token_time or 0.0)
+        stats.update(
+            time_to_first_token=first_token_time,
+            total_time=total_time,
+            tokens=tokens,
+            tokens_per_second=tokens / generation_time if generation_time > 0 else 0.0,
+            cached=False
+        )
+
+    def eval_run_config(self, user_topic, metrics_signature):
+        """
+        Describes an evaluation run of this controller; runs with the same description share their `RunLog`.
+
+        Args:
+            user_topic (str): Custom topic used to refine the retrieved context.
+            metrics_signature (list): Names and versions of the metrics, see `BatchScorer.signature`.
+
+        Returns:
+            dict: JSON-serializable configuration of the run.
+        """
+        run_config = {
+            'openai_model_name': getattr(self.openai_model, 'model_name', self.openai_model_name),
+            'temperature': getattr(self.openai_model, 'temperature', None),
+            'embedding_model': self.embedding_model,
+            'index_version': self.vector_db.index_version,
+            'topics': list(self.topics),
+            'topics_chunk_size': list(self.topics_chunk_size),
+            'user_topic': user_topic,
+            'metrics': metrics_signature,
+        }
+        # only recorded when not the default, so the runs made before these options keep their run log
+        if self.retrieval_mode != "dense":
+            run_config['retrieval_mode'] = self.retrieval_mode
+        if self.generation_mode != "single":
+            run_config['generation_mode'] = self.generation_mode
+        return run_config
+
+    def process_eval(self, user_topic = '', max_workers=4, requests_per_minute=None, tokens_per_minute=None, row_timeout=None,
+                     metrics=None, trace=None):
+        """
+        Creates a dataset containing evaluation metrics for each article present in the briefings.
+
+        The evaluation dataset is streamed and the briefings are generated concurrently by an `EvalRunner`,
+        within the given rate limits and with retries on rate-limit and server errors. Every generated brief
+        is scored and appended to a durable `RunLog` as soon as it completes, so an interrupted run resumes
+        where it stopped: articles that already have a result for the same configuration are skipped.
+        Rows that still fail are reported and left out of the metrics. The generated briefs are also stored
+        in the evaluation store, keyed by the run id (the first 16 characters of the run configuration hash).
+
+        Args:
+            user_topic (str, optional): Custom topic used to refine the retrieved context.
+            max_workers (int, optional): Maximum number of concurrent requests. Default is 4.
+            requests_per_minute (float, optional): Request budget per minute. Default is no limit.
+            tokens_per_minute (float, optional): Token budget per minute. Default is no limit.
+            row_timeout (float, optional): Time limit per article in seconds, retries included. Default is no limit.
+            metrics (tuple, optional): Names of the metrics in `metrics.registry`. Default is ROUGE, BLEU and METEOR.
+            trace (bool, optional): Trace the stages of the run and print their p50/p95 latency at the end, even
+                                    if tracing is disabled in the rest of the process. The statistics of the
+                                    process-wide tracer are kept. Default is `trace_enabled` of config.py.
+
+        Returns:
+            tuple: DataFrame with the per-article scores and generation latency in seconds (None for rows logged
+                   before it was recorded), and dictionary with the aggregated scores.
+        """
+        import pandas as pd
+        from tqdm import tqdm
+        from evaluator import Evaluator
+        from eval_runner import EvalRunner
+        from run_log import RunLog, text_hash
+
+        if trace is None:
+            import config
+            trace = config.trace_enabled
+        # the stages of this run are summarized apart, without resetting the process-wide statistics
+        with tracer.collect(enabled=trace) as stage_stats:
+            eval = Evaluator(metrics) if metrics else Evaluator()
+            eval.create_eval_dataset(self.data_loader)
+
+            # the context does not depend on the article: build it once (memoized by the retriever) before the requests start
+            self.vector_db.get_context(self.topics, self.topics_chunk_size, user_topic)
+            run_log = RunLog(self.eval_run_config(user_topic, eval.scorer.signature()))
+            completed = set()
+            scores = eval.running_scores()
+            for record in run_log.iter_records():
+                completed.add(record['article_hash'])
+                scores.add(record['scores'])
+            if completed:
+                print(f"Retomando avaliação: {len(completed)} artigos já processados em {run_log.path}.")
+
+            def pending_rows():
+                for row in eval.iter_eval_dataset():
+                    row['article_hash'] = text_hash(row['article'])
+                    if row['article_hash'] not in completed:
+                        yield row
+
+            # every model request of a row (section summaries included) is charged and retried on its own
+            runner = EvalRunner(
+                max_workers=max_workers,
+                requests_per_minute=requests_per_minute,
+                tokens_per_minute=tokens_per_minute,
+                row_timeout=row_timeout,
+                request_level=True
+            )
+            def generate(row):
+                token_report = {}
+                start = time.perf_counter()
+                generated_brief = self.process(user_topic=user_topic, paper_content=row['article'], token_report=token_report)
+                return generated_brief, token_report, time.perf_counter() - start
+
+            progress = tqdm(desc="Processing evaluation")
+            for _, row, result, error in runner.run_iter(generate, pending_rows()):
+                progress.update(1)
+                if error is not None:
+                    print(f"Aviso: Falha ao gerar o briefing da linha {row['row']}: {error}")
+                    continue
+                generated_brief, token_report, latency = result
+                row_scores = eval.score_row(generated_brief, row['brief'])
+                run_log.append({
+                    'row': row['row'],
+                    'id': row['id'],
+                    'article_hash': row['article_hash'],
+                    'generated_brief': generated_brief,
+                    'scores': row_scores,
+                    'tokens': token_report,
+                    'latency': latency,
+                })
+                scores.add(row_scores)
+                if 'ROUGE' in scores.aggregated():
+                    progress.set_postfix(rougeL=f"{scores.aggregated()['ROUGE']['rougeL']:.3f}")
+            progress.close()
+
+            records = list(run_log.iter_records())
+            if records:
+                eval.store.write_inference(run_log.config_hash[:16], {
+                    record['id']: record['generated_brief'] for record in records if 'id' in record
+                })
+            results_df = pd.DataFrame([
+                {'row': record['row'], 'id': record.get('id'), 'article_hash': record['article_hash'],
+                 'generated_brief': record['generated_brief'], 'latency': record.get('latency'),
+                 **{key: value for key, value in record['scores'].items() if key != 'bleu_stats'}}
+                for record in records
+            ])
+            if not results_df.empty:
+                results_df = results_df.sort_values('row').reset_index(drop=True)
+                if 'rougeL' in results_df:
+                    results_df['rougeL_score'] = results_df['rougeL']
+        if trace:
+            print(stage_stats.summary())
+        return results_df, scores.aggregated()
 
 
 if __name__ == '__main__':
- 
-    ## human made evidence briefings path ##
-    directory_path = "briefings"
-    ## embedding model ##
-    embedding_model = "all-MiniLM-L6-v2"
-    ## openai model name ##
-    openai_model_name = "gpt-4o-mini"
-    load_dotenv(dotenv_path='env.env')
-    openai_api_key = os.getenv("openai_api_key")
-    topics = [
-        "Intro",
-        "Main Findings",
-        "Who is this briefing for",
-        "Where the findings come from",
-        "What is included in this briefing",
-        "What is not included in this briefing"
-    ]
-    topics_chunk_size = [
-        300,    
-        4000,   
-        200,    
-        300,    
-        300,    
-        300     
-    ]
-
-    controller = Controller(directory_path, embedding_model, openai_model_name, openai_api_key, topics, topics_chunk_size)
+    import config
+    import pandas as pd
+
+    tracer.configure(enabled=config.trace_enabled, jsonl_path=config.trace_jsonl_path)
+    controller = Controller(
+        config.directory_path, config.embedding_model, config.openai_model_name,
+        config.get_openai_api_key(), config.topics, config.topics_chunk_size,
+        **configured_options()
+    )
     pd.set_option('display.max_rows', 50)          # Exibir até 50 linhas
     pd.set_option('display.max_columns', 10)       # Exibir até 10 colunas
     pd.set_option('display.width', 120)            # Largura máxima da linha de exibição
     pd.set_option('display.max_colwidth', 80)      # Largura máxima de cada coluna de texto
-    results_df, aggregated_scores = controller.process_eval()
+    results_df, aggregated_scores = controller.process_eval(
+        max_workers=config.eval_max_workers,
+        requests_per_minute=config.eval_requests_per_minute,
+        tokens_per_minute=config.eval_tokens_per_minute,
+        row_timeout=config.eval_row_timeout,
+        metrics=config.eval_metrics,
+        trace=True
+    )
 
     print("\n" + "="*50)
     print("      RESULTADOS DA AVALIAÇÃO CONCLUÍDA")
@@ -137,14 +563,19 @@ if __name__ == '__main__':
     import pprint
     print("--- PONTUAÇÕES GERAIS (AGREGADAS) ---")
     pprint.pprint(aggregated_scores)
+    if controller.response_cache is not None:
+        print("Cache de respostas:", controller.response_cache.stats())
+    if config.trace_prometheus_path:
+        tracer.write_prometheus(config.trace_prometheus_path)
+        print(f"Métricas por etapa salvas em: {config.trace_prometheus_path}")
     print("\n" + "-"*50 + "\n")
 
     # 2. Imprimir o DataFrame com os resultados detalhados
     print("--- RESULTADOS DETALHADOS (POR ARTIGO) ---")
     
     # Imprimimos apenas as colunas mais importantes para a análise
-    # O 'brief' é a referência, 'generated_brief' é o do modelo.
-    print(results_df[['brief', 'generated_brief', 'rougeL_score']])
+    # 'generated_brief' é o do modelo; o texto completo de cada execução fica no log em 'eval_runs'.
+    print(results_df[['row', 'generated_brief', 'rougeL_score']])
     
     # Se quiser forçar a impressão do DataFrame INTEIRO sem cortes (pode ser muito longo)
     # print(results_df.to_string())
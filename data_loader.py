@@ -1,15 +1,208 @@
 import os
-from langchain_community.document_loaders import PyPDFLoader
-from langchain.schema import Document
+import json
+import time
+import hashlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from importlib import metadata
+from tracing import tracer
+
+
+PDF_BACKENDS = ("langchain", "pypdf", "pymupdf")
+
+
+def iter_pdf_pages(path, backend="pypdf"):
+    """
+    Extracts the text of a PDF file page by page, with line breaks replaced by spaces.
+
+    Args:
+        path (str): Path to the PDF file.
+        backend (str, optional): One of `PDF_BACKENDS`. Default is "pypdf".
+            - "langchain": `PyPDFLoader.load_and_split`, which parses the whole file and cuts pages longer
+              than 4000 characters in pieces; the original parser.
+            - "pypdf": the same pypdf text extraction, one page at a time and without splitting.
+            - "pymupdf": the MuPDF native parser, much faster on large files; needs the `pymupdf` package.
+
+    Yields:
+        str: Text of each page (of each piece, with "langchain"), in order.
+
+    Raises:
+        ValueError: If `backend` is not one of `PDF_BACKENDS`.
+    """
+    if backend == "langchain":
+        from langchain_community.document_loaders import PyPDFLoader
+
+        for page in PyPDFLoader(path).load_and_split():
+            yield page.page_content.replace('\n', ' ')
+    elif backend == "pypdf":
+        from pypdf import PdfReader
+
+        for page in PdfReader(path).pages:
+            yield page.extract_text().replace('\n', ' ')
+    elif backend == "pymupdf":
+        import pymupdf
+
+        with pymupdf.open(path) as document:
+            for page in document:
+                yield page.get_text().replace('\n', ' ')
+    else:
+        raise ValueError(f"Unknown PDF backend '{backend}'. Available: {', '.join(PDF_BACKENDS)}")
+
+
+def _parse_pdf(path, backend="pypdf"):
+    """
+    Parses a PDF file into a list of page texts. Module-level so it can run in a worker process.
+    """
+    return list(iter_pdf_pages(path, backend))
+
+
+def _parser_version(backend="pypdf"):
+    package = "pymupdf" if backend == "pymupdf" else "pypdf"
+    try:
+        version = metadata.version(package)
+    except metadata.PackageNotFoundError:
+        version = "unknown"
+    # the original parser keeps its version string, and so its cached texts
+    return f"{package}-{version}" if backend == "langchain" else f"{backend}-lazy-{version}"
+
 
 class DataLoader:
     """
     Class responsible for loading PDF files, either a single file or an entire directory.
 
+    Pages are extracted by a pluggable backend (see `iter_pdf_pages`). Parsed page texts are cached on disk,
+    keyed by the SHA-256 of the file content and by the parser version, so an unchanged PDF is never parsed
+    twice. Directories can be parsed by a pool of worker processes.
+
     Attributes:
-        No fixed attributes. Methods are responsible for directly returning the processed data.
+        cache_dir (str): Directory of the parsed-text cache, or None to disable the cache.
+        workers (int): Number of worker processes used to parse several files. 1 parses in-process.
+        backend (str): PDF extraction backend, one of `PDF_BACKENDS`.
+        parser_version (str): Version of the backend and of its parser, part of the cache key.
+        errors (dict): File path mapped to the error message of the files that could not be parsed
+                       in the last batch.
     """
 
+    def __init__(self, cache_dir="./.pdf_cache", workers=None, backend="pypdf"):
+        """
+        Initializes the DataLoader class.
+
+        Args:
+            cache_dir (str, optional): Directory of the parsed-text cache. None disables it. Default is "./.pdf_cache".
+            workers (int, optional): Number of worker processes for batch parsing. Defaults to the number of CPUs.
+            backend (str, optional): PDF extraction backend, one of `PDF_BACKENDS`. Default is "pypdf".
+
+        Raises:
+            ValueError: If `backend` is not one of `PDF_BACKENDS`.
+        """
+        if backend not in PDF_BACKENDS:
+            raise ValueError(f"Unknown PDF backend '{backend}'. Available: {', '.join(PDF_BACKENDS)}")
+        self.cache_dir = cache_dir
+        self.workers = workers or os.cpu_count() or 1
+        self.backend = backend
+        self.parser_version = _parser_version(backend)
+        self.errors = {}
+
+    def _cache_path(self, path):
+        if self.cache_dir is None:
+            return None
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        return os.path.join(self.cache_dir, f"{digest.hexdigest()}-{self.parser_version}.json")
+
+    def _read_cache(self, cache_path):
+        if cache_path is None or not os.path.isfile(cache_path):
+            return None
+        with open(cache_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write_cache(self, cache_path, pages):
+        if cache_path is None:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(pages, f)
+        os.replace(tmp_path, cache_path)
+
+    def iter_pdfs(self, paths, workers=None):
+        """
+        Parses several PDF files, yielding each one as soon as its pages are available.
+
+        Cached files are yielded first; the others are parsed by a pool of `workers` processes and yielded
+        in completion order. A file that cannot be parsed is reported and recorded in `errors`, without
+        aborting the batch.
+
+        Args:
+            paths (list): Paths to the PDF files.
+            workers (int, optional): Number of worker processes. Defaults to `self.workers`.
+
+        Yields:
+            tuple: (path, list of page texts) for every file parsed successfully.
+        """
+        workers = workers or self.workers
+        self.errors = {}
+        pending = []
+        for path in paths:
+            try:
+                cache_path = self._cache_path(path)
+            except OSError as e:
+                self._report_error(path, e)
+                continue
+            pages = self._read_cache(cache_path)
+            if pages is None:
+                pending.append((path, cache_path))
+            else:
+                yield path, pages
+
+        if not pending:
+            return
+        if workers <= 1 or len(pending) == 1:
+            for path, cache_path in pending:
+                try:
+                    pages = _parse_pdf(path, self.backend)
+                except Exception as e:
+                    self._report_error(path, e)
+                    continue
+                self._write_cache(cache_path, pages)
+                yield path, pages
+            return
+
+        with ProcessPoolExecutor(max_workers=min(workers, len(pending))) as executor:
+            futures = {executor.submit(_parse_pdf, path, self.backend): (path, cache_path) for path, cache_path in pending}
+            for future in as_completed(futures):
+                path, cache_path = futures[future]
+                try:
+                    pages = future.result()
+                except Exception as e:
+                    self._report_error(path, e)
+                    continue
+                self._write_cache(cache_path, pages)
+                yield path, pages
+
+    def _report_error(self, path, error):
+        self.errors[path] = str(error)
+        print(f"Aviso: Não foi possível processar o arquivo '{path}': {error}")
+
+    def iter_pdfs_from_directory(self, path, workers=None):
+        """
+        Streams the pages of all PDF files from a specified directory, as soon as each file is parsed.
+
+        Args:
+            path (str): Path to the directory containing the PDF files.
+            workers (int, optional): Number of worker processes. Defaults to `self.workers`.
+
+        Yields:
+            Document: One `Document` per PDF page, with the file name and page number as metadata.
+        """
+        from langchain.schema import Document
+
+        file_paths = [os.path.join(path, filename) for filename in sorted(os.listdir(path)) if filename.endswith(".pdf")]
+        for file_path, paper_content in self.iter_pdfs(file_paths, workers=workers):
+            for page_number, content in enumerate(paper_content):
+                yield Document(page_content=content, metadata={"source": os.path.basename(file_path), "page": page_number})
+
     def load_pdfs_from_directory(self, path):
         """
         Loads and processes all PDF files from a specified directory.
@@ -22,25 +215,46 @@ class DataLoader:
 
         Note:
             Only files with the `.pdf` extension are processed. The content of each page is stored as
-            an instance of the `Document` class for later use.
+            an instance of the `Document` class for later use. Files that cannot be parsed are skipped
+            and listed in `errors`.
+        """
+        return list(self.iter_pdfs_from_directory(path))
+
+    def iter_pages(self, path, max_tokens=None):
+        """
+        Streams the page texts of a single PDF file, from the cache or as the backend extracts them.
+
+        Args:
+            path (str): Path to the PDF file.
+            max_tokens (int, optional): Stop after the page where the text reaches this many tokens, estimated
+                                        as one token per 4 characters. Default is the whole file.
+
+        Yields:
+            str: Text of each page, in order. Only a file extracted to its last page is cached.
         """
-        all_briefings = []  # Lista para armazenar todos os briefings
-        for filename in os.listdir(path):
-            if filename.endswith(".pdf"):  # Processa apenas arquivos com extensão .pdf
-                file_path = os.path.join(path, filename)
-                loader = PyPDFLoader(file_path)
-                pages = loader.load_and_split()
-                paper_content = [page.page_content.replace('\n', ' ') for page in pages]
-                for content in paper_content:
-                    all_briefings.append(Document(page_content=content))  # Armazena como objetos `Document`
-        return all_briefings
+        cache_path = self._cache_path(path)
+        yield from self._stream_pages(path, cache_path, self._read_cache(cache_path), max_tokens)
+
+    def _stream_pages(self, path, cache_path, cached, max_tokens):
+        pages = iter(cached) if cached is not None else iter_pdf_pages(path, self.backend)
+        extracted, characters = [], 0
+        for page in pages:
+            yield page
+            extracted.append(page)
+            characters += len(page)
+            if max_tokens is not None and characters // 4 >= max_tokens:
+                return
+        if cached is None:
+            self._write_cache(cache_path, extracted)
 
-    def load_single_pdf(self, path):
+    def load_single_pdf(self, path, max_tokens=None):
         """
         Loads and processes a single PDF file.
 
         Args:
             path (str): Path to the PDF file.
+            max_tokens (int, optional): Stop extracting once the text reaches this many tokens; see `iter_pages`.
+                                        Default is the whole file.
 
         Returns:
             list: List of strings, where each string represents the content of a PDF page.
@@ -49,7 +263,91 @@ class DataLoader:
             The page content is returned as a simple list of strings, unlike the `load_pdfs_from_directory` method,
             which wraps each page in a `Document` object.
         """
-        loader = PyPDFLoader(path)
-        pages = loader.load_and_split()
-        paper_content = [page.page_content.replace('\n', ' ') for page in pages]
+        with tracer.span("parse_pdf") as span:
+            cache_path = self._cache_path(path)
+            cached = self._read_cache(cache_path)
+            span.set(cache_hit=cached is not None)
+            paper_content = list(self._stream_pages(path, cache_path, cached, max_tokens))
+            span.set(pages=len(paper_content), backend=self.backend)
         return paper_content
+
+
+def _normalized_words(pages):
+    return " ".join(pages).split()
+
+
+def parity_report(paths, backends=PDF_BACKENDS, reference="langchain"):
+    """
+    Compares the extraction backends on the same PDF files: speed, memory and agreement of the extracted text
+    with the `reference` backend. Backends that are not installed are skipped.
+
+    Memory is the peak of the Python allocations traced by `tracemalloc`; the native buffers of MuPDF are not
+    included.
+
+    Args:
+        paths (list): Paths to the PDF files.
+        backends (tuple, optional): Backends to compare. Default is every backend of `PDF_BACKENDS`.
+        reference (str, optional): Backend whose text the others are compared with. Default is "langchain",
+                                   the original parser.
+
+    Returns:
+        list: One dict per available backend with its 'backend', 'seconds', 'pages_per_second', 'peak_mib',
+              'word_overlap' (share of the reference words it also extracts, counted with multiplicity) and
+              'identical' (share of files whose words match the reference exactly).
+    """
+    import tracemalloc
+    from collections import Counter
+
+    texts, report = {}, []
+    for backend in dict.fromkeys((reference, *backends)):
+        tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            pages = {path: _parse_pdf(path, backend) for path in paths}
+        except ImportError as e:
+            tracemalloc.stop()
+            print(f"Aviso: Backend '{backend}' indisponível: {e}")
+            continue
+        seconds = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        texts[backend] = {path: _normalized_words(file_pages) for path, file_pages in pages.items()}
+        page_count = sum(len(file_pages) for file_pages in pages.values())
+        report.append({
+            "backend": backend,
+            "seconds": seconds,
+            "pages_per_second": page_count / seconds if seconds > 0 else 0.0,
+            "peak_mib": peak / (1 << 20),
+        })
+
+    for entry in report:
+        words = texts[entry["backend"]]
+        reference_words = texts.get(reference)
+        if reference_words is None:
+            entry["word_overlap"], entry["identical"] = None, None
+            continue
+        found = expected = identical = 0
+        for path in paths:
+            expected_words = Counter(reference_words[path])
+            found += sum((Counter(words[path]) & expected_words).values())
+            expected += sum(expected_words.values())
+            identical += words[path] == reference_words[path]
+        entry["word_overlap"] = found / expected if expected else 1.0
+        entry["identical"] = identical / len(paths) if paths else 1.0
+    return report
+
+
+if __name__ == "__main__":
+    import sys
+    import config
+
+    directory = sys.argv[1] if len(sys.argv) > 1 else config.directory_path
+    paths = [os.path.join(directory, filename) for filename in sorted(os.listdir(directory)) if filename.endswith(".pdf")]
+    report = parity_report(paths)
+    print(f"--- BACKENDS DE EXTRAÇÃO DE PDF ({len(paths)} arquivos, referência: langchain) ---")
+    print(f"{'backend':<10} {'tempo s':>9} {'págs/s':>9} {'pico MiB':>9} {'overlap':>8} {'idênticos':>10}")
+    for entry in report:
+        overlap = "-" if entry["word_overlap"] is None else f"{entry['word_overlap']:.3f}"
+        identical = "-" if entry["identical"] is None else f"{entry['identical']:.3f}"
+        print(f"{entry['backend']:<10} {entry['seconds']:>9.2f} {entry['pages_per_second']:>9.1f} "
+              f"{entry['peak_mib']:>9.1f} {overlap:>8} {identical:>10}")
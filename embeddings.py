@@ -0,0 +1,237 @@
+import re
+import time
+import zlib
+import threading
+from importlib import metadata
+from resources import startup_report
+
+BACKENDS = ("torch", "onnx", "int8", "hashing")
+
+# quantized weights published next to the ONNX export of the sentence-transformers models (AVX2 runs on any
+# recent x86 CPU; "onnx/model_qint8_avx512_vnni.onnx" or "onnx/model_qint8_arm64.onnx" suit other servers)
+DEFAULT_ONNX_FILES = {
+    "onnx": "onnx/model.onnx",
+    "int8": "onnx/model_quint8_avx2.onnx",
+}
+
+
+class HashingEncoder:
+    """
+    Deterministic stand-in for the embedding model: signed feature hashing of the lowercased words, L2-normalized.
+
+    Needs no model download, so the "hashing" backend lets the index and the retrieval run offline,
+    e.g. in `benchmark.py`. Its vectors only capture word overlap and are not meant for real briefings.
+
+    Attributes:
+        dimensions (int): Size of the vectors.
+    """
+
+    def __init__(self, dimensions=384):
+        self.dimensions = dimensions
+
+    def encode(self, texts, batch_size=32, show_progress_bar=False):
+        import numpy as np
+
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in re.findall(r"\w+", text.lower()):
+                digest = zlib.crc32(word.encode("utf-8"))
+                vectors[row, digest % self.dimensions] += -1.0 if digest >> 31 else 1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+
+def _sentence_transformers_version():
+    try:
+        return "sentence-transformers==" + metadata.version("sentence-transformers")
+    except metadata.PackageNotFoundError:
+        return "unknown"
+
+
+class LazyEmbeddings:
+    """
+    Embedding function that only loads the SentenceTransformer model when a text is first embedded.
+
+    Opening an unchanged index never embeds anything, so the model is not loaded until the first query.
+    The model runs on CPU with one of three backends: full-precision PyTorch ("torch"), ONNX Runtime ("onnx")
+    or ONNX Runtime with int8-quantized weights ("int8"); the ONNX backends need `optimum[onnxruntime]`.
+    The "hashing" backend replaces the model with a `HashingEncoder`, for offline runs.
+
+    Attributes:
+        model_name (str): Name of the SentenceTransformer model.
+        backend (str): One of `BACKENDS`.
+        batch_size (int): Number of texts encoded per forward pass.
+        threads (int): Number of CPU threads used by the backend, or None for its default.
+        onnx_file (str): ONNX weights of the model repository used by the ONNX backends.
+    """
+
+    def __init__(self, model_name, backend="torch", batch_size=32, threads=None, onnx_file=None):
+        """
+        Initializes the LazyEmbeddings class.
+
+        Args:
+            model_name (str): Name of the SentenceTransformer model.
+            backend (str, optional): "torch", "onnx", "int8" or "hashing". Default is "torch".
+            batch_size (int, optional): Number of texts encoded per forward pass. Default is 32.
+            threads (int, optional): Number of CPU threads. Defaults to the backend's own setting.
+            onnx_file (str, optional): ONNX weights to load. Defaults to `DEFAULT_ONNX_FILES[backend]`.
+
+        Raises:
+            ValueError: If `backend` is not one of `BACKENDS`.
+        """
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown embedding backend '{backend}'. Available: {', '.join(BACKENDS)}")
+        self.model_name = model_name
+        self.backend = backend
+        self.batch_size = batch_size
+        self.threads = threads
+        self.onnx_file = onnx_file or DEFAULT_ONNX_FILES.get(backend)
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def version(self):
+        """
+        Identifies the vectors produced by this configuration; vectors of different versions are not mixed
+        in the same index.
+
+        Returns:
+            str: Library version, plus the backend and weights file for the ONNX backends; the size of the
+                 vectors for the hashing backend.
+        """
+        if self.backend == "hashing":
+            return f"hashing-{HashingEncoder().dimensions}"
+        version = _sentence_transformers_version()
+        if self.backend == "torch":
+            return version
+        return f"{version}|{self.backend}|{self.onnx_file}"
+
+    def _load(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None and self.backend == "hashing":
+                    self._model = HashingEncoder()
+                elif self._model is None:
+                    with startup_report.timed("import:sentence_transformers"):
+                        from sentence_transformers import SentenceTransformer
+                    with startup_report.timed(f"init:embedding_model:{self.backend}"):
+                        if self.backend == "torch":
+                            if self.threads:
+                                import torch
+                                torch.set_num_threads(self.threads)
+                            model = SentenceTransformer(self.model_name, device="cpu")
+                        else:
+                            import onnxruntime
+
+                            session_options = onnxruntime.SessionOptions()
+                            if self.threads:
+                                session_options.intra_op_num_threads = self.threads
+                            model = SentenceTransformer(
+                                self.model_name,
+                                device="cpu",
+                                backend="onnx",
+                                model_kwargs={
+                                    "file_name": self.onnx_file,
+                                    "provider": "CPUExecutionProvider",
+                                    "session_options": session_options,
+                                },
+                            )
+                    self._model = model
+        return self._model
+
+    def embed_documents(self, texts):
+        if not texts:
+            return []
+        # same preprocessing as the LangChain wrapper the index was first built with
+        texts = [text.replace("\n", " ") for text in texts]
+        vectors = self._load().encode(texts, batch_size=self.batch_size, show_progress_bar=False)
+        return vectors.tolist()
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def _top_k(query_vectors, document_vectors, k):
+    import numpy as np
+
+    # squared L2 distance, the default metric of the Chroma collections
+    distances = (
+        (query_vectors ** 2).sum(axis=1)[:, None]
+        - 2 * query_vectors @ document_vectors.T
+        + (document_vectors ** 2).sum(axis=1)[None, :]
+    )
+    k = min(k, document_vectors.shape[0])
+    top = np.argpartition(distances, k - 1, axis=1)[:, :k]
+    order = np.take_along_axis(distances, top, axis=1).argsort(axis=1)
+    return np.take_along_axis(top, order, axis=1)
+
+
+def parity_report(model_name, documents, queries, backends=("torch", "onnx", "int8"), reference="torch", k=5,
+                  batch_size=32, threads=None):
+    """
+    Compares embedding backends on the same documents and queries.
+
+    Every backend embeds all `documents` (indexing throughput) and then each query on its own (query latency).
+    The passages each backend retrieves are compared with those retrieved by the reference backend.
+
+    Args:
+        model_name (str): Name of the SentenceTransformer model.
+        documents (list): Passages to index, e.g. the pages of the briefings.
+        queries (list): Queries to retrieve passages for.
+        backends (tuple, optional): Backends to compare. Default is the three model backends.
+        reference (str, optional): Backend whose results are taken as ground truth. Default is "torch".
+        k (int, optional): Number of passages retrieved per query. Default is 5.
+        batch_size (int, optional): Number of texts encoded per forward pass. Default is 32.
+        threads (int, optional): Number of CPU threads. Defaults to the backend's own setting.
+
+    Returns:
+        list: One dict per backend with 'backend', 'docs_per_second', 'query_latency_ms',
+              'overlap_at_k' (mean fraction of the reference top-k also retrieved) and 'top1_agreement'.
+    """
+    import numpy as np
+
+    backends = [reference] + [backend for backend in backends if backend != reference]
+    rankings, report = {}, []
+    for backend in backends:
+        embeddings = LazyEmbeddings(model_name, backend=backend, batch_size=batch_size, threads=threads)
+        embeddings._load()
+        start = time.perf_counter()
+        document_vectors = np.asarray(embeddings.embed_documents(documents), dtype=np.float32)
+        index_time = time.perf_counter() - start
+        start = time.perf_counter()
+        query_vectors = np.asarray([embeddings.embed_query(query) for query in queries], dtype=np.float32)
+        query_time = time.perf_counter() - start
+        rankings[backend] = _top_k(query_vectors, document_vectors, k)
+        report.append({
+            "backend": backend,
+            "docs_per_second": len(documents) / index_time if index_time else float("inf"),
+            "query_latency_ms": 1000 * query_time / max(len(queries), 1),
+        })
+
+    expected = rankings[reference]
+    for entry in report:
+        found = rankings[entry["backend"]]
+        entry["overlap_at_k"] = float(np.mean([
+            len(set(expected_row) & set(found_row)) / len(expected_row)
+            for expected_row, found_row in zip(expected, found)
+        ]))
+        entry["top1_agreement"] = float(np.mean(expected[:, 0] == found[:, 0]))
+    return report
+
+
+if __name__ == "__main__":
+    import config
+    from data_loader import DataLoader
+
+    documents = [document.page_content for document in DataLoader().iter_pdfs_from_directory(config.directory_path)]
+    # same query form as `Retriever.get_context_by_topic` without a user topic
+    queries = [f"{topic} - " for topic in config.topics]
+    report = parity_report(
+        config.embedding_model, documents, queries,
+        batch_size=config.embedding_batch_size, threads=config.embedding_threads
+    )
+    print(f"--- PARIDADE DOS BACKENDS DE EMBEDDING ({len(documents)} páginas, {len(queries)} consultas) ---")
+    print(f"{'backend':<8} {'págs/s':>10} {'consulta ms':>12} {'overlap@5':>10} {'top-1':>7}")
+    for entry in report:
+        print(f"{entry['backend']:<8} {entry['docs_per_second']:>10.1f} {entry['query_latency_ms']:>12.1f} "
+              f"{entry['overlap_at_k']:>10.3f} {entry['top1_agreement']:>7.3f}")
@@ -0,0 +1,321 @@
+import time
+import random
+import threading
+import contextlib
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+
+class RateLimiter:
+    """
+    Token-bucket limiter enforcing a request-per-minute and a token-per-minute budget across threads.
+
+    Attributes:
+        requests_per_minute (float): Maximum number of requests per minute, or None for no limit.
+        tokens_per_minute (float): Maximum number of tokens per minute, or None for no limit.
+    """
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None):
+        """
+        Initializes the RateLimiter class with both buckets full.
+
+        Args:
+            requests_per_minute (float, optional): Request budget per minute. Default is no limit.
+            tokens_per_minute (float, optional): Token budget per minute. Default is no limit.
+        """
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._requests = requests_per_minute or 0
+        self._tokens = tokens_per_minute or 0
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed_minutes = (now - self._last_refill) / 60
+        self._last_refill = now
+        if self.requests_per_minute:
+            self._requests = min(self.requests_per_minute, self._requests + elapsed_minutes * self.requests_per_minute)
+        if self.tokens_per_minute:
+            self._tokens = min(self.tokens_per_minute, self._tokens + elapsed_minutes * self.tokens_per_minute)
+
+    def acquire(self, tokens=0):
+        """
+        Blocks until one request and `tokens` tokens fit in the budget, then consumes them.
+
+        Args:
+            tokens (int, optional): Estimated number of tokens of the request. Requests larger than the whole
+                                    token budget are capped to it so they can still run.
+        """
+        if self.tokens_per_minute:
+            tokens = min(tokens, self.tokens_per_minute)
+        while True:
+            with self._lock:
+                self._refill()
+                wait_requests = 0
+                wait_tokens = 0
+                if self.requests_per_minute and self._requests < 1:
+                    wait_requests = (1 - self._requests) * 60 / self.requests_per_minute
+                if self.tokens_per_minute and self._tokens < tokens:
+                    wait_tokens = (tokens - self._tokens) * 60 / self.tokens_per_minute
+                if not wait_requests and not wait_tokens:
+                    if self.requests_per_minute:
+                        self._requests -= 1
+                    if self.tokens_per_minute:
+                        self._tokens -= tokens
+                    return
+            time.sleep(max(wait_requests, wait_tokens))
+
+
+def is_retryable(error):
+    """
+    Tells whether a failed request should be retried: rate limits (429), server errors (5xx) and timeouts.
+
+    Args:
+        error (Exception): Error raised by the model client.
+
+    Returns:
+        bool: True if the request can be retried.
+    """
+    if isinstance(error, TimeoutError) or type(error).__name__ in ("APITimeoutError", "APIConnectionError"):
+        return True
+    status_code = getattr(error, "status_code", None)
+    return status_code is not None and (status_code == 429 or status_code >= 500)
+
+
+def _retry_after(error):
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+# runner and deadline of the row being processed, for the requests the row makes through `model_request`
+_current_row = contextvars.ContextVar("current_row", default=None)
+# set while an attempt of an `EvalRunner` runs
+_in_attempt = contextvars.ContextVar("in_attempt", default=False)
+
+
+def retried_by_runner():
+    """
+    Tells whether the calling code runs inside an attempt of an `EvalRunner`. The runner then retries failed
+    requests itself, within its budget and the row deadline, so model clients should make a single attempt.
+
+    Returns:
+        bool: True inside an attempt of a runner.
+    """
+    return _in_attempt.get()
+
+
+@contextlib.contextmanager
+def _attempt():
+    token = _in_attempt.set(True)
+    try:
+        yield
+    finally:
+        _in_attempt.reset(token)
+
+
+def model_request(fn, *args, tokens=0):
+    """
+    Makes one model request. Inside a row of an `EvalRunner` created with `request_level=True`, the request is
+    charged to the runner's budget, counted against its concurrency and retried on its own; anywhere else `fn`
+    is simply called.
+
+    Threads started by a row must run in a copy of its context (`contextvars.copy_context().run`) for their
+    requests to be charged to the row's runner.
+
+    Args:
+        fn (callable): Function making the request, e.g. `talk_to_model`.
+        *args: Arguments of `fn`.
+        tokens (int, optional): Estimated tokens of the request, prompt and answer included.
+
+    Returns:
+        The result of `fn`.
+    """
+    row = _current_row.get()
+    if row is None:
+        return fn(*args)
+    runner, deadline = row
+    return runner.request(fn, *args, tokens=tokens, deadline=deadline)
+
+
+class EvalRunner:
+    """
+    Runs a function over many items with bounded concurrency, rate limiting, retries and per-row timeouts.
+
+    Retryable failures (429, 5xx, timeouts) are retried with jittered exponential backoff, honoring the
+    `retry-after` header when the error carries one. Results are always returned in input order.
+
+    The row timeout is enforced between attempts: no retry starts once it has passed, and a request in flight
+    is never abandoned, so no more than `max_workers` requests ever run at once. A single request is bounded
+    by the timeout of the model client itself (see `OpenAiModel`), which does not retry on its own inside an
+    attempt of the runner (see `retried_by_runner`).
+
+    A row may make several model requests (section summaries, elements of the briefing). With
+    `request_level=True` the row is neither charged nor retried as a whole: each request it makes through
+    `model_request` is charged with its own token estimate, retried on its own and counted against
+    `max_workers`, so the budgets and the concurrency hold whatever the number of requests per row.
+
+    Attributes:
+        max_workers (int): Maximum number of rows processed at the same time, and of requests in flight with
+                           `request_level`.
+        rate_limiter (RateLimiter): Shared request and token budget.
+        max_retries (int): Maximum number of retries per row.
+        base_delay (float): Backoff delay of the first retry, in seconds.
+        max_delay (float): Upper bound of the backoff delay, in seconds.
+        row_timeout (float): Time after which a failed row is no longer retried, in seconds. None disables it.
+        estimate_tokens (callable): Estimates the tokens of an item, charged to the token budget.
+        request_level (bool): Charge and retry the requests of a row one by one instead of the whole row.
+        errors (dict): Index of each failed row mapped to its last error, filled by `run`.
+    """
+
+    def __init__(self, max_workers=4, requests_per_minute=None, tokens_per_minute=None, max_retries=5,
+                 base_delay=1.0, max_delay=60.0, row_timeout=None, estimate_tokens=None, request_level=False):
+        """
+        Initializes the EvalRunner class.
+
+        Args:
+            max_workers (int, optional): Maximum number of concurrent rows. Default is 4.
+            requests_per_minute (float, optional): Request budget per minute. Default is no limit.
+            tokens_per_minute (float, optional): Token budget per minute. Default is no limit.
+            max_retries (int, optional): Maximum retries per row. Default is 5.
+            base_delay (float, optional): First backoff delay in seconds. Default is 1.0.
+            max_delay (float, optional): Maximum backoff delay in seconds. Default is 60.0.
+            row_timeout (float, optional): Time limit per row in seconds, checked before each attempt.
+                                           Default is no limit.
+            estimate_tokens (callable, optional): Token estimate of an item. Defaults to one token per
+                                                  4 characters plus 1000 completion tokens. Unused with
+                                                  `request_level`.
+            request_level (bool, optional): The row function makes its model requests through `model_request`,
+                                            which charges and retries each of them. Default is False.
+        """
+        self.max_workers = max_workers
+        self.rate_limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.row_timeout = row_timeout
+        self.estimate_tokens = estimate_tokens or (lambda item: len(str(item)) // 4 + 1000)
+        self.request_level = request_level
+        self.errors = {}
+        self._slots = threading.BoundedSemaphore(max_workers)
+
+    def _attempts(self, fn, args, tokens, deadline, slots=None):
+        attempt = 0
+        while True:
+            if deadline is not None and time.monotonic() >= deadline:
+                raise TimeoutError(f"row did not finish within {self.row_timeout:.1f}s")
+            self.rate_limiter.acquire(tokens)
+            try:
+                with slots or contextlib.nullcontext(), _attempt():
+                    return fn(*args)
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                delay = _retry_after(e)
+                if delay is None:
+                    delay = min(self.max_delay, self.base_delay * 2 ** attempt) * random.uniform(0.5, 1.5)
+                if deadline is not None and time.monotonic() + delay >= deadline:
+                    raise TimeoutError(f"row did not finish within {self.row_timeout:.1f}s") from e
+                time.sleep(delay)
+                attempt += 1
+
+    def request(self, fn, *args, tokens=0, deadline=None):
+        """
+        Makes one model request of a row within the shared budget: waits for a free slot among `max_workers`,
+        charges one request and `tokens` tokens, and retries retryable failures with backoff.
+
+        Args:
+            fn (callable): Function making the request.
+            *args: Arguments of `fn`.
+            tokens (int, optional): Estimated tokens of the request. Default is 0.
+            deadline (float, optional): `time.monotonic()` after which no attempt starts. Default is none.
+
+        Returns:
+            The result of `fn`.
+        """
+        return self._attempts(fn, args, tokens, deadline, slots=self._slots)
+
+    def _run_row(self, fn, item):
+        deadline = None if self.row_timeout is None else time.monotonic() + self.row_timeout
+        if not self.request_level:
+            return self._attempts(fn, (item,), self.estimate_tokens(item), deadline)
+        token = _current_row.set((self, deadline))
+        try:
+            return fn(item)
+        finally:
+            _current_row.reset(token)
+
+    def run_iter(self, fn, items, max_pending=None):
+        """
+        Applies `fn` to every item, yielding each outcome as soon as it is available.
+
+        Items are consumed lazily and at most `max_pending` of them are in flight, so memory does not grow
+        with the number of items.
+
+        Args:
+            fn (callable): Function called with one item, returning its result.
+            items (iterable): Items to process.
+            max_pending (int, optional): Maximum number of submitted, unfinished items. Default is twice `max_workers`.
+
+        Yields:
+            tuple: (index, item, result, error) in completion order; `error` is None on success
+                   and `result` is None on failure.
+        """
+        max_pending = max_pending or 2 * self.max_workers
+        items = iter(enumerate(items))
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pending = {}
+            exhausted = False
+            while pending or not exhausted:
+                while not exhausted and len(pending) < max_pending:
+                    try:
+                        index, item = next(items)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    pending[executor.submit(self._run_row, fn, item)] = (index, item)
+                if not pending:
+                    break
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index, item = pending.pop(future)
+                    try:
+                        yield index, item, future.result(), None
+                    except Exception as e:
+                        yield index, item, None, e
+
+    def run(self, fn, items, desc=None):
+        """
+        Applies `fn` to every item.
+
+        Args:
+            fn (callable): Function called with one item, e.g. a paper content, returning its result.
+            items (iterable): Items to process.
+            desc (str, optional): Description of the progress bar. No progress bar if None.
+
+        Returns:
+            list: Results in the order of `items`; None for the rows that failed (see `errors`).
+        """
+        items = list(items)
+        results = [None] * len(items)
+        self.errors = {}
+        progress = None
+        if desc is not None:
+            from tqdm import tqdm
+            progress = tqdm(total=len(items), desc=desc)
+
+        for index, _, result, error in self.run_iter(fn, items, max_pending=len(items)):
+            if error is None:
+                results[index] = result
+            else:
+                self.errors[index] = error
+            if progress is not None:
+                progress.update(1)
+
+        if progress is not None:
+            progress.close()
+        return results
@@ -0,0 +1,325 @@
+import os
+import json
+import hashlib
+
+
+def _pair_sort_key(pair_id):
+    # articles are numbered ("1.pdf", "2.pdf", ...); keep numeric order and put other names after them
+    stem = os.path.splitext(pair_id)[0]
+    return (0, int(stem), pair_id) if stem.isdigit() else (1, 0, pair_id)
+
+
+class EvalStore:
+    """
+    Columnar on-disk store of the evaluation dataset (article/brief pairs), kept as Parquet files.
+
+    Articles and briefs are stored as real list columns (one string per page). The store is read
+    memory-mapped, one column set at a time, so loading the references does not read the articles.
+    It is built incrementally: a manifest keeps the SHA-256 of the PDFs of every pair, and only new or changed
+    pairs are parsed again. An empty store is first seeded with the legacy CSV dataset, if there is one. Briefs generated by an evaluation run are stored in a separate file per run
+    (pair id and generated brief only), so the dataset itself is never copied.
+
+    Attributes:
+        directory (str): Directory of the store.
+        manifest (dict): Source-file fingerprints of the stored pairs.
+    """
+
+    DATASET_NAME = "dataset.parquet"
+    MANIFEST_NAME = "manifest.json"
+    INFERENCE_DIR = "inference"
+    MANIFEST_FORMAT = 1
+    LEGACY_RUN_ID = "legacy"
+
+    def __init__(self, directory="eval_store"):
+        """
+        Initializes the EvalStore class, loading the manifest persisted in `directory`.
+
+        Args:
+            directory (str, optional): Directory of the store. Default is "eval_store".
+        """
+        self.directory = directory
+        self.manifest = self._load_manifest()
+
+    @property
+    def dataset_path(self):
+        return os.path.join(self.directory, self.DATASET_NAME)
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.directory, self.MANIFEST_NAME)
+
+    def inference_path(self, run_id):
+        return os.path.join(self.directory, self.INFERENCE_DIR, f"{run_id}.parquet")
+
+    def _load_manifest(self):
+        if os.path.isfile(self.manifest_path):
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            if manifest.get("format") == self.MANIFEST_FORMAT:
+                return manifest
+        return {"format": self.MANIFEST_FORMAT, "parser_version": None, "pairs": {}}
+
+    def _save_manifest(self):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f)
+        os.replace(tmp_path, self.manifest_path)
+
+    @staticmethod
+    def _file_sha256(path):
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    @staticmethod
+    def _write_table(table, path):
+        import pyarrow.parquet as pq
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, path)
+
+    def exists(self):
+        return os.path.isfile(self.dataset_path)
+
+    @staticmethod
+    def _schema():
+        import pyarrow as pa
+
+        return pa.schema([
+            ("id", pa.string()),
+            ("article", pa.list_(pa.string())),
+            ("brief", pa.list_(pa.string())),
+        ])
+
+    def import_legacy(self, csv_path, inference_path=None):
+        """
+        Seeds the store with the dataset of the former CSV format: one row per pair, whose 'article' and 'brief'
+        cells are Python lists of page texts. The generated briefs of the former inference CSV, if given, are
+        stored as the run `LEGACY_RUN_ID`.
+
+        The pairs get the ids "legacy-001", "legacy-002", ..., in CSV order, and are flagged as legacy in the
+        manifest: they are kept until pairs are found in the article and brief directories.
+
+        Args:
+            csv_path (str): CSV file with the 'article' and 'brief' columns.
+            inference_path (str, optional): CSV file with the 'article', 'brief' and 'generated_brief' columns,
+                                            in the order of `csv_path`.
+
+        Returns:
+            int: Number of imported pairs.
+        """
+        import ast
+        import csv
+        import pyarrow as pa
+
+        csv.field_size_limit(1 << 30)
+        rows, pairs = [], []
+        with open(csv_path, "r", encoding="utf-8", newline="") as f:
+            for position, record in enumerate(csv.DictReader(f), start=1):
+                pair_id = f"legacy-{position:03d}"
+                rows.append({
+                    "id": pair_id,
+                    "article": ast.literal_eval(record["article"]),
+                    "brief": ast.literal_eval(record["brief"]),
+                })
+                pairs.append((record["article"], record["brief"]))
+        if not rows:
+            return 0
+        self._write_table(pa.Table.from_pylist(rows, schema=self._schema()), self.dataset_path)
+        self.manifest["pairs"] = {row["id"]: {"legacy": True} for row in rows}
+        self._save_manifest()
+
+        if inference_path and os.path.isfile(inference_path):
+            # the inference rows follow the dataset rows; the dataset repeats some articles, so a row is matched
+            # by position, or else by its (article, brief) pair
+            ids_by_pair = {}
+            for row, pair in zip(rows, pairs):
+                ids_by_pair.setdefault(pair, []).append(row["id"])
+            generated_briefs = {}
+            with open(inference_path, "r", encoding="utf-8", newline="") as f:
+                for position, record in enumerate(csv.DictReader(f)):
+                    pair = (record["article"], record["brief"])
+                    if position < len(pairs) and pairs[position] == pair:
+                        pair_id = rows[position]["id"]
+                    else:
+                        pair_id = next((pair_id for pair_id in ids_by_pair.get(pair, []) if pair_id not in generated_briefs), None)
+                    if pair_id is not None and record.get("generated_brief"):
+                        generated_briefs[pair_id] = record["generated_brief"]
+            if generated_briefs:
+                self.write_inference(self.LEGACY_RUN_ID, generated_briefs)
+        return len(rows)
+
+    def build(self, data_loader, articles_dir, briefs_dir, legacy_csv=None, legacy_inference=None):
+        """
+        Brings the store up to date with the pairs found in `articles_dir` and `briefs_dir`.
+
+        A pair is a PDF of `articles_dir` with a PDF of the same name in `briefs_dir`. Unchanged pairs are kept
+        as stored, new or changed pairs are parsed, and pairs whose files were removed are dropped. A change of
+        parser version re-parses every pair. If either directory is missing, no pair is added or removed.
+
+        An empty store is first seeded from `legacy_csv` (see `import_legacy`); the legacy pairs are replaced by
+        the pairs of the directories as soon as there are any.
+
+        Args:
+            data_loader (DataLoader): Loader used to parse the PDF files.
+            articles_dir (str): Directory of the articles.
+            briefs_dir (str): Directory of the human-made Evidence Briefings.
+            legacy_csv (str, optional): Dataset of the former CSV format. Default is none.
+            legacy_inference (str, optional): Generated briefs of the former CSV format. Default is none.
+
+        Returns:
+            dict: Number of 'imported', 'added', 'updated', 'removed' and 'unchanged' pairs.
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if self.manifest.get("parser_version") != data_loader.parser_version:
+            # legacy pairs were not parsed by the data loader: a new parser version does not change them
+            legacy = {pair_id: record for pair_id, record in self.manifest["pairs"].items() if record.get("legacy")}
+            self.manifest = {"format": self.MANIFEST_FORMAT, "parser_version": data_loader.parser_version, "pairs": legacy}
+
+        imported = 0
+        if (not self.exists() or not self.manifest["pairs"]) and legacy_csv and os.path.isfile(legacy_csv):
+            imported = self.import_legacy(legacy_csv, legacy_inference)
+            if imported:
+                print(f"Dataset de avaliação importado de '{legacy_csv}': {imported} pares.")
+
+        sources = {}
+        has_directories = os.path.isdir(articles_dir) and os.path.isdir(briefs_dir)
+        for filename in (os.listdir(articles_dir) if has_directories else []):
+            if not filename.lower().endswith('.pdf'):
+                continue
+            brief_path = os.path.join(briefs_dir, filename)
+            if not os.path.isfile(brief_path):
+                print(f"Aviso: O briefing '{filename}' não foi encontrado em '{briefs_dir}'. Par ignorado.")
+                continue
+            article_path = os.path.join(articles_dir, filename)
+            sources[filename] = {
+                "article": article_path,
+                "brief": brief_path,
+                "article_sha256": self._file_sha256(article_path),
+                "brief_sha256": self._file_sha256(brief_path),
+            }
+
+        stored = self.manifest["pairs"]
+        rows = {}
+        if self.exists() and stored:
+            for row in pq.read_table(self.dataset_path, memory_map=True).to_pylist():
+                rows[row["id"]] = row
+
+        stats = {"imported": imported, "added": 0, "updated": 0, "removed": 0, "unchanged": 0}
+        to_parse = {}
+        for pair_id, source in sources.items():
+            record = stored.get(pair_id)
+            if (record and pair_id in rows and record["article_sha256"] == source["article_sha256"]
+                    and record["brief_sha256"] == source["brief_sha256"]):
+                stats["unchanged"] += 1
+                continue
+            stats["updated" if pair_id in rows else "added"] += 1
+            to_parse[pair_id] = source
+        for pair_id in set(rows) - set(sources):
+            if not has_directories or (stored.get(pair_id, {}).get("legacy") and not sources):
+                continue
+            del rows[pair_id]
+            stored.pop(pair_id, None)
+            stats["removed"] += 1
+
+        if not to_parse and not stats["removed"] and self.exists():
+            return stats
+
+        paths = [path for source in to_parse.values() for path in (source["article"], source["brief"])]
+        pages = dict(data_loader.iter_pdfs(paths))
+        for pair_id, source in to_parse.items():
+            article, brief = pages.get(source["article"]), pages.get(source["brief"])
+            if not article or not brief:
+                print(f"Aviso: Não foi possível extrair texto de um dos arquivos do par '{pair_id}'. Par ignorado.")
+                rows.pop(pair_id, None)
+                stored.pop(pair_id, None)
+                continue
+            print(f"Processando par: {pair_id}")
+            rows[pair_id] = {"id": pair_id, "article": article, "brief": brief}
+            stored[pair_id] = {"article_sha256": source["article_sha256"], "brief_sha256": source["brief_sha256"]}
+
+        ordered = [rows[pair_id] for pair_id in sorted(rows, key=_pair_sort_key)]
+        if not ordered and not self.exists():
+            return stats
+        self._write_table(pa.Table.from_pylist(ordered, schema=self._schema()), self.dataset_path)
+        self._save_manifest()
+        return stats
+
+    def load(self, columns=None, runs=()):
+        """
+        Loads the selected columns of the dataset, memory-mapped, optionally joined with generated briefs.
+
+        Args:
+            columns (list, optional): Columns to read among 'id', 'article' and 'brief'. Default is all of them.
+            runs (iterable, optional): Ids of evaluation runs whose generated briefs are added as
+                                       'generated_brief@<run id>' columns. Default is none.
+
+        Returns:
+            pd.DataFrame: One row per pair, in dataset order; 'article' and 'brief' hold lists of page texts.
+        """
+        import pyarrow.parquet as pq
+
+        if columns is not None and runs and "id" not in columns:
+            columns = ["id"] + list(columns)
+        df = pq.read_table(self.dataset_path, columns=columns, memory_map=True).to_pandas()
+        for run_id in runs:
+            path = self.inference_path(run_id)
+            if not os.path.isfile(path):
+                continue
+            inference = pq.read_table(path, memory_map=True).to_pandas()
+            inference = inference.rename(columns={"generated_brief": f"generated_brief@{run_id}"})
+            df = df.merge(inference, on="id", how="left")
+        return df
+
+    def iter_rows(self, columns=None, batch_size=64):
+        """
+        Streams the dataset in record batches, so memory stays flat.
+
+        Args:
+            columns (list, optional): Columns to read. Default is all of them.
+            batch_size (int, optional): Number of rows read at a time. Default is 64.
+
+        Yields:
+            dict: Row with its position ('row') and the selected columns.
+        """
+        import pyarrow.parquet as pq
+
+        position = 0
+        parquet_file = pq.ParquetFile(self.dataset_path, memory_map=True)
+        for batch in parquet_file.iter_batches(batch_size=batch_size, columns=columns):
+            for row in batch.to_pylist():
+                yield {"row": position, **row}
+                position += 1
+
+    def write_inference(self, run_id, generated_briefs):
+        """
+        Stores the briefs generated by one evaluation run, replacing a previous version of the same run.
+
+        Args:
+            run_id (str): Id of the run (e.g. the configuration hash of its run log).
+            generated_briefs (dict): Pair id mapped to the generated brief.
+        """
+        import pyarrow as pa
+
+        table = pa.table({
+            "id": pa.array(list(generated_briefs), pa.string()),
+            "generated_brief": pa.array(list(generated_briefs.values()), pa.string()),
+        })
+        self._write_table(table, self.inference_path(run_id))
+
+    def runs(self):
+        """
+        Returns:
+            list: Ids of the runs with stored generated briefs.
+        """
+        directory = os.path.join(self.directory, self.INFERENCE_DIR)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(os.path.splitext(name)[0] for name in os.listdir(directory) if name.endswith(".parquet"))
@@ -1,114 +1,125 @@
-from data_loader import DataLoader
 import os
-import pandas as pd
-import evaluate
+from eval_store import EvalStore
+from metrics import DEFAULT_METRICS, registry
+from scoring import BatchScorer, RunningScores, score_pairs
+from tracing import tracer
 
 
 class Evaluator:
     
-    def __init__(self):
-        self.rouge = evaluate.load('rouge')
-        self.bleu = evaluate.load('bleu')
-        self.meteor = evaluate.load('meteor')
-        pass
-
-    def create_eval_dataset(self, data_loader):
+    def __init__(self, metrics=DEFAULT_METRICS, workers=None, store_directory="eval_store"):
         """
-        Create a new evaluation dataset , considering the articles present in the "x" folder
-        and the human-made Evidence Briefings present in the "y" folder. Both directories are present inside 
-        the "briefings" folder. The json is formatted as follows:
-        {"id":"01","article":"<article text>","reference":"<human made evidence briefing text>"} 
+        Initializes the Evaluator class. Metrics are only loaded when the first rows are scored.
+
+        Args:
+            metrics (tuple, optional): Names of the metrics in `metrics.registry`. Default is ROUGE, BLEU and METEOR.
+            workers (int, optional): Number of worker processes used by `evaluate`. Defaults to the number of CPUs.
+            store_directory (str, optional): Directory of the columnar dataset store. Default is "eval_store".
         """
+        self.metrics = tuple(metrics)
+        self.scorer = BatchScorer(self.metrics, workers=workers)
+        self.store = EvalStore(store_directory)
 
+    def create_eval_dataset(self, data_loader):
+        """
+        Creates or updates the evaluation dataset from the articles in the "x" folder and the human-made
+        Evidence Briefings in the "y" folder, both inside the "briefings" folder. Pairs share the same file
+        name. Only new or changed pairs are parsed; see `EvalStore.build`. An empty store is first seeded
+        with the former CSV dataset ("eval_dataset.csv") and its generated briefs ("eval_dataset_with_inference").
 
+        Args:
+            data_loader (DataLoader): Loader used to parse the PDF files.
+        """
         articles_dir = os.path.join('briefings', 'x')
         briefs_dir = os.path.join('briefings', 'y')
-        output_csv_name = "eval_dataset.csv"
-        output_path = os.path.join(os.getcwd(), output_csv_name)
-        if os.path.exists(output_path):
-            return
+        stats = self.store.build(
+            data_loader, articles_dir, briefs_dir,
+            legacy_csv="eval_dataset.csv", legacy_inference="eval_dataset_with_inference"
+        )
+        if stats['added'] or stats['updated'] or stats['removed']:
+            print(f"Dataset de avaliação atualizado: {stats['added']} novos, {stats['updated']} alterados, "
+                  f"{stats['removed']} removidos, {stats['unchanged']} inalterados.")
+        if not self.store.exists():
+            print("Nenhum par de artigo/briefing válido foi encontrado. O dataset não foi gerado.")
 
-        data_for_df = []
+    def load_eval_dataset(self, columns=None, runs=()):
+        """
+        Load the evaluation dataset from the columnar store, memory-mapped.
 
-    
-        article_files = sorted(
-            [f for f in os.listdir(articles_dir) if f.lower().endswith('.pdf')],
-            key=lambda name: int(os.path.splitext(name)[0])
-        )
+        Args:
+            columns (list, optional): Columns to read among 'id', 'article' and 'brief'. Default is all of them.
+            runs (iterable, optional): Ids of evaluation runs whose generated briefs are added as columns.
 
-        for filename in article_files:
-            article_filepath = os.path.join(articles_dir, filename)
-            brief_filepath = os.path.join(briefs_dir, filename)
-
-            if os.path.isfile(brief_filepath):
-                print(f"Processando par: {filename}")
-                
-                
-                article_text = data_loader.load_single_pdf(article_filepath)
-                brief_text = data_loader.load_single_pdf(brief_filepath)
-
-                if article_text and brief_text:
-                    data_for_df.append({'article': article_text, 'brief': brief_text})
-                else:
-                    print(f"Aviso: Não foi possível extrair texto de um dos arquivos do par '{filename}'. Par ignorado.")
-            else:
-                print(f"Aviso: O briefing '{filename}' não foi encontrado em '{briefs_dir}'. Par ignorado.")
-
-        if not data_for_df:
-            print("Nenhum par de artigo/briefing válido foi encontrado. O CSV não foi gerado.")
-            return
-
-        df = pd.DataFrame(data_for_df)
-        output_path = os.path.join(os.getcwd(), output_csv_name)
-        df.to_csv(output_path, index=False, encoding='utf-8')
-        
-       
-        print(f"Total de pares (linhas) no CSV: {len(df)}")
-
-
-    def load_eval_dataset(self):
+        Returns:
+            pd.DataFrame: One row per pair; 'article' and 'brief' hold lists of page texts.
         """
-        Load the evaluation dataset from the CSV file.
+        return self.store.load(columns, runs)
+
+    def iter_eval_dataset(self, chunksize=64):
         """
-        df = pd.read_csv("eval_dataset.csv", dtype=str)
-        return df
+        Streams the evaluation dataset row by row, reading it in record batches so memory stays flat.
+
+        Args:
+            chunksize (int, optional): Number of rows read at a time. Default is 64.
+
+        Yields:
+            dict: Row with its position ('row'), its pair 'id' and the 'article' and 'brief' texts.
+        """
+        for row in self.store.iter_rows(batch_size=chunksize):
+            yield {'row': row['row'], 'id': row['id'], 'article': " ".join(row['article']), 'brief': " ".join(row['brief'])}
+
+    def score_row(self, prediction, reference):
+        """
+        Calcula as métricas selecionadas de um único par.
+
+        Args:
+            prediction (str): Briefing gerado pelo modelo.
+            reference (str): Briefing de referência.
+
+        Returns:
+            dict: Pontuações por linha (ex.: 'rouge1', 'rouge2', 'rougeL', 'rougeLsum', 'bleu' e 'meteor'), além das
+                  estatísticas 'bleu_stats' usadas no BLEU agregado.
+        """
+        with tracer.span("score"):
+            return score_pairs([(prediction, reference)], self.metrics)[0]
+
+    def running_scores(self):
+        """
+        Returns:
+            RunningScores: Agregado incremental das métricas selecionadas.
+        """
+        return self.scorer.running()
     
     def evaluate(self,results_dataframe):
         """
-        Calcula as métricas ROUGE, BLEU e METEOR a partir de um DataFrame.
+        Calcula as métricas selecionadas a partir de um DataFrame.
+
+        Todas as métricas por linha são calculadas em uma só passada, distribuída entre os núcleos da CPU em
+        datasets grandes. As pontuações agregadas são derivadas dos
+        resultados por linha.
 
         Args:
             results_dataframe (pd.DataFrame): DataFrame que deve conter as colunas
-                                              'reference_brief' (gabarito) e
+                                              'brief' (gabarito, texto ou lista de páginas) e
                                               'generated_brief' (predição do modelo).
 
         Returns:
-            tuple: Um DataFrame com a coluna de score individual (rougeL_score)
-                   e um dicionário com as pontuações agregadas.
+            tuple: Um DataFrame com uma coluna de score individual por chave das métricas (ex.: 'rouge1', 'bleu',
+                   'meteor'; com ROUGE, também 'rougeL_score') e um dicionário com as pontuações agregadas.
         """
 
         # Extrai as listas para cálculo
         predictions = results_dataframe['generated_brief'].tolist()
-        references = results_dataframe['brief'].tolist()
-        # Calcula as pontuações agregadas
-        rouge_scores = self.rouge.compute(predictions=predictions, references=references)
-        bleu_scores = self.bleu.compute(predictions=predictions, references=references)
-        meteor_scores = self.meteor.compute(predictions=predictions, references=references)
-        
-        aggregated_scores = {
-            "ROUGE": rouge_scores,
-            "BLEU": bleu_scores,
-            "METEOR": meteor_scores
-        }
-        
-        # Calcula ROUGE-L para cada linha individualmente e adiciona ao DF
-        rouge_l_scores = []
-        for pred, ref in zip(predictions, references):
-            score = self.rouge.compute(predictions=[pred], references=[ref])
-            rouge_l_scores.append(score['rougeL'])
-            
-        results_dataframe['rougeL_score'] = rouge_l_scores
+        # o dataset guarda os briefings como listas de páginas
+        references = [brief if isinstance(brief, str) else " ".join(brief) for brief in results_dataframe['brief']]
+        with tracer.span("score", rows=len(predictions)):
+            rows = self.scorer.score(predictions, references)
+            aggregated_scores = self.scorer.aggregate(rows)
+
+        for name in self.metrics:
+            for key in registry.get(name).keys:
+                results_dataframe[key] = [row[key] for row in rows]
+        if 'rougeL' in results_dataframe:
+            results_dataframe['rougeL_score'] = results_dataframe['rougeL']
 
         return results_dataframe, aggregated_scores
-
-
@@ -0,0 +1,100 @@
+import time
+import hashlib
+import threading
+
+
+class FakeAPIError(Exception):
+    """
+    Error raised by `FakeChatModel`, shaped like the OpenAI client errors (`status_code`, `response.headers`).
+    """
+
+    class _Response:
+        def __init__(self, headers):
+            self.headers = headers
+
+    def __init__(self, status_code, retry_after=None):
+        super().__init__(f"fake API error {status_code}")
+        self.status_code = status_code
+        self.response = self._Response({} if retry_after is None else {"retry-after": str(retry_after)})
+
+
+class FakeChatModel:
+    """
+    Offline stand-in for `OpenAiModel`, used to exercise concurrency, throttling and retries without network access.
+
+    Responses are deterministic: they depend only on the messages. The model records how many calls it received
+    and the highest number of calls it served at the same time.
+
+    Attributes:
+        model_name (str): Name reported by the stub.
+        temperature (float): Kept for interface compatibility with `OpenAiModel`.
+        latency (float): Seconds each call sleeps before answering.
+        errors (list): Errors to raise, in order, on the first calls: status codes, or (status code, retry-after
+                       seconds) pairs (e.g. [(429, 2), 503]).
+        calls (int): Number of calls received.
+        max_concurrency (int): Highest number of simultaneous calls observed.
+    """
+
+    def __init__(self, model_name="fake", temperature=0.0, latency=0.0, errors=None):
+        """
+        Initializes the FakeChatModel class.
+
+        Args:
+            model_name (str, optional): Name reported by the stub. Default is "fake".
+            temperature (float, optional): Ignored. Default is 0.0.
+            latency (float, optional): Seconds each call takes. Default is 0.0.
+            errors (list, optional): Status codes, or (status code, retry-after) pairs, raised by the first calls,
+                                     one per call. Default is none.
+        """
+        self.model_name = model_name
+        self.temperature = temperature
+        self.latency = latency
+        self.errors = list(errors or [])
+        self.calls = 0
+        self.max_concurrency = 0
+        self._active = 0
+        self._lock = threading.Lock()
+
+    def warm_up(self):
+        pass
+
+    def talk_to_model(self, system_message, human_message):
+        """
+        Returns a deterministic fake briefing after `latency` seconds, or raises the next scheduled error.
+
+        Args:
+            system_message (str): System message.
+            human_message (str): Human message.
+
+        Returns:
+            str: Fake briefing derived from the messages.
+        """
+        with self._lock:
+            self.calls += 1
+            self._active += 1
+            self.max_concurrency = max(self.max_concurrency, self._active)
+            error = self.errors.pop(0) if self.errors else None
+        try:
+            if self.latency:
+                time.sleep(self.latency)
+            if error is not None:
+                raise FakeAPIError(*error) if isinstance(error, tuple) else FakeAPIError(error)
+            digest = hashlib.sha256(f"{system_message}\n{human_message}".encode("utf-8")).hexdigest()[:12]
+            summary = " ".join(human_message.split()[6:60])
+            return f"Evidence Briefing {digest}\n\n{summary}"
+        finally:
+            with self._lock:
+                self._active -= 1
+
+    def stream_model(self, system_message, human_message, stats=None):
+        """
+        Yields the response of `talk_to_model` word by word.
+        """
+        stats = {} if stats is None else stats
+        start = time.perf_counter()
+        words = self.talk_to_model(system_message, human_message).split(" ")
+        stats["time_to_first_token"] = time.perf_counter() - start
+        for index, word in enumerate(words):
+            yield word if index == 0 else " " + word
+        stats.update(total_time=time.perf_counter() - start, tokens=len(words), cached=False)
+        stats["tokens_per_second"] = len(words) / max(stats["total_time"] - stats["time_to_first_token"], 1e-9)
@@ -0,0 +1,236 @@
+import os
+import json
+import hashlib
+from importlib import metadata
+from chunking import BRIEFING_SECTIONS, chunk_pages
+from lexical_index import BM25Index
+from vector_store import open_vector_store
+
+
+class IndexManager:
+    """
+    Class responsible for keeping the persisted vector index in sync with the PDF files of a directory.
+
+    PDFs are cut into chunks at index time, aligned with the sections of the briefings and tagged with their
+    section (see `chunking.chunk_pages`). Each source PDF is fingerprinted (size, modification time and SHA-256
+    of its bytes) and each of its chunks by the SHA-256 of its text. Only new or changed chunks are embedded,
+    vectors of deleted chunks/files are removed, and a change of embedding model (name or version), of vector
+    store or of chunking forces a full rebuild. The fingerprints are stored in a manifest file next to the
+    vector store.
+
+    A lexical BM25 index of the same chunks (see `lexical_index.BM25Index`) is updated along with the vector
+    store and persisted next to it, as "<collection_name>_bm25.json".
+
+    Attributes:
+        data_loader (DataLoader): Used to parse the PDF files that changed since the last sync.
+        embedding: Embedding function used by the vector store.
+        embedding_model (str): Name of the embedding model, recorded in the manifest.
+        embedding_model_version (str): Version of the embedding model, recorded in the manifest.
+        persist_directory (str): Directory where the vector store and the manifest are stored.
+        collection_name (str): Name of the collection in the vector store.
+        vector_store (str): Kind of vector store, "chroma" or "numpy"; see `vector_store.open_vector_store`.
+        chunk_size (int): Maximum size of an indexed chunk in characters.
+        sections (dict): Section name mapped to the patterns of its heading; see `chunking.BRIEFING_SECTIONS`.
+        manifest (dict): Fingerprints of the indexed files, loaded from `persist_directory`.
+        lexical_index (BM25Index): Inverted index of the chunks, loaded from `persist_directory`.
+    """
+
+    MANIFEST_NAME = "index_manifest.json"
+    MANIFEST_FORMAT = 2
+
+    def __init__(self, data_loader, embedding, embedding_model, persist_directory="./chroma_db",
+                 embedding_model_version=None, collection_name="briefings", vector_store="chroma", chunk_size=1000,
+                 sections=None):
+        """
+        Initializes the IndexManager class.
+
+        Args:
+            data_loader (DataLoader): Loader used to parse new or changed PDF files.
+            embedding: Embedding function passed to the vector store.
+            embedding_model (str): Name of the embedding model.
+            persist_directory (str, optional): Directory of the persisted index. Default is "./chroma_db".
+            embedding_model_version (str, optional): Version of the embedding model. Defaults to the
+                                                     installed `sentence-transformers` version.
+            collection_name (str, optional): Name of the collection. Default is "briefings".
+            vector_store (str, optional): "chroma" or "numpy". Default is "chroma".
+            chunk_size (int, optional): Maximum size of an indexed chunk in characters. Default is 1000.
+            sections (dict, optional): Section headings to chunk at. Default is `chunking.BRIEFING_SECTIONS`.
+        """
+        self.data_loader = data_loader
+        self.embedding = embedding
+        self.embedding_model = embedding_model
+        self.embedding_model_version = embedding_model_version or self._default_model_version()
+        self.persist_directory = persist_directory
+        self.collection_name = collection_name
+        self.vector_store = vector_store
+        self.chunk_size = chunk_size
+        self.sections = sections or BRIEFING_SECTIONS
+        self.manifest = self._load_manifest()
+        self.lexical_index = BM25Index(os.path.join(persist_directory, f"{collection_name}_bm25.json"))
+
+    @staticmethod
+    def _default_model_version():
+        try:
+            return "sentence-transformers==" + metadata.version("sentence-transformers")
+        except metadata.PackageNotFoundError:
+            return "unknown"
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.persist_directory, self.MANIFEST_NAME)
+
+    @property
+    def index_version(self):
+        """
+        Stamp that changes whenever the content of the index changes.
+
+        Returns:
+            str: SHA-256 of the embedding model and of every indexed chunk id.
+        """
+        digest = hashlib.sha256()
+        digest.update(f"{self.embedding_model}|{self.embedding_model_version}".encode("utf-8"))
+        for relpath in sorted(self.manifest["files"]):
+            for chunk_id in self.manifest["files"][relpath]["chunks"]:
+                digest.update(chunk_id.encode("utf-8"))
+        return digest.hexdigest()
+
+    def _empty_manifest(self):
+        return {
+            "format": self.MANIFEST_FORMAT,
+            "embedding_model": self.embedding_model,
+            "embedding_model_version": self.embedding_model_version,
+            "vector_store": self.vector_store,
+            "chunking": self._chunking(),
+            "files": {},
+        }
+
+    def _load_manifest(self):
+        if not os.path.isfile(self.manifest_path):
+            return self._empty_manifest()
+        with open(self.manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _save_manifest(self):
+        os.makedirs(self.persist_directory, exist_ok=True)
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _open_vectorstore(self):
+        return open_vector_store(self.vector_store, self.persist_directory, self.embedding, self.collection_name)
+
+    def _model_changed(self):
+        return (
+            self.manifest.get("format") != self.MANIFEST_FORMAT
+            or self.manifest.get("embedding_model") != self.embedding_model
+            or self.manifest.get("embedding_model_version") != self.embedding_model_version
+            or self.manifest.get("vector_store", "chroma") != self.vector_store
+            or self.manifest.get("chunking") != self._chunking()
+        )
+
+    def _chunking(self):
+        return {"chunk_size": self.chunk_size, "sections": {name: list(patterns) for name, patterns in self.sections.items()}}
+
+    @staticmethod
+    def _file_sha256(path):
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    @staticmethod
+    def _chunk_id(relpath, chunk):
+        text_hash = hashlib.sha256(chunk["text"].encode("utf-8")).hexdigest()
+        key = f"{relpath}|{chunk['page']}|{chunk['index']}|{chunk['section']}|{text_hash}"
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def sync(self, data_path):
+        """
+        Brings the persisted index up to date with the PDF files in `data_path` and returns it.
+
+        Files whose size and modification time did not change are not even read, so opening an unchanged
+        index only costs a `stat` per file. Files with new content are parsed and chunked, and only the
+        chunks whose text or section changed are embedded.
+
+        Args:
+            data_path (str): Path to the directory containing the PDF files to be indexed.
+
+        Returns:
+            VectorStore: The up-to-date vector store. `lexical_index` is up to date as well.
+        """
+        vectorstore = self._open_vectorstore()
+        if self._model_changed():
+            print(f"Modelo de embedding ou armazenamento alterado ('{self.embedding_model}', '{self.vector_store}'). "
+                  "Reconstruindo o índice.")
+            vectorstore.reset()
+            self.lexical_index.reset()
+            self.manifest = self._empty_manifest()
+        elif self.manifest["files"] and not self.lexical_index.exists():
+            # index built before the lexical index existed, or its file was removed
+            print("Índice lexical (BM25) ausente. Reconstruindo o índice.")
+            vectorstore.reset()
+            self.manifest = self._empty_manifest()
+
+        indexed_files = self.manifest["files"]
+        current_files = sorted(f for f in os.listdir(data_path) if f.endswith(".pdf"))
+        changed = False
+
+        for relpath in set(indexed_files) - set(current_files):
+            vectorstore.delete(list(indexed_files[relpath]["chunks"]))
+            self.lexical_index.delete(list(indexed_files[relpath]["chunks"]))
+            del indexed_files[relpath]
+            changed = True
+
+        to_parse = {}
+        for relpath in current_files:
+            file_path = os.path.join(data_path, relpath)
+            stat = os.stat(file_path)
+            record = indexed_files.get(relpath)
+            if record and record["size"] == stat.st_size and record["mtime_ns"] == stat.st_mtime_ns:
+                continue
+
+            file_hash = self._file_sha256(file_path)
+            if record and record["sha256"] == file_hash:
+                record["size"], record["mtime_ns"] = stat.st_size, stat.st_mtime_ns
+                changed = True
+                continue
+            to_parse[file_path] = (relpath, stat, file_hash)
+
+        # changed files are parsed in parallel and embedded as soon as each one is ready
+        for file_path, pages in self.data_loader.iter_pdfs(list(to_parse)):
+            relpath, stat, file_hash = to_parse[file_path]
+            record = indexed_files.get(relpath)
+            new_chunks = {}
+            texts, metadatas, ids = [], [], []
+            old_chunks = record["chunks"] if record else {}
+            for chunk in chunk_pages(pages, self.chunk_size, self.sections):
+                chunk_id = self._chunk_id(relpath, chunk)
+                new_chunks[chunk_id] = chunk["page"]
+                if chunk_id not in old_chunks:
+                    texts.append(chunk["text"])
+                    metadatas.append({"source": relpath, "page": chunk["page"], "section": chunk["section"]})
+                    ids.append(chunk_id)
+
+            stale_ids = [chunk_id for chunk_id in old_chunks if chunk_id not in new_chunks]
+            if stale_ids:
+                vectorstore.delete(stale_ids)
+                self.lexical_index.delete(stale_ids)
+            if ids:
+                vectorstore.add(ids, texts, metadatas)
+                self.lexical_index.add(ids, texts, metadatas)
+
+            indexed_files[relpath] = {
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "sha256": file_hash,
+                "chunks": new_chunks,
+            }
+            changed = True
+
+        vectorstore.flush()
+        self.lexical_index.flush()
+        if changed or not os.path.isfile(self.manifest_path):
+            self._save_manifest()
+        return vectorstore
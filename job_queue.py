@@ -0,0 +1,194 @@
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+
+class JobStore:
+    """
+    Persistent table of briefing jobs stored in SQLite, so queued and finished jobs survive page reloads
+    and server restarts.
+
+    Attributes:
+        path (str): Path of the SQLite database.
+    """
+
+    COLUMNS = ("id", "owner", "file_path", "user_topic", "status", "partial", "result", "error", "stats",
+               "created", "started", "finished")
+
+    def __init__(self, path=".jobs.sqlite"):
+        """
+        Initializes the JobStore class, creating the database if needed.
+
+        Args:
+            path (str, optional): Path of the SQLite database. Default is ".jobs.sqlite".
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, owner TEXT, file_path TEXT, user_topic TEXT, status TEXT, partial TEXT, "
+                "result TEXT, error TEXT, stats TEXT, created REAL, started REAL, finished REAL)"
+            )
+            self._connection.execute("CREATE INDEX IF NOT EXISTS jobs_owner ON jobs (owner, created)")
+
+    def _row(self, values):
+        job = dict(zip(self.COLUMNS, values))
+        job["stats"] = json.loads(job["stats"]) if job["stats"] else {}
+        return job
+
+    def create(self, owner, file_path, user_topic):
+        """
+        Adds a queued job.
+
+        Returns:
+            str: Id of the new job.
+        """
+        job_id = uuid.uuid4().hex
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT INTO jobs (id, owner, file_path, user_topic, status, partial, created) VALUES (?, ?, ?, ?, ?, '', ?)",
+                (job_id, owner, file_path, user_topic, QUEUED, time.time())
+            )
+        return job_id
+
+    def update(self, job_id, **fields):
+        """
+        Updates some columns of a job; 'stats' is given as a dict.
+        """
+        if "stats" in fields:
+            fields["stats"] = json.dumps(fields["stats"])
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        with self._lock, self._connection:
+            self._connection.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def get(self, job_id):
+        with self._lock:
+            values = self._connection.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return None if values is None else self._row(values)
+
+    def list(self, owner, limit=50):
+        """
+        Returns:
+            list: The most recent jobs of `owner`, newest first.
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM jobs WHERE owner = ? ORDER BY created DESC LIMIT ?",
+                (owner, limit)
+            ).fetchall()
+        return [self._row(values) for values in rows]
+
+    def unfinished(self):
+        """
+        Returns:
+            list: Jobs still queued or running, oldest first.
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM jobs WHERE status IN (?, ?) ORDER BY created",
+                (QUEUED, RUNNING)
+            ).fetchall()
+        return [self._row(values) for values in rows]
+
+    def delete(self, job_id):
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+
+class JobQueue:
+    """
+    Runs briefing jobs in the background on a bounded thread pool shared by every session of the server.
+
+    A job streams its briefing through `Controller.process_stream`; the text generated so far is saved to the
+    job table at most every `progress_interval` seconds, so the interface can show progress without blocking.
+    Jobs left queued or running by a previous server process are run again when the queue starts.
+
+    Attributes:
+        controller (Controller): Controller used to generate the briefings.
+        store (JobStore): Persistent job table.
+        max_workers (int): Maximum number of jobs running at the same time.
+    """
+
+    def __init__(self, controller, store, max_workers=2, progress_interval=0.5):
+        """
+        Initializes the JobQueue class and resumes the unfinished jobs of `store`.
+
+        Args:
+            controller (Controller): Controller used to generate the briefings.
+            store (JobStore): Persistent job table.
+            max_workers (int, optional): Maximum number of concurrent jobs. Default is 2.
+            progress_interval (float, optional): Seconds between progress updates of a job. Default is 0.5.
+        """
+        self.controller = controller
+        self.store = store
+        self.max_workers = max_workers
+        self.progress_interval = progress_interval
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="briefing-job")
+        for job in store.unfinished():
+            store.update(job["id"], status=QUEUED, partial="")
+            self._executor.submit(self._run, job["id"])
+
+    def submit(self, owner, file_path, user_topic=''):
+        """
+        Queues the briefing of a PDF file.
+
+        Args:
+            owner (str): Id of the browser session that owns the job.
+            file_path (str): Path to the PDF file.
+            user_topic (str, optional): Custom topic used to refine the retrieved context.
+
+        Returns:
+            str: Id of the job.
+        """
+        job_id = self.store.create(owner, file_path, user_topic)
+        self._executor.submit(self._run, job_id)
+        return job_id
+
+    def _run(self, job_id):
+        job = self.store.get(job_id)
+        if job is None:
+            return
+        self.store.update(job_id, status=RUNNING, started=time.time())
+        stats = {}
+        chunks = []
+        last_update = time.monotonic()
+        try:
+            for chunk in self.controller.process_stream(job["file_path"], job["user_topic"], stats=stats):
+                chunks.append(chunk)
+                if time.monotonic() - last_update >= self.progress_interval:
+                    self.store.update(job_id, partial="".join(chunks))
+                    last_update = time.monotonic()
+            self.store.update(job_id, status=DONE, result="".join(chunks), partial="", stats=stats,
+                              finished=time.time())
+        except Exception as e:
+            self.store.update(job_id, status=FAILED, error=str(e), partial="".join(chunks), finished=time.time())
+
+
+def get_job_queue(controller, path=".jobs.sqlite", max_workers=2):
+    """
+    Returns the process-wide JobQueue of `controller`, so every session shares the same concurrency limit.
+
+    Args:
+        controller (Controller): Controller used to generate the briefings.
+        path (str, optional): Path of the SQLite job table. Default is ".jobs.sqlite".
+        max_workers (int, optional): Maximum number of concurrent jobs. Default is 2.
+
+    Returns:
+        JobQueue: Shared queue.
+    """
+    from resources import get_resource
+
+    return get_resource(
+        ("JobQueue", id(controller), path, max_workers),
+        lambda: JobQueue(controller, JobStore(path), max_workers=max_workers)
+    )
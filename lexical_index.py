@@ -0,0 +1,168 @@
+import os
+import re
+import json
+import math
+import threading
+from collections import Counter
+
+# frequent English and Portuguese words, which carry no topic
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has in is it of on or that the this to was were what where which who with "
+    "o os as um uma de da do das dos e em no na nos nas para por com que se ao aos".split()
+)
+
+
+def tokenize(text):
+    """
+    Splits a text into the lowercased words indexed by `BM25Index`, without stopwords.
+    """
+    return [word for word in re.findall(r"\w+", text.lower()) if word not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    Lexical inverted index ranking chunks with Okapi BM25, kept next to the vector index and in sync with it.
+
+    The postings (word mapped to the chunks containing it, with its frequency in each) are built at index time
+    and persisted as JSON, so a query only reads the postings of its own words and costs no embedding.
+
+    Attributes:
+        path (str): JSON file of the index.
+        k1 (float): BM25 term-frequency saturation.
+        b (float): BM25 length normalization.
+    """
+
+    FORMAT = 1
+
+    def __init__(self, path, k1=1.5, b=0.75):
+        """
+        Initializes the BM25Index class, loading the index persisted in `path` if there is one.
+
+        Args:
+            path (str): JSON file of the index.
+            k1 (float, optional): BM25 term-frequency saturation. Default is 1.5.
+            b (float, optional): BM25 length normalization. Default is 0.75.
+        """
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._documents = {}
+        self._postings = {}
+        self._total_length = 0
+        self._dirty = False
+        if os.path.isfile(path):
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("format") == self.FORMAT:
+                self._documents = data["documents"]
+                self._postings = data["postings"]
+                self._total_length = sum(document["length"] for document in self._documents.values())
+
+    def exists(self):
+        return os.path.isfile(self.path)
+
+    def add(self, ids, texts, metadatas):
+        """
+        Indexes chunks, replacing the chunks that already have the same id.
+        """
+        with self._lock:
+            self._delete(ids)
+            for chunk_id, text, metadata in zip(ids, texts, metadatas):
+                frequencies = Counter(tokenize(text))
+                length = sum(frequencies.values())
+                self._documents[chunk_id] = {"text": text, "metadata": metadata, "length": length}
+                self._total_length += length
+                for word, frequency in frequencies.items():
+                    self._postings.setdefault(word, {})[chunk_id] = frequency
+            self._dirty = True
+
+    def _delete(self, ids):
+        for chunk_id in ids:
+            document = self._documents.pop(chunk_id, None)
+            if document is None:
+                continue
+            self._total_length -= document["length"]
+            for word in set(tokenize(document["text"])):
+                postings = self._postings.get(word)
+                if postings is not None:
+                    postings.pop(chunk_id, None)
+                    if not postings:
+                        del self._postings[word]
+            self._dirty = True
+
+    def delete(self, ids):
+        """
+        Removes the chunks with the given ids; unknown ids are ignored.
+        """
+        with self._lock:
+            self._delete(ids)
+
+    def reset(self):
+        """
+        Removes every chunk.
+        """
+        with self._lock:
+            self._documents, self._postings, self._total_length = {}, {}, 0
+            self._dirty = True
+
+    def count(self):
+        return len(self._documents)
+
+    def flush(self):
+        """
+        Writes the index to `path` if it changed; called once at the end of an index sync.
+        """
+        with self._lock:
+            if not self._dirty and self.exists():
+                return
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"format": self.FORMAT, "documents": self._documents, "postings": self._postings}, f)
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+
+    def search(self, queries, k, filters=None):
+        """
+        Finds the `k` best-scoring chunks of each query.
+
+        Args:
+            queries (list): Textual queries.
+            k (int): Number of chunks per query.
+            filters (list, optional): One metadata filter per query, e.g. {"section": "Main Findings"}, or None
+                                      to search every chunk. Default is no filter.
+
+        Returns:
+            list: One list of hits per query, best first. A hit is a dict with the chunk 'id', 'text',
+                  'metadata' and BM25 'score'; chunks sharing no word with the query are not returned.
+        """
+        filters = filters or [None] * len(queries)
+        with self._lock:
+            documents, postings = self._documents, self._postings
+            count = len(documents)
+            average_length = self._total_length / count if count else 0.0
+            results = []
+            for query, where in zip(queries, filters):
+                scores = {}
+                for word in set(tokenize(query)):
+                    word_postings = postings.get(word)
+                    if not word_postings:
+                        continue
+                    idf = math.log(1 + (count - len(word_postings) + 0.5) / (len(word_postings) + 0.5))
+                    for chunk_id, frequency in word_postings.items():
+                        length = documents[chunk_id]["length"]
+                        norm = self.k1 * (1 - self.b + self.b * length / average_length) if average_length else self.k1
+                        scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+                if where:
+                    scores = {
+                        chunk_id: score for chunk_id, score in scores.items()
+                        if all(documents[chunk_id]["metadata"].get(field) == value for field, value in where.items())
+                    }
+                best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+                results.append([
+                    {"id": chunk_id, "text": documents[chunk_id]["text"], "metadata": documents[chunk_id]["metadata"],
+                     "score": score}
+                    for chunk_id, score in best
+                ])
+        return results
@@ -0,0 +1,331 @@
+import copy
+import time
+import queue
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from resources import startup_report
+
+
+class LocalModel:
+    """
+    Chat model that runs a small instruct model on CPU with `transformers`, behind the interface of `OpenAiModel`,
+    so briefings can be generated offline.
+
+    Concurrent `talk_to_model` calls (e.g. the rows of `Controller.process_eval`) are gathered into batches of up
+    to `batch_size` requests sharing the same system message, and generated together. The key/value cache of the
+    system message, which is the same for every paper, is computed once and reused by every request that starts
+    with it; only the paper has to be encoded for each request.
+
+    Attributes:
+        model_name (str): Name or path of the Hugging Face model.
+        temperature (float): Sampling temperature; 0 decodes greedily.
+        max_new_tokens (int): Maximum length of an answer in tokens.
+        batch_size (int): Maximum number of requests generated together.
+        batch_wait (float): Seconds a request waits for others to join its batch.
+        threads (int): Number of CPU threads of PyTorch, or None for its default.
+        stream_stats (deque): Time to first token and tokens per second of the latest streamed requests.
+    """
+
+    def __init__(self, model_name="Qwen/Qwen2.5-0.5B-Instruct", temperature=0.5, max_new_tokens=1500, batch_size=4,
+                 batch_wait=0.05, threads=None, prefix_cache_size=4):
+        """
+        Initializes the LocalModel class. The model is only loaded by the first request or by `warm_up`.
+
+        Args:
+            model_name (str, optional): Name or path of the Hugging Face model. Default is "Qwen/Qwen2.5-0.5B-Instruct".
+            temperature (float, optional): Sampling temperature; 0 decodes greedily. Default is 0.5.
+            max_new_tokens (int, optional): Maximum length of an answer in tokens. Default is 1500.
+            batch_size (int, optional): Maximum number of requests generated together. Default is 4.
+            batch_wait (float, optional): Seconds a request waits for others to join its batch. Default is 0.05.
+            threads (int, optional): Number of CPU threads of PyTorch. Defaults to its own setting.
+            prefix_cache_size (int, optional): System messages whose key/value cache is kept. Default is 4.
+        """
+        self.model_name = model_name
+        self.temperature = temperature
+        self.max_new_tokens = max_new_tokens
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.threads = threads
+        self.prefix_cache_size = prefix_cache_size
+        self.stream_stats = deque(maxlen=1000)
+        self._model = None
+        self._tokenizer = None
+        self._lock = threading.Lock()
+        self._generate_lock = threading.Lock()
+        self._prefixes = OrderedDict()
+        self._prefixes_lock = threading.Lock()
+        self._requests = queue.Queue()
+        self._worker = None
+
+    def _load(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    with startup_report.timed("import:transformers"):
+                        import torch
+                        from transformers import AutoModelForCausalLM, AutoTokenizer
+                    with startup_report.timed("init:local_model"):
+                        if self.threads:
+                            torch.set_num_threads(self.threads)
+                        tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+                        if tokenizer.pad_token_id is None:
+                            tokenizer.pad_token = tokenizer.eos_token
+                        model = AutoModelForCausalLM.from_pretrained(self.model_name, torch_dtype=torch.float32)
+                        model.eval()
+                    self._tokenizer = tokenizer
+                    self._model = model
+        return self._tokenizer, self._model
+
+    def warm_up(self):
+        """
+        Loads the model ahead of the first request.
+        """
+        self._load()
+
+    def _render(self, system_message, human_message=None):
+        messages = [{"role": "system", "content": system_message}]
+        if human_message is None:
+            return self._tokenizer.apply_chat_template(messages, tokenize=False)
+        messages.append({"role": "user", "content": human_message})
+        return self._tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
+
+    def _prefix(self, system_message):
+        # token ids and key/value cache of the system turn, shared by every request with the same system message
+        import torch
+
+        with self._prefixes_lock:
+            if system_message in self._prefixes:
+                self._prefixes.move_to_end(system_message)
+                return self._prefixes[system_message]
+        ids = self._tokenizer(self._render(system_message), add_special_tokens=False)["input_ids"]
+        with self._generate_lock, torch.inference_mode():
+            cache = self._model(input_ids=torch.tensor([ids]), use_cache=True).past_key_values
+        with self._prefixes_lock:
+            self._prefixes[system_message] = (ids, cache)
+            while len(self._prefixes) > self.prefix_cache_size:
+                self._prefixes.popitem(last=False)
+        return ids, cache
+
+    def generate_batch(self, system_message, human_messages, streamer=None):
+        """
+        Generates the answers to several human messages sharing one system message, in a single batch.
+
+        Args:
+            system_message (str): System message of every request.
+            human_messages (list): Human message of each request.
+            streamer (optional): `transformers` streamer receiving the tokens, for a batch of one request.
+
+        Returns:
+            tuple: List of the answers, in order, and list of the number of tokens of each answer.
+        """
+        import torch
+
+        tokenizer, model = self._load()
+        prefix_ids, prefix_cache = self._prefix(system_message)
+        rows = [tokenizer(self._render(system_message, message), add_special_tokens=False)["input_ids"]
+                for message in human_messages]
+        pad = tokenizer.pad_token_id
+        kwargs = {}
+        if all(row[:len(prefix_ids)] == prefix_ids and len(row) > len(prefix_ids) for row in rows):
+            # the padding goes between the cached system turn and each paper, masked out, so all rows share the cache
+            suffixes = [row[len(prefix_ids):] for row in rows]
+            width = max(len(suffix) for suffix in suffixes)
+            input_ids = [prefix_ids + [pad] * (width - len(suffix)) + suffix for suffix in suffixes]
+            attention_mask = [[1] * len(prefix_ids) + [0] * (width - len(suffix)) + [1] * len(suffix) for suffix in suffixes]
+            cache = copy.deepcopy(prefix_cache)
+            if len(rows) > 1:
+                cache.batch_repeat_interleave(len(rows))
+            kwargs["past_key_values"] = cache
+        else:
+            width = max(len(row) for row in rows)
+            input_ids = [[pad] * (width - len(row)) + row for row in rows]
+            attention_mask = [[0] * (width - len(row)) + [1] * len(row) for row in rows]
+        if self.temperature > 0:
+            kwargs.update(do_sample=True, temperature=self.temperature)
+        else:
+            kwargs.update(do_sample=False)
+
+        with self._generate_lock, torch.inference_mode():
+            output = model.generate(
+                input_ids=torch.tensor(input_ids),
+                attention_mask=torch.tensor(attention_mask),
+                max_new_tokens=self.max_new_tokens,
+                pad_token_id=pad,
+                streamer=streamer,
+                **kwargs
+            )
+        generated = output[:, len(input_ids[0]):]
+        answers = [tokenizer.decode(row, skip_special_tokens=True).strip() for row in generated]
+        tokens = [int((row != pad).sum()) for row in generated]
+        return answers, tokens
+
+    def _serve(self):
+        # gathers the pending requests into batches, grouped by system message
+        while True:
+            batch = [self._requests.get()]
+            deadline = time.monotonic() + self.batch_wait
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._requests.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            groups = {}
+            for system_message, human_message, future in batch:
+                groups.setdefault(system_message, []).append((human_message, future))
+            for system_message, requests in groups.items():
+                try:
+                    answers, _ = self.generate_batch(system_message, [message for message, _ in requests])
+                except Exception as e:
+                    for _, future in requests:
+                        future.set_exception(e)
+                    continue
+                for (_, future), answer in zip(requests, answers):
+                    future.set_result(answer)
+
+    def talk_to_model(self, system_message, human_message):
+        """
+        Generates the answer to a request, batched with the concurrent requests of other threads.
+
+        Args:
+            system_message (str): System message that defines the context or instructions for the model.
+            human_message (str): Message sent by the user or human interacting with the model.
+
+        Returns:
+            str: Content of the response generated by the model.
+        """
+        if self._worker is None:
+            with self._lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._serve, name="local-model", daemon=True)
+                    self._worker.start()
+        future = Future()
+        self._requests.put((system_message, human_message, future))
+        return future.result()
+
+    def stream_model(self, system_message, human_message, stats=None):
+        """
+        Generates the answer to a request on its own, yielding the text as it is produced.
+
+        Args:
+            system_message (str): System message that defines the context or instructions for the model.
+            human_message (str): Message sent by the user or human interacting with the model.
+            stats (dict, optional): Filled with 'time_to_first_token', 'total_time', 'tokens',
+                                    'tokens_per_second' and 'cached' when the stream ends.
+
+        Yields:
+            str: Pieces of the response, in order.
+        """
+        from transformers import TextIteratorStreamer
+
+        stats = {} if stats is None else stats
+        start = time.perf_counter()
+        tokenizer, _ = self._load()
+        streamer = TextIteratorStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True)
+        result = {}
+
+        def generate():
+            try:
+                result["tokens"] = self.generate_batch(system_message, [human_message], streamer=streamer)[1][0]
+            except Exception as e:
+                result["error"] = e
+                streamer.end()
+
+        thread = threading.Thread(target=generate, daemon=True)
+        thread.start()
+        first_token_time = None
+        for text in streamer:
+            if not text:
+                continue
+            if first_token_time is None:
+                first_token_time = time.perf_counter() - start
+            yield text
+        thread.join()
+        if "error" in result:
+            raise result["error"]
+
+        total_time = time.perf_counter() - start
+        tokens = result["tokens"]
+        generation_time = total_time - (first_token_time or 0.0)
+        stats.update(
+            time_to_first_token=first_token_time,
+            total_time=total_time,
+            tokens=tokens,
+            tokens_per_second=tokens / generation_time if generation_time > 0 else 0.0,
+            cached=False
+        )
+        self.stream_stats.append(dict(stats))
+
+
+def compare_backends(controllers, articles, workers=4):
+    """
+    Measures the throughput of chat backends generating the briefings of the same articles.
+
+    Args:
+        controllers (dict): Backend name mapped to a Controller using it.
+        articles (list): Contents of the articles to brief.
+        workers (int, optional): Concurrent requests; the local backend batches them. Default is 4.
+
+    Returns:
+        list: One dict per backend with 'backend', 'papers', 'failed', 'seconds', 'papers_per_minute',
+              'mean_latency' and 'completion_tokens_per_second'.
+    """
+    from eval_runner import EvalRunner
+
+    report = []
+    for backend, controller in controllers.items():
+        controller.openai_model.warm_up()
+
+        def generate(article):
+            token_report = {}
+            started = time.perf_counter()
+            controller.process(paper_content=article, token_report=token_report)
+            return time.perf_counter() - started, token_report.get('completion', 0)
+
+        runner = EvalRunner(max_workers=workers)
+        start = time.perf_counter()
+        results = runner.run(generate, articles)
+        seconds = time.perf_counter() - start
+        done = [result for result in results if result is not None]
+        report.append({
+            "backend": backend,
+            "papers": len(done),
+            "failed": len(articles) - len(done),
+            "seconds": seconds,
+            "papers_per_minute": 60 * len(done) / seconds if seconds else 0.0,
+            "mean_latency": sum(latency for latency, _ in done) / len(done) if done else None,
+            "completion_tokens_per_second": sum(tokens for _, tokens in done) / seconds if seconds else 0.0,
+        })
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+    import config
+    from evaluator import Evaluator
+    from resources import get_configured_controller
+
+    parser = argparse.ArgumentParser(description="Compara a vazão do modelo local (CPU) com a da API da OpenAI.")
+    parser.add_argument("--papers", type=int, default=4, help="artigos do dataset de avaliação usados")
+    parser.add_argument("-w", "--workers", type=int, default=4, help="requisições paralelas")
+    args = parser.parse_args()
+
+    evaluator = Evaluator()
+    evaluator.create_eval_dataset(get_configured_controller().data_loader)
+    articles = [row['article'] for _, row in zip(range(args.papers), evaluator.iter_eval_dataset())]
+    # without the response cache, so both backends really generate every briefing
+    controllers = {"local": get_configured_controller(chat_backend="local", response_cache_path=None)}
+    if config.get_openai_api_key():
+        controllers["openai"] = get_configured_controller(chat_backend="openai", response_cache_path=None)
+    else:
+        print("Aviso: Chave da OpenAI não configurada; apenas o modelo local será medido.")
+    report = compare_backends(controllers, articles, workers=args.workers)
+    print(f"--- VAZÃO DOS BACKENDS ({len(articles)} artigos, {args.workers} requisições paralelas) ---")
+    print(f"{'backend':<8} {'ok':>4} {'falhas':>7} {'total s':>9} {'artigos/min':>12} {'latência s':>11} {'tokens/s':>9}")
+    for entry in report:
+        latency = "-" if entry['mean_latency'] is None else f"{entry['mean_latency']:.1f}"
+        print(f"{entry['backend']:<8} {entry['papers']:>4} {entry['failed']:>7} {entry['seconds']:>9.1f} "
+              f"{entry['papers_per_minute']:>12.2f} {latency:>11} {entry['completion_tokens_per_second']:>9.1f}")
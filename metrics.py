@@ -0,0 +1,488 @@
+import re
+import math
+import functools
+import threading
+import warnings
+from collections import Counter
+
+BLEU_MAX_ORDER = 4
+
+_13A_REGEXES = [
+    (re.compile(r"([\{-\~\[-\` -\&\(-\+\:-\@\/])"), r" \1 "),
+    (re.compile(r"([^0-9])([\.,])"), r"\1 \2 "),
+    (re.compile(r"([\.,])([^0-9])"), r" \1 \2"),
+    (re.compile(r"([0-9])(-)"), r"\1 \2 "),
+]
+
+
+class MetricFallbackWarning(UserWarning):
+    """
+    Emitted when a metric falls back to a simpler implementation because an optional resource is missing.
+    """
+
+
+def _tokenize_13a(text):
+    # "13a" tokenizer used by the BLEU implementation of `evaluate`
+    text = text.replace("<skipped>", "").replace("-\n", "").replace("\n", " ")
+    if "&" in text:
+        text = text.replace("&quot;", '"').replace("&amp;", "&").replace("&lt;", "<").replace("&gt;", ">")
+    text = f" {text} "
+    for regex, replacement in _13A_REGEXES:
+        text = regex.sub(replacement, text)
+    return text.split()
+
+
+_ROUGE_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def _tokenize_rouge(text):
+    # tokenizer of `rouge-score` without stemming: lowercase alphanumeric runs. Returns the tokens of the whole
+    # text and, for ROUGE-Lsum, the tokens of each non-empty line
+    lines = tuple(tuple(_ROUGE_TOKEN_RE.findall(line.lower())) for line in text.split("\n") if line)
+    return tuple(token for line in lines for token in line), lines
+
+
+def _tokenize_words(text):
+    # `nltk.word_tokenize`, as the METEOR metric of `evaluate`; the Treebank tokenizer alone without the punkt models
+    return _word_tokenizer()(text)
+
+
+@functools.lru_cache(maxsize=None)
+def _word_tokenizer():
+    import nltk
+
+    try:
+        nltk.word_tokenize("METEOR")
+        return nltk.word_tokenize
+    except LookupError:
+        from nltk.tokenize import TreebankWordTokenizer
+
+        warnings.warn("modelos punkt do nltk não encontrados; METEOR tokenizado sem separar sentenças.",
+                      MetricFallbackWarning)
+        return TreebankWordTokenizer().tokenize
+
+
+TOKENIZERS = {
+    'bleu': _tokenize_13a,
+    'rouge': _tokenize_rouge,
+    'words': _tokenize_words,
+    'raw': lambda text: text,
+}
+
+
+def tokenize(text, kinds):
+    """
+    Tokenizes a text once for each tokenization needed by the selected metrics.
+
+    Args:
+        text (str): Prediction or reference.
+        kinds (iterable): Names of the tokenizations, keys of `TOKENIZERS`.
+
+    Returns:
+        dict: Tokenization name mapped to its tokens.
+    """
+    return {kind: TOKENIZERS[kind](text) for kind in kinds}
+
+
+def _fmeasure(hits, prediction_count, reference_count):
+    precision = hits / prediction_count if prediction_count else 0.0
+    recall = hits / reference_count if reference_count else 0.0
+    return 2 * precision * recall / (precision + recall) if precision + recall > 0 else 0.0
+
+
+def _rouge_n(prediction_tokens, reference_tokens, n):
+    def ngrams(tokens):
+        return Counter(zip(*(tokens[i:] for i in range(n))))
+
+    prediction_ngrams = ngrams(prediction_tokens)
+    reference_ngrams = ngrams(reference_tokens)
+    hits = sum((prediction_ngrams & reference_ngrams).values())
+    return _fmeasure(hits, sum(prediction_ngrams.values()), sum(reference_ngrams.values()))
+
+
+def _match_masks(tokens):
+    # bit j of the mask of a token is set when tokens[j] is that token
+    masks = {}
+    for j, token in enumerate(tokens):
+        masks[token] = masks.get(token, 0) | (1 << j)
+    return masks
+
+
+def _lcs_rows(reference, masks, length):
+    """
+    Bit-parallel longest common subsequence of `reference` and a candidate of `length` tokens (Hyyrö, 2004).
+
+    Returns:
+        list: One bit row per prefix of `reference`. The number of zero bits of rows[i] below bit j is the length
+              of the LCS of reference[:i] and candidate[:j]; rows[-1] gives the LCS of the whole sequences.
+    """
+    full = (1 << length) - 1
+    row = full
+    rows = [row]
+    for token in reference:
+        matches = row & masks.get(token, 0)
+        row = ((row + matches) | (row - matches)) & full
+        rows.append(row)
+    return rows
+
+
+def _lcs_length(reference, candidate):
+    if not reference or not candidate:
+        return 0
+    return len(candidate) - _lcs_rows(reference, _match_masks(candidate), len(candidate))[-1].bit_count()
+
+
+def _lcs_indices(reference, candidate, masks):
+    # positions in `reference` of the LCS picked by the backtracking of `rouge-score`, read from the bit rows
+    rows = _lcs_rows(reference, masks, len(candidate))
+    if rows[-1] == rows[0]:
+        return []
+
+    def table(i, j):
+        return j - (rows[i] & ((1 << j) - 1)).bit_count()
+
+    indices = []
+    i, j = len(reference), len(candidate)
+    while i > 0 and j > 0:
+        if reference[i - 1] == candidate[j - 1]:
+            indices.append(i - 1)
+            i -= 1
+            j -= 1
+        elif table(i, j - 1) > table(i - 1, j):
+            j -= 1
+        else:
+            i -= 1
+    return indices
+
+
+def _rouge_lsum(prediction_lines, reference_lines):
+    # summary-level LCS of `rouge-score`: union LCS of each reference line with every predicted line
+    prediction_count = sum(map(len, prediction_lines))
+    reference_count = sum(map(len, reference_lines))
+    if not prediction_count or not reference_count:
+        return 0.0
+    prediction_left = Counter(token for line in prediction_lines for token in line)
+    reference_left = Counter(token for line in reference_lines for token in line)
+    candidates = [(line, _match_masks(line)) for line in prediction_lines if line]
+    hits = 0
+    for line in reference_lines:
+        union = set()
+        for candidate, masks in candidates:
+            union.update(_lcs_indices(line, candidate, masks))
+        for i in union:
+            token = line[i]
+            if prediction_left[token] > 0 and reference_left[token] > 0:
+                hits += 1
+                prediction_left[token] -= 1
+                reference_left[token] -= 1
+    return _fmeasure(hits, prediction_count, reference_count)
+
+
+def bleu_stats(prediction_tokens, reference_tokens):
+    """
+    Computes the sufficient statistics of BLEU for one pair, so corpus BLEU can be derived by summing them.
+
+    Returns:
+        dict: 'matches' and 'possible' n-gram counts per order, 'translation_length' and 'reference_length'.
+    """
+    def ngrams(tokens):
+        counts = Counter()
+        for order in range(1, BLEU_MAX_ORDER + 1):
+            for i in range(len(tokens) - order + 1):
+                counts[tuple(tokens[i:i + order])] += 1
+        return counts
+
+    overlap = ngrams(prediction_tokens) & ngrams(reference_tokens)
+    matches = [0] * BLEU_MAX_ORDER
+    for ngram, count in overlap.items():
+        matches[len(ngram) - 1] += count
+    possible = [max(0, len(prediction_tokens) - order + 1) for order in range(1, BLEU_MAX_ORDER + 1)]
+    return {
+        'matches': matches,
+        'possible': possible,
+        'translation_length': len(prediction_tokens),
+        'reference_length': len(reference_tokens),
+    }
+
+
+def bleu_from_stats(stats):
+    """
+    Computes BLEU (4-gram, no smoothing, with brevity penalty) from summed statistics.
+
+    Args:
+        stats (dict): Statistics returned by `bleu_stats`, possibly summed over several pairs.
+
+    Returns:
+        dict: 'bleu', 'precisions', 'brevity_penalty', 'length_ratio', 'translation_length' and 'reference_length',
+              as returned by the BLEU metric of `evaluate`.
+    """
+    precisions = [
+        matches / possible if possible > 0 else 0.0
+        for matches, possible in zip(stats['matches'], stats['possible'])
+    ]
+    geo_mean = math.exp(sum(math.log(p) for p in precisions) / BLEU_MAX_ORDER) if min(precisions) > 0 else 0.0
+    translation_length = stats['translation_length']
+    reference_length = stats['reference_length']
+    ratio = translation_length / reference_length if reference_length else 0.0
+    if ratio > 1.0:
+        brevity_penalty = 1.0
+    elif ratio > 0.0:
+        brevity_penalty = math.exp(1 - 1.0 / ratio)
+    else:
+        brevity_penalty = 0.0
+    return {
+        'bleu': geo_mean * brevity_penalty,
+        'precisions': precisions,
+        'brevity_penalty': brevity_penalty,
+        'length_ratio': ratio,
+        'translation_length': translation_length,
+        'reference_length': reference_length,
+    }
+
+
+class Metric:
+    """
+    Base class of the metrics of the registry.
+
+    A metric scores one pair of tokenized texts and folds the per-row scores into its aggregate, so the same
+    implementation serves batch scoring and incremental (running) aggregation.
+
+    Attributes:
+        name (str): Name of the metric in the registry.
+        group (str): Key of the metric in the aggregated scores (e.g. "ROUGE").
+        tokenization (str): Tokenization needed by the metric, a key of `TOKENIZERS`.
+        keys (tuple): Per-row score keys produced by `score`.
+        version (str): Identifies the implementation, so results of different implementations are not mixed.
+    """
+
+    name = None
+    group = None
+    tokenization = 'raw'
+    keys = ()
+    version = "1"
+
+    def score(self, prediction, reference):
+        """
+        Scores one pair.
+
+        Args:
+            prediction: Tokens of the generated brief.
+            reference: Tokens of the reference brief.
+
+        Returns:
+            dict: Per-row scores.
+        """
+        raise NotImplementedError
+
+    def new_state(self):
+        return {key: 0.0 for key in self.keys}
+
+    def update(self, state, row):
+        for key in self.keys:
+            state[key] += row[key]
+
+    def finalize(self, state, count):
+        """
+        Returns:
+            dict: Aggregated scores of the metric; by default the mean of each per-row key.
+        """
+        return {key: state[key] / count if count else 0.0 for key in self.keys}
+
+
+class RougeMetric(Metric):
+    """
+    ROUGE-1, ROUGE-2, ROUGE-L and ROUGE-Lsum F-measures, computed offline with the tokenizer and the scores of
+    the `RougeScorer` of `rouge-score` without stemming, as the ROUGE metric of `evaluate` does by default.
+    The four variants share one tokenization, and the longest common subsequences are computed bit-parallel.
+    ROUGE-Lsum equals ROUGE-L when both texts have a single line, so it is only computed over the lines otherwise.
+    The aggregate is the plain mean of the rows, not the bootstrap "mid" estimate reported by `evaluate`.
+    """
+
+    name = 'rouge'
+    group = "ROUGE"
+    tokenization = 'rouge'
+    keys = ('rouge1', 'rouge2', 'rougeL', 'rougeLsum')
+    version = "3"
+
+    def score(self, prediction, reference):
+        prediction_tokens, prediction_lines = prediction
+        reference_tokens, reference_lines = reference
+        rouge_l = _fmeasure(_lcs_length(reference_tokens, prediction_tokens),
+                            len(prediction_tokens), len(reference_tokens))
+        if len(prediction_lines) > 1 or len(reference_lines) > 1:
+            rouge_lsum = _rouge_lsum(prediction_lines, reference_lines)
+        else:
+            rouge_lsum = rouge_l
+        return {
+            'rouge1': _rouge_n(prediction_tokens, reference_tokens, 1),
+            'rouge2': _rouge_n(prediction_tokens, reference_tokens, 2),
+            'rougeL': rouge_l,
+            'rougeLsum': rouge_lsum,
+        }
+
+
+class BleuMetric(Metric):
+    """
+    BLEU with the "13a" tokenizer. Per row: sentence BLEU; aggregate: corpus BLEU from the summed n-gram statistics.
+    """
+
+    name = 'bleu'
+    group = "BLEU"
+    tokenization = 'bleu'
+    keys = ('bleu',)
+
+    def score(self, prediction, reference):
+        stats = bleu_stats(prediction, reference)
+        return {'bleu': bleu_from_stats(stats)['bleu'], 'bleu_stats': stats}
+
+    def new_state(self):
+        return {
+            'matches': [0] * BLEU_MAX_ORDER,
+            'possible': [0] * BLEU_MAX_ORDER,
+            'translation_length': 0,
+            'reference_length': 0,
+        }
+
+    def update(self, state, row):
+        stats = row['bleu_stats']
+        state['matches'] = [a + b for a, b in zip(state['matches'], stats['matches'])]
+        state['possible'] = [a + b for a, b in zip(state['possible'], stats['possible'])]
+        state['translation_length'] += stats['translation_length']
+        state['reference_length'] += stats['reference_length']
+
+    def finalize(self, state, count):
+        return bleu_from_stats(state)
+
+
+def _nltk_resource_installed(*names):
+    # an nltk resource may be installed unzipped (e.g. "corpora/wordnet") or as the downloaded archive
+    import nltk
+
+    for name in names:
+        try:
+            nltk.data.find(name)
+            return True
+        except LookupError:
+            pass
+    return False
+
+
+class _NoSynonyms:
+    # stands in for the WordNet corpus when it is not installed: METEOR then matches exact words and stems only
+    @staticmethod
+    def synsets(*args, **kwargs):
+        return []
+
+
+class MeteorMetric(Metric):
+    """
+    METEOR computed offline with `nltk`, on the words of `nltk.word_tokenize` as the METEOR metric of `evaluate`.
+    Synonym matching uses WordNet when its corpus is installed; otherwise the metric falls back to exact and
+    stem matches. Without the punkt models of `word_tokenize`, the texts are split by the Treebank tokenizer
+    alone. `version` records both fallbacks, which are reported with a `MetricFallbackWarning`.
+    """
+
+    name = 'meteor'
+    group = "METEOR"
+    tokenization = 'words'
+    keys = ('meteor',)
+
+    def __init__(self):
+        import nltk
+        from nltk.translate.meteor_score import single_meteor_score
+
+        self._single_meteor_score = single_meteor_score
+        if _nltk_resource_installed("corpora/wordnet", "corpora/wordnet.zip"):
+            from nltk.corpus import wordnet
+            self._wordnet = wordnet
+            self.version = "2-wordnet"
+        else:
+            warnings.warn("corpus WordNet do nltk não encontrado; METEOR calculado sem sinônimos.",
+                          MetricFallbackWarning)
+            self._wordnet = _NoSynonyms()
+            self.version = "2-no-wordnet"
+        if _word_tokenizer() is not nltk.word_tokenize:
+            self.version += "-treebank"
+
+    def score(self, prediction, reference):
+        return {'meteor': self._single_meteor_score(reference, prediction, wordnet=self._wordnet)}
+
+
+class HubMetric(Metric):
+    """
+    Metric loaded from the Hugging Face `evaluate` hub on first use. Needs network access (or a warm hub cache);
+    kept for parity checks against the offline implementations. Per row it reports the metric's main score;
+    the aggregate is the mean of the rows.
+    """
+
+    tokenization = 'raw'
+    version = "hub"
+
+    def __init__(self, hub_name, score_key):
+        import evaluate
+
+        self.name = f"evaluate:{hub_name}"
+        self.group = f"{hub_name.upper()} (evaluate)"
+        self.keys = (f"{hub_name}_hub",)
+        self._score_key = score_key
+        self._metric = evaluate.load(hub_name)
+
+    def score(self, prediction, reference):
+        result = self._metric.compute(predictions=[prediction], references=[reference])
+        return {self.keys[0]: float(result[self._score_key])}
+
+
+class MetricRegistry:
+    """
+    Registry of the available metrics. Each metric is only instantiated (and its dependencies imported) the
+    first time it is requested, so creating an `Evaluator` costs nothing.
+    """
+
+    def __init__(self):
+        self._factories = {}
+        self._instances = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, factory):
+        """
+        Registers a metric.
+
+        Args:
+            name (str): Name used to select the metric.
+            factory (callable): Builds the `Metric` instance when it is first requested.
+        """
+        with self._lock:
+            self._factories[name] = factory
+            self._instances.pop(name, None)
+
+    def names(self):
+        """
+        Returns:
+            list: Names of the registered metrics.
+        """
+        return list(self._factories)
+
+    def get(self, name):
+        """
+        Returns the metric registered under `name`, building it on first use.
+
+        Raises:
+            KeyError: If no metric is registered under `name`.
+        """
+        with self._lock:
+            if name not in self._instances:
+                if name not in self._factories:
+                    raise KeyError(f"Unknown metric '{name}'. Available: {', '.join(self._factories)}")
+                self._instances[name] = self._factories[name]()
+            return self._instances[name]
+
+
+registry = MetricRegistry()
+registry.register('rouge', RougeMetric)
+registry.register('bleu', BleuMetric)
+registry.register('meteor', MeteorMetric)
+registry.register('evaluate:rouge', lambda: HubMetric('rouge', 'rougeL'))
+registry.register('evaluate:bleu', lambda: HubMetric('bleu', 'bleu'))
+registry.register('evaluate:meteor', lambda: HubMetric('meteor', 'meteor'))
+
+DEFAULT_METRICS = ('rouge', 'bleu', 'meteor')
@@ -1,5 +1,11 @@
-from langchain.schema import HumanMessage, SystemMessage
-from langchain_openai import ChatOpenAI
+import time
+import threading
+from collections import deque
+from eval_runner import retried_by_runner
+from resources import startup_report
+from tracing import current_span
+
+CHAT_BACKENDS = ("openai", "local")
 
 class OpenAiModel:
     """
@@ -8,10 +14,17 @@ class OpenAiModel:
 
     Attributes:
         model (ChatOpenAI): Instance of the OpenAI chat model configured with the model name, API key, and temperature.
+                            Created on first use.
+        cache (ResponseCache): Optional persistent cache of responses, or None to always call the API.
+        refresh_cache (bool): If True, the cache is not read but fresh responses are still stored in it.
+        stream_stats (deque): Time to first token and tokens per second of the latest streamed requests.
+        timeout (float): Time limit of one API request in seconds, enforced by the client; None for no limit.
+        max_retries (int): Retries made by the client itself on connection errors, 429 and 5xx responses.
+                           Inside an attempt of an `EvalRunner`, which retries on its own, the client makes none.
     """
 
    
-    def __init__(self, model_name, key, temperature=0.5):
+    def __init__(self, model_name, key, temperature=0.5, cache=None, refresh_cache=False, timeout=None, max_retries=2):
         """
         Initializes the OpenAiModel class with the necessary configuration for the OpenAI model.
 
@@ -21,8 +34,72 @@ class OpenAiModel:
             temperature (float, optional): Degree of randomness in the model's responses.
                                         Lower values make responses more deterministic.
                                         Default is 0.5.
+            cache (ResponseCache, optional): Cache of responses keyed by model, temperature and messages.
+                                             Default is None (no caching).
+            refresh_cache (bool, optional): Bypass cached responses and overwrite them. Default is False.
+            timeout (float, optional): Time limit of one API request in seconds. A request that exceeds it is
+                                       cancelled by the client and raises a timeout error. Default is no limit.
+            max_retries (int, optional): Retries made by the client itself. Default is 2.
+        """
+        self.model_name = model_name
+        self.temperature = temperature
+        self.cache = cache
+        self.refresh_cache = refresh_cache
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self._key = key
+        self.stream_stats = deque(maxlen=1000)
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        return self._client(self.max_retries)
+
+    def _client(self, max_retries):
+        # one client per number of retries, each created on first use
+        client = self._clients.get(max_retries)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(max_retries)
+                if client is None:
+                    with startup_report.timed("import:langchain_openai"):
+                        from langchain_openai import ChatOpenAI
+                    client = ChatOpenAI(
+                        temperature=self.temperature, model_name=self.model_name, openai_api_key=self._key, stream_usage=True,
+                        timeout=self.timeout, max_retries=max_retries
+                    )
+                    self._clients[max_retries] = client
+        return client
+
+    def warm_up(self):
         """
-        self.model = ChatOpenAI(temperature=temperature, model_name=model_name, openai_api_key=key)
+        Creates the OpenAI client ahead of the first request.
+        """
+        self.model
+
+    def _cache_key(self, system_message, human_message):
+        if self.cache is None:
+            return None
+        return self.cache.make_key(self.model_name, self.temperature, system_message, human_message)
+
+    def _cached_response(self, key):
+        if key is None or self.refresh_cache:
+            return None
+        return self.cache.get(key)
+
+    @staticmethod
+    def _messages(system_message, human_message):
+        from langchain.schema import HumanMessage, SystemMessage
+
+        return [
+            SystemMessage(
+                content=system_message
+            ),
+            HumanMessage(
+                content=human_message
+            )
+        ]
 
     def talk_to_model(self, system_message, human_message):
         """
@@ -35,13 +112,71 @@ class OpenAiModel:
         Returns:
             str: Content of the response generated by the OpenAI model.
         """
+        key = self._cache_key(system_message, human_message)
+        cached = self._cached_response(key)
+        current_span().set(cache_hit=cached is not None)
+        if cached is not None:
+            return cached
 
-        messages = [
-            SystemMessage(
-                content=system_message
-            ),
-            HumanMessage(
-                content=human_message
-            )
-        ]
-        return self.model(messages).content
\ No newline at end of file
+        model = self._client(0) if retried_by_runner() else self.model
+        response = model(self._messages(system_message, human_message)).content
+        if key is not None:
+            self.cache.put(key, self.model_name, response)
+        return response
+
+    def stream_model(self, system_message, human_message, stats=None):
+        """
+        Sends messages to the OpenAI model and yields the response as it is generated.
+
+        The time to first token and the generation speed are recorded in `stats` and appended to `stream_stats`.
+        A cached response is yielded at once.
+
+        Args:
+            system_message (str): System message that defines the context or instructions for the model.
+            human_message (str): Message sent by the user or human interacting with the model.
+            stats (dict, optional): Filled with 'time_to_first_token', 'total_time', 'tokens',
+                                    'tokens_per_second' and 'cached' when the stream ends.
+
+        Yields:
+            str: Pieces of the response, in order.
+        """
+        stats = {} if stats is None else stats
+        start = time.perf_counter()
+        key = self._cache_key(system_message, human_message)
+        cached = self._cached_response(key)
+        if cached is not None:
+            stats.update(time_to_first_token=time.perf_counter() - start, cached=True)
+            yield cached
+            stats.update(total_time=time.perf_counter() - start, tokens=0, tokens_per_second=0.0)
+            self.stream_stats.append(dict(stats))
+            return
+
+        pieces = []
+        first_token_time = None
+        tokens = 0
+        usage_tokens = None
+        for chunk in self.model.stream(self._messages(system_message, human_message)):
+            usage = getattr(chunk, "usage_metadata", None)
+            if usage:
+                usage_tokens = usage.get("output_tokens")
+            if not chunk.content:
+                continue
+            if first_token_time is None:
+                first_token_time = time.perf_counter() - start
+            tokens += 1
+            pieces.append(chunk.content)
+            yield chunk.content
+
+        total_time = time.perf_counter() - start
+        tokens = usage_tokens or tokens
+        generation_time = total_time - (first_token_time or 0.0)
+        stats.update(
+            time_to_first_token=first_token_time,
+            total_time=total_time,
+            tokens=tokens,
+            tokens_per_second=tokens / generation_time if generation_time > 0 else 0.0,
+            cached=False
+        )
+        self.stream_stats.append(dict(stats))
+        if key is not None:
+            self.cache.put(key, self.model_name, "".join(pieces))
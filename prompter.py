@@ -1,5 +1,62 @@
+import re
+from functools import lru_cache
+
+
+@lru_cache(maxsize=None)
+def _encoding(model_name):
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    # the BPE files are downloaded on first use: offline and without a warm cache, fall back to the estimate
+    try:
+        return tiktoken.encoding_for_model(model_name)
+    except KeyError:
+        pass
+    except Exception:
+        return None
+    try:
+        return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        return None
+
+
 class Prompter():
 
+    # elements of the briefing written by separate requests in "sections" generation mode, in reading order,
+    # with the retrieved topics each one is given as context
+    BRIEFING_PARTS = (
+        {
+            "name": "title_intro",
+            "label": "title and introductory paragraph",
+            "topics": ("Intro",),
+            "instruction": "Write only elements 1 and 2: the title, alone on the first line, followed by the short "
+                           "introductory paragraph.",
+        },
+        {
+            "name": "main_findings",
+            "label": "main findings section",
+            "topics": ("Main Findings",),
+            "instruction": "Write only element 3: the main section summarizing the core findings of the study. "
+                           "Do not write a title or an introduction.",
+        },
+        {
+            "name": "audience_box",
+            "label": "informative box",
+            "topics": ("Who is this briefing for", "Where the findings come from", "What is included in this briefing",
+                       "What is not included in this briefing"),
+            "instruction": "Write only element 4: the informative box describing the intended audience, where the "
+                           "findings come from, and what is and is not included in the briefing.",
+        },
+        {
+            "name": "reference",
+            "label": "reference",
+            "topics": (),
+            "instruction": "Write only element 5: the reference to the original research article, as a single "
+                           "bibliographic entry.",
+        },
+    )
+
     def get_researcher_system(additional_context):
         """
         Generates the system message for the OpenAI model, establishing the context and instructions
@@ -65,3 +122,443 @@ class Prompter():
             str: Formatted message requesting the model to create the evidence briefing.
         """
         return (f"Write an evidence briefing on the following paper:\n{paper}")
+
+    def count_tokens(text, model_name="gpt-4o-mini"):
+        """
+        Counts the tokens of a text with the tokenizer of the model (`tiktoken`), or estimates them
+        as one token per 4 characters when `tiktoken` is not installed or cannot load its encoding (offline).
+
+        Args:
+            text (str): Text to be measured.
+            model_name (str, optional): Name of the model whose tokenizer is used. Default is "gpt-4o-mini".
+
+        Returns:
+            int: Number of tokens.
+        """
+        encoding = _encoding(model_name)
+        if encoding is None:
+            return len(text) // 4
+        return len(encoding.encode(text, disallowed_special=()))
+
+    def format_context(context_by_topic):
+        """
+        Formats the chunks retrieved for each topic as the context included in the system message.
+
+        Args:
+            context_by_topic (dict): Topic mapped to its list of chunks.
+
+        Returns:
+            str: Topic-formatted context.
+        """
+        return "\n".join([f"{topic}:\n" + "\n".join(chunks) for topic, chunks in context_by_topic.items()])
+
+    def trim_context(context_by_topic, max_tokens, priority=None, model_name="gpt-4o-mini"):
+        """
+        Removes retrieved chunks until the formatted context fits in `max_tokens`.
+
+        Chunks are removed from the end of the lowest-priority topic first. Every topic keeps its best chunk
+        for as long as possible; only then are those single chunks removed, again by priority.
+
+        Args:
+            context_by_topic (dict): Topic mapped to its list of chunks, best chunk first.
+            max_tokens (int): Token budget of the formatted context.
+            priority (list, optional): Topics from most to least important. Defaults to the order of `context_by_topic`.
+            model_name (str, optional): Name of the model whose tokenizer is used. Default is "gpt-4o-mini".
+
+        Returns:
+            dict: Trimmed copy of `context_by_topic`.
+        """
+        trimmed = {topic: list(chunks) for topic, chunks in context_by_topic.items()}
+        priority = [topic for topic in (priority or list(trimmed)) if topic in trimmed]
+        priority += [topic for topic in trimmed if topic not in priority]
+        chunk_tokens = {
+            topic: [Prompter.count_tokens(chunk, model_name) + 1 for chunk in chunks] for topic, chunks in trimmed.items()
+        }
+        total = sum(Prompter.count_tokens(f"{topic}:", model_name) + 1 for topic in trimmed)
+        total += sum(sum(tokens) for tokens in chunk_tokens.values())
+
+        for keep in (1, 0):
+            for topic in reversed(priority):
+                while total > max_tokens and len(trimmed[topic]) > keep:
+                    trimmed[topic].pop()
+                    total -= chunk_tokens[topic].pop()
+        return trimmed
+
+    def split_paper(paper, max_tokens, model_name="gpt-4o-mini"):
+        """
+        Splits a paper into consecutive sections of at most `max_tokens` tokens, cutting at sentence boundaries
+        whenever possible.
+
+        Args:
+            paper (str): Full content of the scientific article.
+            max_tokens (int): Maximum number of tokens per section.
+            model_name (str, optional): Name of the model whose tokenizer is used. Default is "gpt-4o-mini".
+
+        Returns:
+            list: List of section texts, in reading order.
+        """
+        sections = []
+        current, current_tokens = [], 0
+        for sentence in re.split(r"(?<=[.!?])\s+", paper):
+            tokens = Prompter.count_tokens(sentence, model_name) + 1
+            if tokens > max_tokens:
+                # a "sentence" longer than a whole section (e.g. a table): cut it by characters
+                step = max(1, len(sentence) * max_tokens // tokens)
+                pieces = [sentence[i:i + step] for i in range(0, len(sentence), step)]
+            else:
+                pieces = [sentence]
+            for piece in pieces:
+                piece_tokens = tokens if len(pieces) == 1 else Prompter.count_tokens(piece, model_name) + 1
+                if current and current_tokens + piece_tokens > max_tokens:
+                    sections.append(" ".join(current))
+                    current, current_tokens = [], 0
+                current.append(piece)
+                current_tokens += piece_tokens
+        if current:
+            sections.append(" ".join(current))
+        return sections
+
+    def build_messages(context_by_topic, paper, token_budget, completion_tokens=1500, min_context_tokens=1000,
+                       priority=None, model_name="gpt-4o-mini"):
+        """
+        Assembles the system and human messages within a token budget.
+
+        The retrieved context is trimmed by priority to the room left by the instructions, the paper and the
+        tokens reserved for the answer. If the paper is so long that not even `min_context_tokens` of context
+        fit, the returned plan switches to map-reduce: the paper is split into sections to be summarized
+        separately, and the final briefing is composed from those summaries.
+
+        Args:
+            context_by_topic (dict): Topic mapped to its list of retrieved chunks.
+            paper (str): Full content of the scientific article.
+            token_budget (int): Maximum number of tokens of the prompt plus the answer.
+            completion_tokens (int, optional): Tokens reserved for the answer. Default is 1500.
+            min_context_tokens (int, optional): Smallest useful context. Default is 1000.
+            priority (list, optional): Topics from most to least important, used to trim the context.
+            model_name (str, optional): Name of the model whose tokenizer is used. Default is "gpt-4o-mini".
+
+        Returns:
+            dict: Plan with the keys 'mode' ("single" or "map_reduce"), 'system_message', 'human_message'
+                  (None for map-reduce), 'sections' (paper sections for map-reduce) and 'tokens' (token counts).
+        """
+        instructions_tokens = Prompter.count_tokens(Prompter.get_researcher_system(""), model_name)
+        human_message = Prompter.get_researcher_human(paper)
+        human_tokens = Prompter.count_tokens(human_message, model_name)
+        available = token_budget - completion_tokens - instructions_tokens - human_tokens
+
+        if available >= min_context_tokens:
+            context = Prompter.format_context(Prompter.trim_context(context_by_topic, available, priority, model_name))
+            system_message = Prompter.get_researcher_system(context)
+            return {
+                'mode': "single",
+                'system_message': system_message,
+                'human_message': human_message,
+                'sections': [],
+                'tokens': {
+                    'budget': token_budget,
+                    'system': Prompter.count_tokens(system_message, model_name),
+                    'human': human_tokens,
+                    'completion_reserved': completion_tokens,
+                },
+            }
+
+        # the summaries replace the paper in the final request: give the context half of what is left
+        context_tokens = max(min_context_tokens, (token_budget - completion_tokens - instructions_tokens) // 2)
+        context = Prompter.format_context(Prompter.trim_context(context_by_topic, context_tokens, priority, model_name))
+        system_message = Prompter.get_researcher_system(context)
+        section_tokens = max(min_context_tokens, token_budget - completion_tokens - 500)
+        sections = Prompter.split_paper(paper, section_tokens, model_name)
+        return {
+            'mode': "map_reduce",
+            'system_message': system_message,
+            'human_message': None,
+            'sections': sections,
+            'tokens': {
+                'budget': token_budget,
+                'system': Prompter.count_tokens(system_message, model_name),
+                'paper': human_tokens,
+                'sections': [Prompter.count_tokens(section, model_name) for section in sections],
+                'completion_reserved': completion_tokens,
+            },
+        }
+
+    def get_section_summary_system():
+        """
+        Generates the system message used to summarize one section of a long paper (map step).
+
+        Returns:
+            str: Instructions for the section summary.
+        """
+        return (
+    "You are a software engineering researcher helping to write an Evidence Briefing about a long scientific paper. "
+    "You will receive one section of the paper. Summarize it faithfully in at most 250 words, keeping the research goal, "
+    "the method, the context of the study, every finding with its trade-offs and limitations, and the bibliographic "
+    "reference if it appears. Do not add information that is not in the section."
+)
+
+    def get_section_summary_human(section, index, total):
+        """
+        Generates the user message with one section of the paper to be summarized (map step).
+
+        Args:
+            section (str): Text of the section.
+            index (int): Position of the section, starting at 1.
+            total (int): Number of sections of the paper.
+
+        Returns:
+            str: Formatted message requesting the section summary.
+        """
+        return (f"Summarize section {index} of {total} of the paper:\n{section}")
+
+    def format_summaries(summaries):
+        """
+        Formats the section summaries of a long paper, in reading order, as a replacement of its full text.
+
+        Args:
+            summaries (list): Summaries of the sections of the paper, in reading order.
+
+        Returns:
+            str: Numbered summaries.
+        """
+        return "\n\n".join(f"Section {index}:\n{summary}" for index, summary in enumerate(summaries, start=1))
+
+    def get_researcher_human_from_summaries(summaries):
+        """
+        Generates the user message requesting the evidence briefing from the section summaries (reduce step).
+
+        Args:
+            summaries (list): Summaries of the sections of the paper, in reading order.
+
+        Returns:
+            str: Formatted message requesting the model to create the evidence briefing.
+        """
+        sections = Prompter.format_summaries(summaries)
+        return (f"Write an evidence briefing on the paper summarized section by section below:\n{sections}")
+
+    def fit_summaries(summaries, max_tokens, model_name="gpt-4o-mini"):
+        """
+        Cuts every section summary to an equal share of `max_tokens` when, formatted together, they do not fit in it.
+
+        Args:
+            summaries (list): Summaries of the sections of the paper, in reading order.
+            max_tokens (int): Token budget of the formatted summaries.
+            model_name (str, optional): Name of the model whose tokenizer is used. Default is "gpt-4o-mini".
+
+        Returns:
+            list: The summaries, cut if needed.
+        """
+        if not summaries or Prompter.count_tokens(Prompter.format_summaries(summaries), model_name) <= max_tokens:
+            return list(summaries)
+        # a share leaves room for the "Section N:" header of its summary
+        share = max(1, max_tokens // len(summaries) - 10)
+        return [Prompter.split_paper(summary, share, model_name)[0] if summary else summary for summary in summaries]
+
+    def build_reduce_messages(context_by_topic, summaries, token_budget, completion_tokens=1500, min_context_tokens=1000,
+                              priority=None, model_name="gpt-4o-mini"):
+        """
+        Assembles the messages of the reduce step of a map-reduce plan once the section summaries are known,
+        within the same token budget as `build_messages`.
+
+        The context is trimmed to the room left by the summaries, up to half of the budget as planned. If the
+        summaries leave less than `min_context_tokens`, they are cut to fit (see `fit_summaries`).
+
+        Args:
+            context_by_topic (dict): Topic mapped to its list of retrieved chunks.
+            summaries (list): Summaries of the sections of the paper, in reading order.
+            token_budget (int): Maximum number of tokens of the prompt plus the answer.
+            completion_tokens (int, optional): Tokens reserved for the answer. Default is 1500.
+            min_context_tokens (int, optional): Smallest useful context. Default is 1000.
+            priority (list, optional): Topics from most to least important, used to trim the context.
+            model_name (str, optional): Name of the model whose tokenizer is used. Default is "gpt-4o-mini".
+
+        Returns:
+            dict: The 'system_message', the 'human_message', the 'summaries' as sent (possibly cut) and
+                  'tokens' ('system' and 'human' counts).
+        """
+        instructions_tokens = Prompter.count_tokens(Prompter.get_researcher_system(""), model_name)
+        room = token_budget - completion_tokens - instructions_tokens
+        header_tokens = Prompter.count_tokens(Prompter.get_researcher_human_from_summaries([]), model_name)
+        summaries = Prompter.fit_summaries(summaries, room - min_context_tokens - header_tokens, model_name)
+        human_message = Prompter.get_researcher_human_from_summaries(summaries)
+        human_tokens = Prompter.count_tokens(human_message, model_name)
+
+        context_tokens = max(0, min(room - human_tokens, max(min_context_tokens, room // 2)))
+        context = Prompter.format_context(Prompter.trim_context(context_by_topic, context_tokens, priority, model_name))
+        system_message = Prompter.get_researcher_system(context)
+        return {
+            'system_message': system_message,
+            'human_message': human_message,
+            'summaries': summaries,
+            'tokens': {'system': Prompter.count_tokens(system_message, model_name), 'human': human_tokens},
+        }
+
+    def get_part_system(part, additional_context):
+        """
+        Generates the system message of one element of the briefing in "sections" generation mode: the full
+        instructions, so every element follows the same structure and tone, restricted to that element.
+
+        Args:
+            part (dict): Element of `BRIEFING_PARTS`.
+            additional_context (str): Retrieved examples of this element.
+
+        Returns:
+            str: Formatted system message.
+        """
+        return (
+            Prompter.get_researcher_system(additional_context) + "\n\n"
+            "The briefing is written element by element by separate requests, which are then joined in the order above. "
+            f"{part['instruction']} Do not write any other element of the briefing and do not comment on the task."
+        )
+
+    def get_part_human(part, paper):
+        """
+        Generates the user message requesting one element of the briefing in "sections" generation mode.
+
+        Args:
+            part (dict): Element of `BRIEFING_PARTS`.
+            paper (str): Content of the paper, or its section summaries when it is too long.
+
+        Returns:
+            str: Formatted message requesting the element.
+        """
+        return (f"Write the {part['label']} of an evidence briefing on the following paper:\n{paper}")
+
+    def assign_topics(topics):
+        """
+        Distributes the retrieved topics among the elements of `BRIEFING_PARTS`. A topic that no element names
+        is given to the main findings.
+
+        Args:
+            topics (list): Topics of the retrieved context.
+
+        Returns:
+            dict: Name of each element mapped to its list of topics.
+        """
+        assignment = {part["name"]: [topic for topic in topics if topic in part["topics"]] for part in Prompter.BRIEFING_PARTS}
+        claimed = {topic for part in Prompter.BRIEFING_PARTS for topic in part["topics"]}
+        assignment["main_findings"] += [topic for topic in topics if topic not in claimed]
+        return assignment
+
+    def plan_parts(paper, token_budget, completion_tokens=1500, min_context_tokens=1000, model_name="gpt-4o-mini"):
+        """
+        Plans the requests of "sections" generation mode: tells whether the paper fits in every element's request
+        with at least `min_context_tokens` of context, or must be summarized section by section first, as in
+        `build_messages`. No message is assembled; see `build_part_messages`.
+
+        Args:
+            paper (str): Full content of the scientific article.
+            token_budget (int): Maximum number of tokens of each request, prompt plus answer.
+            completion_tokens (int, optional): Tokens reserved for the answer. Default is 1500.
+            min_context_tokens (int, optional): Smallest useful context. Default is 1000.
+            model_name (str, optional): Name of the model whose tokenizer is used. Default is "gpt-4o-mini".
+
+        Returns:
+            dict: Plan with the keys 'mode' ("single" or "map_reduce"), 'sections' (paper sections for map-reduce),
+                  'max_paper_tokens' (room for the paper or its summaries in every request) and 'tokens'.
+        """
+        instructions_tokens = max(
+            Prompter.count_tokens(Prompter.get_part_system(part, ""), model_name)
+            + Prompter.count_tokens(Prompter.get_part_human(part, ""), model_name)
+            for part in Prompter.BRIEFING_PARTS
+        )
+        max_paper_tokens = token_budget - completion_tokens - instructions_tokens - min_context_tokens
+        paper_tokens = Prompter.count_tokens(paper, model_name)
+        if paper_tokens <= max_paper_tokens:
+            return {
+                'mode': "single",
+                'sections': [],
+                'max_paper_tokens': max_paper_tokens,
+                'tokens': {'budget': token_budget, 'paper': paper_tokens, 'completion_reserved': completion_tokens},
+            }
+        sections = Prompter.split_paper(paper, max(min_context_tokens, token_budget - completion_tokens - 500), model_name)
+        return {
+            'mode': "map_reduce",
+            'sections': sections,
+            'max_paper_tokens': max_paper_tokens,
+            'tokens': {
+                'budget': token_budget,
+                'paper': paper_tokens,
+                'sections': [Prompter.count_tokens(section, model_name) for section in sections],
+                'completion_reserved': completion_tokens,
+            },
+        }
+
+    def build_part_messages(context_by_topic, paper, token_budget, completion_tokens=1500, priority=None,
+                            model_name="gpt-4o-mini"):
+        """
+        Assembles the messages of every element of the briefing for "sections" generation mode. Each request
+        only receives the context of its own topics, trimmed by priority to the room left by its instructions,
+        the paper and the tokens reserved for the answer.
+
+        Args:
+            context_by_topic (dict): Topic mapped to its list of retrieved chunks.
+            paper (str): Content of the paper, or its section summaries when it does not fit in the budget.
+            token_budget (int): Maximum number of tokens of each request, prompt plus answer.
+            completion_tokens (int, optional): Tokens reserved for the answer. Default is 1500.
+            priority (list, optional): Topics from most to least important, used to trim the context.
+            model_name (str, optional): Name of the model whose tokenizer is used. Default is "gpt-4o-mini".
+
+        Returns:
+            list: One dict per element of `BRIEFING_PARTS`, in reading order, with its 'name', 'system_message',
+                  'human_message' and 'tokens' ('system' and 'human' counts).
+        """
+        assignment = Prompter.assign_topics(list(context_by_topic))
+        paper_tokens = Prompter.count_tokens(paper, model_name)
+        messages = []
+        for part in Prompter.BRIEFING_PARTS:
+            human_message = Prompter.get_part_human(part, paper)
+            human_tokens = paper_tokens + Prompter.count_tokens(Prompter.get_part_human(part, ""), model_name)
+            instructions_tokens = Prompter.count_tokens(Prompter.get_part_system(part, ""), model_name)
+            available = max(0, token_budget - completion_tokens - instructions_tokens - human_tokens)
+            part_context = {topic: context_by_topic[topic] for topic in assignment[part["name"]]}
+            context = Prompter.format_context(Prompter.trim_context(part_context, available, priority, model_name))
+            system_message = Prompter.get_part_system(part, context)
+            messages.append({
+                'name': part["name"],
+                'system_message': system_message,
+                'human_message': human_message,
+                'tokens': {'system': Prompter.count_tokens(system_message, model_name), 'human': human_tokens},
+            })
+        return messages
+
+    def _heading_key(line):
+        return re.sub(r"[#*_\s]+", " ", line).strip().lower()
+
+    def iter_briefing_parts(pieces):
+        """
+        Joins the elements of a briefing generated separately, in order, as they become available.
+
+        Code fences around an element are removed, and so is a repetition of the title at the start of a later
+        element. Empty elements are skipped.
+
+        Args:
+            pieces (iterable): Text of each element, in the order of `BRIEFING_PARTS`.
+
+        Yields:
+            str: Pieces of the assembled briefing, in order; their concatenation is the whole briefing.
+        """
+        title = None
+        emitted = False
+        for piece in pieces:
+            lines = re.sub(r"^```\w*\n|\n?```$", "", piece.strip()).strip().splitlines()
+            if title is None:
+                title = Prompter._heading_key(lines[0]) if lines else None
+            else:
+                while lines and (not lines[0].strip() or Prompter._heading_key(lines[0]) == title):
+                    lines.pop(0)
+            text = "\n".join(lines).strip()
+            if text:
+                yield ("\n\n" if emitted else "") + text
+                emitted = True
+
+    def assemble_briefing(pieces):
+        """
+        Joins the elements of a briefing generated separately; see `iter_briefing_parts`.
+
+        Args:
+            pieces (iterable): Text of each element, in the order of `BRIEFING_PARTS`.
+
+        Returns:
+            str: The assembled briefing.
+        """
+        return "".join(Prompter.iter_briefing_parts(pieces))
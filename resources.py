@@ -0,0 +1,163 @@
+import time
+import threading
+from contextlib import contextmanager
+
+
+class StartupReport:
+    """
+    Collects how long each import and initialization step takes, so slow starts can be diagnosed.
+
+    Attributes:
+        entries (list): List of (stage, seconds) tuples, in the order they finished.
+    """
+
+    def __init__(self):
+        self.entries = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def timed(self, stage):
+        """
+        Measures the wall-clock time of the enclosed block and records it under `stage`.
+
+        Args:
+            stage (str): Name of the step, e.g. "import:langchain_openai" or "init:retriever".
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.entries.append((stage, time.perf_counter() - start))
+
+    def summary(self):
+        """
+        Formats the recorded steps as a table, slowest first.
+
+        Returns:
+            str: Human readable breakdown of the startup time.
+        """
+        with self._lock:
+            entries = sorted(self.entries, key=lambda entry: entry[1], reverse=True)
+        total = sum(seconds for _, seconds in entries)
+        lines = ["--- TEMPO DE INICIALIZAÇÃO ---"]
+        for stage, seconds in entries:
+            share = 100 * seconds / total if total else 0
+            lines.append(f"{stage:<45} {seconds * 1000:>10.1f} ms {share:>6.1f}%")
+        lines.append(f"{'total':<45} {total * 1000:>10.1f} ms")
+        return "\n".join(lines)
+
+
+startup_report = StartupReport()
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def get_resource(key, factory):
+    """
+    Returns the process-wide instance stored under `key`, creating it with `factory` on first use.
+
+    Streamlit re-executes `main.py` on every interaction but keeps imported modules alive, so objects
+    stored here are built once per process and shared by every session. Creation is serialized per key,
+    so concurrent sessions never build the same resource twice.
+
+    Args:
+        key (hashable): Identifies the resource, usually its class name plus its configuration.
+        factory (callable): Builds the resource when it does not exist yet.
+
+    Returns:
+        object: The shared instance.
+    """
+    with _registry_lock:
+        entry = _registry.get(key)
+        if entry is None:
+            entry = _registry[key] = {"lock": threading.Lock(), "value": None, "ready": False}
+    if entry["ready"]:
+        return entry["value"]
+    with entry["lock"]:
+        if not entry["ready"]:
+            entry["value"] = factory()
+            entry["ready"] = True
+    return entry["value"]
+
+
+def get_controller(data_path, embedding_model, openai_model_name, openai_api_key, topics, topics_chunk_size, **options):
+    """
+    Returns the process-wide Controller for the given configuration.
+
+    Args:
+        Same as `Controller.__init__`; keyword options are passed through.
+
+    Returns:
+        Controller: Shared controller; its heavy subsystems are only built when first used.
+    """
+    import json
+    from controller import Controller
+
+    key = ("Controller", data_path, embedding_model, openai_model_name, openai_api_key,
+           tuple(topics), tuple(topics_chunk_size), json.dumps(options, sort_keys=True, default=repr))
+    return get_resource(key, lambda: Controller(
+        data_path, embedding_model, openai_model_name, openai_api_key, topics, topics_chunk_size, **options
+    ))
+
+
+def configured_options():
+    """
+    Returns the keyword options of `Controller.__init__` set in `config.py`.
+
+    The positional arguments of the Controller (paths, models, API key and topics) are not included.
+    """
+    import config
+
+    return dict(
+        response_cache_path=config.response_cache_path,
+        refresh_cache=config.refresh_cache,
+        token_budget=config.token_budget,
+        completion_tokens=config.completion_tokens,
+        topics_priority=config.topics_priority,
+        embedding_backend=config.embedding_backend,
+        embedding_batch_size=config.embedding_batch_size,
+        embedding_threads=config.embedding_threads,
+        vector_store=config.vector_store,
+        index_chunk_size=config.index_chunk_size,
+        temperature=config.temperature,
+        chat_backend=config.chat_backend,
+        local_model_name=config.local_model_name,
+        local_batch_size=config.local_batch_size,
+        local_threads=config.local_threads,
+        retrieval_mode=config.retrieval_mode,
+        pdf_backend=config.pdf_backend,
+        max_paper_tokens=config.max_paper_tokens,
+        generation_mode=config.generation_mode,
+        request_timeout=config.request_timeout,
+        request_max_retries=config.request_max_retries
+    )
+
+
+def get_configured_controller(**overrides):
+    """
+    Returns the process-wide Controller built from the settings in `config.py`.
+
+    Args:
+        **overrides: Keyword options of `Controller.__init__` replacing the configured ones,
+                     e.g. `chat_model=FakeChatModel()`.
+    """
+    import config
+    from tracing import serve_prometheus, tracer
+
+    tracer.configure(enabled=config.trace_enabled, jsonl_path=config.trace_jsonl_path)
+    if config.trace_enabled and config.trace_prometheus_port:
+        serve_prometheus(config.trace_prometheus_port)
+    options = configured_options()
+    options.update(overrides)
+    return get_controller(
+        config.directory_path, config.embedding_model, config.openai_model_name,
+        config.get_openai_api_key(), config.topics, config.topics_chunk_size, **options
+    )
+
+if __name__ == "__main__":
+    with startup_report.timed("init:controller"):
+        controller = get_configured_controller()
+    controller.warm_up()
+    print(startup_report.summary())
@@ -0,0 +1,127 @@
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+
+
+class ResponseCache:
+    """
+    Persistent, content-addressed cache of model responses stored in SQLite.
+
+    Responses are keyed by the hash of (model, temperature, system message, human message), so repeating a
+    byte-identical request returns the stored answer instead of calling the API. Entries older than `max_age`
+    seconds are discarded and the least recently used entries are evicted above `max_entries`. Eviction runs
+    when the cache is opened and then every `EVICT_EVERY` writes, so the table may briefly hold a few more
+    entries than `max_entries`.
+
+    Attributes:
+        path (str): Path of the SQLite database.
+        max_entries (int): Maximum number of stored responses, or None for no limit.
+        max_age (float): Maximum age of a response in seconds, or None for no limit.
+        hits (int): Number of lookups answered from the cache.
+        misses (int): Number of lookups not found in the cache.
+    """
+
+    EVICT_EVERY = 100
+
+    def __init__(self, path=".response_cache.sqlite", max_entries=10000, max_age=30 * 24 * 3600):
+        """
+        Initializes the ResponseCache class, creating the database if needed and dropping expired entries.
+
+        Args:
+            path (str, optional): Path of the SQLite database. Default is ".response_cache.sqlite".
+            max_entries (int, optional): Maximum number of stored responses. Default is 10000.
+            max_age (float, optional): Maximum age of a response in seconds. Default is 30 days.
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._puts = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, model TEXT, response TEXT, created REAL, last_access REAL)"
+            )
+            self._connection.execute("CREATE INDEX IF NOT EXISTS responses_created ON responses (created)")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+            self._evict()
+
+    @staticmethod
+    def make_key(model_name, temperature, system_message, human_message):
+        """
+        Builds the key of a request.
+
+        Returns:
+            str: SHA-256 of the model name, temperature and both messages.
+        """
+        payload = json.dumps([model_name, temperature, system_message, human_message])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """
+        Returns the stored response for `key`, or None if it is missing or expired.
+        """
+        now = time.time()
+        with self._lock, self._connection:
+            row = self._connection.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or (self.max_age is not None and now - row[1] > self.max_age):
+                self.misses += 1
+                return None
+            self._connection.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, model_name, response):
+        """
+        Stores `response` under `key`. Every `EVICT_EVERY` writes, the least recently used entries above
+        `max_entries` are evicted.
+        """
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, created, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, model_name, response, now, now)
+            )
+            self._puts += 1
+            if self._puts % self.EVICT_EVERY == 0:
+                self._evict()
+
+    def _evict(self):
+        if self.max_age is not None:
+            self._connection.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.max_age,))
+        if self.max_entries is None:
+            return
+        excess = self._connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0] - self.max_entries
+        if excess > 0:
+            self._connection.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY last_access LIMIT ?)",
+                (excess,)
+            )
+
+    def clear(self):
+        """
+        Removes every stored response.
+        """
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM responses")
+
+    def stats(self):
+        """
+        Returns:
+            dict: Number of hits, misses, hit rate and stored entries.
+        """
+        with self._lock:
+            entries = self._connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+        }
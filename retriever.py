@@ -1,54 +1,390 @@
-from langchain_community.vectorstores import Chroma
-from langchain.embeddings import SentenceTransformerEmbeddings
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+import os
+import time
+import threading
+from chunking import INTRO_SECTION, get_splitter
+from context_cache import ContextCache
+from embeddings import LazyEmbeddings
+from index_manager import IndexManager
+from lexical_index import tokenize
+from prompter import Prompter
+from resources import startup_report
+from tracing import tracer
 
-class Retriever():
+RETRIEVAL_MODES = ("dense", "bm25", "hybrid")
+# rank offset of reciprocal-rank fusion, as in Cormack et al.
+RRF_K = 60
 
-    class Retriever:
-        """
-        Class responsible for creating and managing a vector store to retrieve the most relevant
-        passages related to a query.
 
-        Attributes:
-            vectorstore (Chroma): Stores document embeddings and performs similarity searches.
-        """
+def _select_mmr(query_embedding, hits, k, budget, picked, mmr_lambda, dedup_threshold, relevance=None):
+    """
+    Picks up to `k` hits by maximal marginal relevance, within `budget` characters.
+
+    Args:
+        query_embedding (list): Embedding of the query.
+        hits (list): Candidate hits with their 'text' and 'embedding', nearest first.
+        k (int): Maximum number of hits to pick.
+        budget (int): Maximum total size of the picked texts in characters.
+        picked (list): Unit embeddings of the chunks already picked; extended in place.
+        mmr_lambda (float): Weight of the relevance to the query against the similarity to picked chunks.
+        dedup_threshold (float): Cosine similarity above which a hit is a near-duplicate of a picked chunk.
+        relevance (list, optional): Relevance of each hit, between 0 and 1. Defaults to the cosine similarity
+                                    of the hit to the query.
+
+    Returns:
+        list: Texts of the picked hits, in the order they were picked.
+    """
+    import numpy as np
+
+    if not hits:
+        return []
+    vectors = np.array([hit["embedding"] for hit in hits], dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12
+    if relevance is None:
+        query = np.asarray(query_embedding, dtype=np.float32)
+        relevance = vectors @ (query / (np.linalg.norm(query) + 1e-12))
+    else:
+        relevance = np.asarray(relevance, dtype=np.float32)
+
+    chosen, used = [], 0
+    remaining = list(range(len(hits)))
+    while remaining and len(chosen) < k:
+        if picked:
+            redundancy = (vectors[remaining] @ np.asarray(picked).T).max(axis=1)
+        else:
+            redundancy = np.zeros(len(remaining), dtype=np.float32)
+        best = int(np.argmax(mmr_lambda * relevance[remaining] - (1 - mmr_lambda) * redundancy))
+        index = remaining.pop(best)
+        if redundancy[best] >= dedup_threshold:
+            continue
+        text = hits[index]["text"]
+        if used + len(text) > budget:
+            if chosen:
+                continue
+            text = get_splitter(budget).split_text(text)[0]
+        chosen.append(text)
+        used += len(text)
+        picked.append(vectors[index])
+    return chosen
+
+
+def _select_lexical(hits, k, budget, picked, dedup_threshold):
+    """
+    Picks up to `k` hits in rank order, skipping near-duplicates of the chunks already picked, within `budget`
+    characters. Without embeddings, two chunks are compared by the cosine similarity of their sets of words.
+
+    Args:
+        hits (list): Candidate hits with their 'id' and 'text', best first.
+        k (int): Maximum number of hits to pick.
+        budget (int): Maximum total size of the picked texts in characters.
+        picked (dict): Id of each chunk already picked mapped to its set of words; extended in place.
+        dedup_threshold (float): Similarity above which a hit is a near-duplicate of a picked chunk.
+
+    Returns:
+        list: Texts of the picked hits, in rank order.
+    """
+    import math
+
+    chosen, used = [], 0
+    for hit in hits:
+        if len(chosen) >= k:
+            break
+        if hit["id"] in picked:
+            continue
+        words = set(tokenize(hit["text"]))
+        if words and any(
+            len(words & other) / math.sqrt(len(words) * len(other)) >= dedup_threshold for other in picked.values() if other
+        ):
+            continue
+        text = hit["text"]
+        if used + len(text) > budget:
+            if chosen:
+                continue
+            text = get_splitter(budget).split_text(text)[0]
+        chosen.append(text)
+        used += len(text)
+        picked[hit["id"]] = words
+    return chosen
+
+
+def _fuse_ranks(query_embedding, hits, embeddings):
+    """
+    Re-ranks BM25 hits by their cosine similarity to the query and fuses both rankings by reciprocal rank.
+
+    Args:
+        query_embedding (list): Embedding of the query.
+        hits (list): BM25 hits, best first.
+        embeddings (list): Stored embedding of each hit, or None if the vector store does not have it.
 
-    def __init__(self, documents, embedding_model):
+    Returns:
+        list: The hits that have an embedding, with it as 'embedding' and their fused 'relevance' (the best
+              one is 1), best first.
+    """
+    import numpy as np
+
+    hits = [dict(hit, embedding=embedding) for hit, embedding in zip(hits, embeddings) if embedding is not None]
+    if not hits:
+        return []
+    vectors = np.array([hit["embedding"] for hit in hits], dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12
+    query = np.asarray(query_embedding, dtype=np.float32)
+    dense_order = np.argsort(-(vectors @ (query / (np.linalg.norm(query) + 1e-12))), kind="stable")
+    fused = np.array([1.0 / (RRF_K + rank + 1) for rank in range(len(hits))])
+    fused[dense_order] += 1.0 / (RRF_K + np.arange(1, len(hits) + 1))
+    fused /= fused.max()
+    order = np.argsort(-fused, kind="stable")
+    return [dict(hits[i], relevance=float(fused[i])) for i in order]
+
+
+class Retriever():
+    """
+    Class responsible for creating and managing a vector store to retrieve the most relevant
+    passages related to a query.
+
+    Attributes:
+        index_manager (IndexManager): Keeps the persisted index in sync with the PDF files, chunked by section.
+        vectorstore (VectorStore): Stores document embeddings and performs similarity searches.
+                              The index is synchronized on first access.
+        index_version (str): Version stamp of the index content, available once the index is synchronized.
+        context_cache (ContextCache): Persistent LRU cache of the contexts built by `get_context_by_topic`.
+        fetch_factor (int): Candidates fetched per requested chunk, among which MMR picks.
+        mmr_lambda (float): MMR weight of relevance (1.0) against diversity (0.0).
+        dedup_threshold (float): Cosine similarity above which a chunk is a near-duplicate of a picked one.
+        retrieval_mode (str): "dense", "bm25" or "hybrid"; see `get_top_chunks_batch`.
+    """
+
+    def __init__(self, data_path, data_loader, embedding_model, persist_directory="./chroma_db",
+                 embedding_backend="torch", embedding_batch_size=32, embedding_threads=None, vector_store="chroma",
+                 chunk_size=1000, fetch_factor=4, mmr_lambda=0.7, dedup_threshold=0.95, retrieval_mode="dense"):
         """
-        Initializes the Retriever class with documents and an embedding model.
+        Initializes the Retriever class. The index is only opened (and its new or changed
+        chunks embedded) when it is first used.
 
         Args:
-            documents (list): List of `Document` objects representing the texts to be indexed.
+            data_path (str): Path to the directory containing the PDF files to be indexed.
+            data_loader (DataLoader): Loader used to parse the PDF files.
             embedding_model (str): Name of the embedding model used to create vector representations.
+            persist_directory (str, optional): Directory of the persisted index. Default is "./chroma_db".
+            embedding_backend (str, optional): "torch", "onnx", "int8" or "hashing"; see `LazyEmbeddings`. Default is "torch".
+                                               Changing it rebuilds the index.
+            embedding_batch_size (int, optional): Number of texts encoded per forward pass. Default is 32.
+            embedding_threads (int, optional): Number of CPU threads of the encoder. Defaults to the backend's setting.
+            vector_store (str, optional): "chroma" or "numpy"; see `vector_store.open_vector_store`. Default is "chroma".
+                                          Changing it rebuilds the index.
+            chunk_size (int, optional): Maximum size of an indexed chunk in characters. Default is 1000.
+                                        Changing it rebuilds the index.
+            fetch_factor (int, optional): Candidates fetched per requested chunk. Default is 4.
+            mmr_lambda (float, optional): MMR weight of relevance against diversity. Default is 0.7.
+            dedup_threshold (float, optional): Cosine similarity of near-duplicate chunks (of their embeddings, or of
+                                               their words in "bm25" mode). Default is 0.95.
+            retrieval_mode (str, optional): "dense", "bm25" or "hybrid". Default is "dense".
+
+        Raises:
+            ValueError: If `retrieval_mode` is not one of `RETRIEVAL_MODES`.
         """
-        self.vectorstore = Chroma.from_documents(
-            documents=documents,  
-            embedding=SentenceTransformerEmbeddings(model_name=embedding_model),
-            persist_directory="./chroma_db"
+        if retrieval_mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode '{retrieval_mode}'. Available: {', '.join(RETRIEVAL_MODES)}")
+        self.data_path = data_path
+        self.embedding_model = embedding_model
+        embedding = LazyEmbeddings(
+            embedding_model, backend=embedding_backend, batch_size=embedding_batch_size, threads=embedding_threads
+        )
+        self.index_manager = IndexManager(
+            data_loader=data_loader,
+            embedding=embedding,
+            embedding_model=embedding_model,
+            persist_directory=persist_directory,
+            embedding_model_version=embedding.version,
+            vector_store=vector_store,
+            chunk_size=chunk_size
         )
+        self.fetch_factor = fetch_factor
+        self.mmr_lambda = mmr_lambda
+        self.dedup_threshold = dedup_threshold
+        self.retrieval_mode = retrieval_mode
+        self.index_version = None
+        self.context_cache = ContextCache(os.path.join(persist_directory, "context_cache.json"))
+        self._vectorstore = None
+        self._lock = threading.Lock()
+
+    @property
+    def vectorstore(self):
+        if self._vectorstore is None:
+            with self._lock:
+                if self._vectorstore is None:
+                    with startup_report.timed("init:index_sync"):
+                        vectorstore = self.index_manager.sync(self.data_path)
+                    self.index_version = self.index_manager.index_version
+                    self.context_cache.invalidate(self.index_version)
+                    self._vectorstore = vectorstore
+        return self._vectorstore
+
+    def warm_up(self):
+        """
+        Opens the index and loads the embedding model ahead of the first query; the BM25 mode needs no model.
+        """
+        self.vectorstore
+        if self.retrieval_mode != "bm25":
+            self.index_manager.embedding._load()
 
     def _get_top_chunks(self, query, num_chunks=5, chunk_size=1000):
         """
-        Retrieves the `num_chunks` most relevant passages for the given query and splits the results
-        into chunks of the specified size.
+        Retrieves up to `num_chunks` relevant chunks for the given query, within `chunk_size` characters.
 
         Args:
             query (str): Textual query to search for relevant passages.
-            num_chunks (int, optional): Number of top relevant passages to return. Default is 5.
-            chunk_size (int, optional): Maximum size of each chunk in characters. Default is 1000.
+            num_chunks (int, optional): Maximum number of chunks to return. Default is 5.
+            chunk_size (int, optional): Maximum total size of the chunks in characters. Default is 1000.
 
         Returns:
             list: List of strings containing the most relevant chunks.
         """
-        results = self.vectorstore.similarity_search(query, k=num_chunks)
-        chunks = []
-        splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=0)
+        return self.get_top_chunks_batch([query], num_chunks=num_chunks, chunk_sizes=[chunk_size])[0]
+
+    def get_top_chunks_batch(self, queries, num_chunks=5, chunk_sizes=None, sections=None, mode=None):
+        """
+        Retrieves relevant chunks for each query at once. A query restricted to a section only sees the chunks
+        of that section; if the index has none, it searches every chunk.
+
+        In "dense" mode all queries are embedded in a single encoder pass and searched together. The chunks of
+        each query are then picked by maximal marginal relevance (MMR) among the `fetch_factor * num_chunks`
+        nearest ones, balancing relevance to the query against similarity to the chunks already picked, for
+        this query or an earlier one. Near-duplicates of a picked chunk are dropped, and a query stops receiving
+        chunks once its character budget is spent.
 
-        for res in results:
-            page_chunks = splitter.split_text(res.page_content)
-            chunks.extend(page_chunks)
-        
-        return chunks
+        In "bm25" mode the chunks are ranked by the lexical index alone and the first `num_chunks` are taken in
+        rank order, without embedding anything; near-duplicates are compared by their words instead. In "hybrid" mode the lexical index prefilters `fetch_factor` times more candidates
+        than the dense mode fetches; their stored embeddings re-rank them by similarity to the query, the two
+        rankings are fused by reciprocal rank and MMR picks among the best fused candidates. A query sharing no
+        word with the index falls back to the dense search.
+
+        Args:
+            queries (list): Textual queries to search for relevant passages.
+            num_chunks (int, optional): Maximum number of chunks per query. Default is 5.
+            chunk_sizes (list, optional): Character budget of each query. Default is 1000 for all.
+            sections (list, optional): Section each query is restricted to, or None. Default is no restriction.
+            mode (str, optional): One of `RETRIEVAL_MODES`. Defaults to `retrieval_mode`.
+
+        Returns:
+            list: One list of chunk strings per query, in the order of `queries`.
+        """
+        if not queries:
+            return []
+        mode = mode or self.retrieval_mode
+        if chunk_sizes is None:
+            chunk_sizes = [1000] * len(queries)
+        filters = [{"section": section} if section else None for section in (sections or [None] * len(queries))]
+        fetch_k = num_chunks * self.fetch_factor
+        if mode == "bm25":
+            hits_by_query = self._lexical_search(queries, fetch_k, filters)
+            picked = {}
+            return [
+                _select_lexical(hits, num_chunks, budget, picked, self.dedup_threshold)
+                for hits, budget in zip(hits_by_query, chunk_sizes)
+            ]
+
+        query_embeddings = self.index_manager.embedding.embed_documents(list(queries))
+        if mode == "hybrid":
+            hits_by_query = self._hybrid_search(queries, query_embeddings, fetch_k, filters)
+            picked = []
+            return [
+                _select_mmr(
+                    query_embedding, hits, num_chunks, budget, picked, self.mmr_lambda, self.dedup_threshold,
+                    # hits of the dense fallback keep their cosine relevance
+                    relevance=[hit["relevance"] for hit in hits] if hits and "relevance" in hits[0] else None
+                )
+                for query_embedding, hits, budget in zip(query_embeddings, hits_by_query, chunk_sizes)
+            ]
+
+        hits_by_query = self._dense_search(query_embeddings, fetch_k, filters)
+        picked = []
+        chunks_by_query = []
+        for query_embedding, hits, budget in zip(query_embeddings, hits_by_query, chunk_sizes):
+            chunks_by_query.append(_select_mmr(
+                query_embedding, hits, num_chunks, budget, picked, self.mmr_lambda, self.dedup_threshold
+            ))
+        return chunks_by_query
+
+    def _dense_search(self, query_embeddings, fetch_k, filters):
+        hits_by_query = self.vectorstore.query(query_embeddings, fetch_k, filters=filters, include_embeddings=True)
+        missing = [position for position, hits in enumerate(hits_by_query) if not hits and filters[position]]
+        if missing:
+            fallback = self.vectorstore.query([query_embeddings[i] for i in missing], fetch_k, include_embeddings=True)
+            for position, hits in zip(missing, fallback):
+                hits_by_query[position] = hits
+        return hits_by_query
+
+    def _lexical_search(self, queries, k, filters):
+        self.vectorstore
+        lexical_index = self.index_manager.lexical_index
+        hits_by_query = lexical_index.search(queries, k, filters=filters)
+        missing = [position for position, hits in enumerate(hits_by_query) if not hits and filters[position]]
+        if missing:
+            for position, hits in zip(missing, lexical_index.search([queries[i] for i in missing], k)):
+                hits_by_query[position] = hits
+        return hits_by_query
+
+    def _hybrid_search(self, queries, query_embeddings, fetch_k, filters):
+        candidates_by_query = self._lexical_search(queries, fetch_k * self.fetch_factor, filters)
+        ids = list({hit["id"] for hits in candidates_by_query for hit in hits})
+        embeddings = dict(zip(ids, self.vectorstore.get_embeddings(ids)))
+        hits_by_query = [
+            _fuse_ranks(query_embedding, hits, [embeddings[hit["id"]] for hit in hits])[:fetch_k]
+            for query_embedding, hits in zip(query_embeddings, candidates_by_query)
+        ]
+        missing = [position for position, hits in enumerate(hits_by_query) if not hits]
+        if missing:
+            dense_hits = self._dense_search(
+                [query_embeddings[i] for i in missing], fetch_k, [filters[i] for i in missing]
+            )
+            for position, hits in zip(missing, dense_hits):
+                hits_by_query[position] = hits
+        return hits_by_query
+
+    def topic_queries(self, topics, user_topic):
+        """
+        Builds the query of each topic, and the section it is restricted to if it is named after one.
+
+        Returns:
+            tuple: The list of queries and the list of sections (or None), in the order of `topics`.
+        """
+        known_sections = {INTRO_SECTION, *self.index_manager.sections}
+        queries = [f"{topic} - {user_topic}" for topic in topics]
+        return queries, [topic if topic in known_sections else None for topic in topics]
+
+    def get_context_by_topic(self, topics, topics_chunk_size, user_topic, num_chunks=5):
+        """
+        Retrieves the most relevant chunks for every topic with one batched query. A topic named after a
+        section of the briefings (e.g. "Main Findings") only retrieves chunks of that section, and a chunk is
+        used by one topic at most.
+        The result is memoized in `context_cache`, keyed by the arguments, the embedding model and the index version.
+
+        Args:
+            topics (list): List of topics to build the query.
+            topics_chunk_size (list): Character budget of the context of each topic.
+            user_topic (str): Custom topic provided by the user to refine the queries.
+            num_chunks (int, optional): Maximum number of chunks per topic. Default is 5.
+
+        Returns:
+            dict: Topic mapped to its list of chunks, in the order of `topics`.
+        """
+        with tracer.span("retrieve") as span:
+            self.vectorstore
+            key = ContextCache.make_key(
+                topics, topics_chunk_size, user_topic, self.embedding_model, self.index_version, num_chunks,
+                options=[self.fetch_factor, self.mmr_lambda, self.dedup_threshold, self.retrieval_mode]
+            )
+            context_by_topic = self.context_cache.get(key)
+            span.set(cache_hit=context_by_topic is not None)
+            if context_by_topic is not None:
+                return dict(context_by_topic)
+
+            queries, sections = self.topic_queries(topics, user_topic)
+            chunks_by_query = self.get_top_chunks_batch(
+                queries, num_chunks=num_chunks, chunk_sizes=list(topics_chunk_size), sections=sections
+            )
+            context_by_topic = dict(zip(topics, chunks_by_query))
+            self.context_cache.put(key, list(context_by_topic.items()), self.index_version)
+        return context_by_topic
 
     def get_context(self, topics, topics_chunk_size, user_topic):
         """
@@ -62,16 +398,81 @@ class Retriever():
         Returns:
             str: Topic-formatted context containing the most relevant chunks.
         """
-        context_by_topic = {}
+        return Prompter.format_context(self.get_context_by_topic(topics, topics_chunk_size, user_topic, num_chunks=5))
+
+
+def compare_retrieval_modes(retriever, topics, topics_chunk_size, user_topics, num_chunks=5, repeats=3):
+    """
+    Measures the latency and recall of every retrieval mode on the topic queries of `get_context_by_topic`.
+
+    The context cache is bypassed and the index and embedding model are loaded beforehand, so the latency is
+    the one of a query batch. The dense mode, the current behavior, is the reference of the recall.
+
+    Args:
+        retriever (Retriever): Retriever whose index is searched.
+        topics (list): Topics of the queries.
+        topics_chunk_size (list): Character budget of each topic.
+        user_topics (list): User topics refining the queries; each one is a query batch.
+        num_chunks (int, optional): Maximum number of chunks per topic. Default is 5.
+        repeats (int, optional): Timed runs of each batch. Default is 3.
 
-        for topic, chunk_size in zip(topics, topics_chunk_size):
-            query_with_topic = f"{topic} - {user_topic}"
-            context_by_topic[topic] = self._get_top_chunks(query_with_topic, num_chunks=5, chunk_size=chunk_size)
+    Returns:
+        list: One dict per mode of `RETRIEVAL_MODES` with its 'mode', mean and maximum latency per batch in
+              milliseconds ('latency_ms', 'latency_ms_max'), 'recall' (share of the dense chunks it also
+              retrieves) and mean number of 'chunks' per topic.
+    """
+    retriever.vectorstore
+    retriever.index_manager.embedding._load()
+    batches = [retriever.topic_queries(topics, user_topic) for user_topic in user_topics]
+    results = {}
+    for mode in RETRIEVAL_MODES:
+        latencies, chunks_by_batch = [], []
+        for queries, sections in batches:
+            for _ in range(repeats):
+                start = time.perf_counter()
+                chunks_by_query = retriever.get_top_chunks_batch(
+                    queries, num_chunks=num_chunks, chunk_sizes=list(topics_chunk_size), sections=sections, mode=mode
+                )
+                latencies.append((time.perf_counter() - start) * 1000)
+            chunks_by_batch.append(chunks_by_query)
+        results[mode] = (latencies, chunks_by_batch)
 
-        return "\n".join([f"{topic}:\n" + "\n".join(context_by_topic[topic]) for topic in topics])
+    report = []
+    reference = results["dense"][1]
+    for mode, (latencies, chunks_by_batch) in results.items():
+        found = expected = 0
+        for chunks_by_query, reference_by_query in zip(chunks_by_batch, reference):
+            for chunks, reference_chunks in zip(chunks_by_query, reference_by_query):
+                found += len(set(chunks) & set(reference_chunks))
+                expected += len(set(reference_chunks))
+        topic_count = sum(len(chunks_by_query) for chunks_by_query in chunks_by_batch)
+        report.append({
+            "mode": mode,
+            "latency_ms": sum(latencies) / len(latencies),
+            "latency_ms_max": max(latencies),
+            "recall": found / expected if expected else 1.0,
+            "chunks": sum(len(chunks) for chunks_by_query in chunks_by_batch for chunks in chunks_by_query) / max(topic_count, 1),
+        })
+    return report
 
-        
 
+if __name__ == "__main__":
+    import sys
+    import config
+    from data_loader import DataLoader
 
-        
-    
\ No newline at end of file
+    user_topics = sys.argv[1:] or [""]
+    retriever = Retriever(
+        config.directory_path, DataLoader(), config.embedding_model,
+        embedding_backend=config.embedding_backend,
+        embedding_batch_size=config.embedding_batch_size,
+        embedding_threads=config.embedding_threads,
+        vector_store=config.vector_store,
+        chunk_size=config.index_chunk_size
+    )
+    report = compare_retrieval_modes(retriever, config.topics, config.topics_chunk_size, user_topics)
+    print(f"--- MODOS DE RECUPERAÇÃO ({len(user_topics)} tópicos do usuário, {len(config.topics)} consultas cada) ---")
+    print(f"{'modo':<8} {'média ms':>10} {'máx ms':>10} {'recall':>8} {'trechos':>8}")
+    for entry in report:
+        print(f"{entry['mode']:<8} {entry['latency_ms']:>10.1f} {entry['latency_ms_max']:>10.1f} "
+              f"{entry['recall']:>8.3f} {entry['chunks']:>8.1f}")
@@ -0,0 +1,107 @@
+import os
+import json
+import hashlib
+import threading
+
+
+def text_hash(text):
+    """
+    Returns the SHA-256 of a text, used to key evaluation rows by article content.
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class RunLog:
+    """
+    Durable, append-only JSONL log of the rows of one evaluation run.
+
+    A run is identified by the hash of its configuration (models, retrieval settings, index version...), and
+    every record by the hash of its article. Each record is flushed and synced to disk as soon as it is written,
+    so a crash loses at most the rows that were still being generated, and a restarted run can skip the rows
+    that already have results.
+
+    Attributes:
+        config (dict): Configuration of the run.
+        config_hash (str): SHA-256 of the configuration.
+        path (str): Path of the JSONL log.
+    """
+
+    def __init__(self, config, directory="eval_runs"):
+        """
+        Initializes the RunLog class, creating the log directory and a sidecar file with the configuration.
+
+        Args:
+            config (dict): JSON-serializable configuration of the run.
+            directory (str, optional): Directory of the run logs. Default is "eval_runs".
+        """
+        self.config = config
+        self.config_hash = text_hash(json.dumps(config, sort_keys=True))
+        self.path = os.path.join(directory, f"{self.config_hash[:16]}.jsonl")
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        config_path = os.path.join(directory, f"{self.config_hash[:16]}.json")
+        if not os.path.isfile(config_path):
+            with open(config_path, "w", encoding="utf-8") as f:
+                json.dump(config, f, indent=2)
+        self._drop_partial_line()
+
+    def _drop_partial_line(self):
+        # a crash in the middle of a write leaves a line without its newline; cut it so the next append starts clean
+        if not os.path.isfile(self.path):
+            return
+        with open(self.path, "rb+") as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            if size == 0:
+                return
+            f.seek(size - 1)
+            if f.read(1) == b"\n":
+                return
+            position = size
+            while position > 0:
+                start = max(0, position - (1 << 16))
+                f.seek(start)
+                newline = f.read(position - start).rfind(b"\n")
+                if newline >= 0:
+                    f.truncate(start + newline + 1)
+                    return
+                position = start
+            f.truncate(0)
+
+    def iter_records(self):
+        """
+        Streams the records of the log. A truncated last line, left by a crash, is ignored.
+
+        Yields:
+            dict: One record per completed row.
+        """
+        if not os.path.isfile(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+
+    def completed(self):
+        """
+        Returns:
+            set: Hashes of the articles that already have a result in this run.
+        """
+        return {record["article_hash"] for record in self.iter_records()}
+
+    def append(self, record):
+        """
+        Appends a record and forces it to disk.
+
+        Args:
+            record (dict): Row result; must contain "article_hash".
+        """
+        record = dict(record, config_hash=self.config_hash)
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
@@ -0,0 +1,165 @@
+import os
+import math
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from metrics import DEFAULT_METRICS, MetricFallbackWarning, registry, tokenize
+
+
+def score_pairs(pairs, metric_names=DEFAULT_METRICS):
+    """
+    Tokenizes and scores a list of (prediction, reference) pairs. Module-level so it can run in a worker process.
+
+    Each text is tokenized once per tokenization needed by the selected metrics, and the tokens are shared by them.
+
+    Args:
+        pairs (list): (prediction, reference) pairs.
+        metric_names (tuple, optional): Names of the metrics in the registry. Default is ROUGE, BLEU and METEOR.
+
+    Returns:
+        list: Per-pair scores, merged over the selected metrics.
+    """
+    metrics = [registry.get(name) for name in metric_names]
+    kinds = {metric.tokenization for metric in metrics}
+    rows = []
+    for prediction, reference in pairs:
+        prediction_tokens = tokenize(prediction, kinds)
+        reference_tokens = tokenize(reference, kinds)
+        row = {}
+        for metric in metrics:
+            row.update(metric.score(prediction_tokens[metric.tokenization], reference_tokens[metric.tokenization]))
+        rows.append(row)
+    return rows
+
+
+def _init_worker():
+    # the metrics were already built, and their fallbacks reported, by the parent process
+    warnings.simplefilter("ignore", MetricFallbackWarning)
+
+
+def _score_chunk(args):
+    pairs, metric_names = args
+    return score_pairs(pairs, metric_names)
+
+
+def aggregate(rows, metric_names=DEFAULT_METRICS):
+    """
+    Derives the aggregated scores from per-row scores, e.g. the mean F-measure of each ROUGE variant,
+    the mean METEOR and the corpus BLEU computed from the summed n-gram statistics.
+
+    Args:
+        rows (list): Per-row scores, as returned by `score_pairs`.
+        metric_names (tuple, optional): Names of the metrics in the registry. Default is ROUGE, BLEU and METEOR.
+
+    Returns:
+        dict: Scores grouped by metric, e.g. {"ROUGE": {...}, "BLEU": {...}, "METEOR": {...}}.
+    """
+    running = RunningScores(metric_names)
+    for row in rows:
+        running.add(row)
+    return running.aggregated()
+
+
+class RunningScores:
+    """
+    Incremental aggregate of per-row scores, so metrics can be reported over whatever rows are available.
+
+    Produces the same result as `aggregate` over the rows added so far, while keeping only running totals.
+
+    Attributes:
+        count (int): Number of rows added.
+    """
+
+    def __init__(self, metric_names=DEFAULT_METRICS):
+        self.count = 0
+        self._metrics = [registry.get(name) for name in metric_names]
+        self._states = [metric.new_state() for metric in self._metrics]
+
+    def add(self, scores):
+        """
+        Adds the scores of one row.
+
+        Args:
+            scores (dict): Per-row scores, as returned by `score_pairs`.
+        """
+        self.count += 1
+        for metric, state in zip(self._metrics, self._states):
+            metric.update(state, scores)
+
+    def aggregated(self):
+        """
+        Returns:
+            dict: Scores grouped by metric, e.g. {"ROUGE": {...}, "BLEU": {...}, "METEOR": {...}}.
+        """
+        return {
+            metric.group: metric.finalize(state, self.count)
+            for metric, state in zip(self._metrics, self._states)
+        }
+
+
+class BatchScorer:
+    """
+    Scores many generated briefs against their references in a single pass.
+
+    Every text is tokenized once and the tokens are shared by all metrics. Large datasets are split into
+    chunks scored by a pool of worker processes; the aggregated scores are derived from the per-row results.
+
+    Attributes:
+        metric_names (tuple): Names of the metrics to compute, from `metrics.registry`.
+        workers (int): Number of worker processes.
+        parallel_threshold (int): Minimum number of rows before the work is spread across processes.
+    """
+
+    def __init__(self, metric_names=DEFAULT_METRICS, workers=None, parallel_threshold=64):
+        """
+        Initializes the BatchScorer class. No metric is loaded until the first rows are scored.
+
+        Args:
+            metric_names (tuple, optional): Metrics to compute. Default is ROUGE, BLEU and METEOR.
+            workers (int, optional): Number of worker processes. Defaults to the number of CPUs.
+            parallel_threshold (int, optional): Minimum number of rows scored in parallel. Default is 64.
+        """
+        self.metric_names = tuple(metric_names)
+        self.workers = workers or os.cpu_count() or 1
+        self.parallel_threshold = parallel_threshold
+
+    def signature(self):
+        """
+        Returns:
+            list: "name:version" of every selected metric, identifying the scores they produce.
+        """
+        return [f"{name}:{registry.get(name).version}" for name in self.metric_names]
+
+    def score(self, predictions, references):
+        """
+        Scores every prediction against its reference.
+
+        Args:
+            predictions (list): Generated briefs.
+            references (list): Reference briefs, aligned with `predictions`.
+
+        Returns:
+            list: Per-row scores, in input order.
+        """
+        pairs = list(zip(predictions, references))
+        if self.workers <= 1 or len(pairs) < self.parallel_threshold:
+            return score_pairs(pairs, self.metric_names)
+
+        for name in self.metric_names:
+            registry.get(name)
+        chunk_size = max(1, math.ceil(len(pairs) / (self.workers * 4)))
+        chunks = [(pairs[i:i + chunk_size], self.metric_names) for i in range(0, len(pairs), chunk_size)]
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker) as executor:
+            return [row for rows in executor.map(_score_chunk, chunks) for row in rows]
+
+    def aggregate(self, rows):
+        """
+        Derives the aggregated scores of the selected metrics from per-row scores.
+        """
+        return aggregate(rows, self.metric_names)
+
+    def running(self):
+        """
+        Returns:
+            RunningScores: Incremental aggregate of the selected metrics.
+        """
+        return RunningScores(self.metric_names)
@@ -0,0 +1,275 @@
+import json
+import time
+import argparse
+import itertools
+
+SWEEP_KEYS = ("openai_model_name", "temperature", "topics", "topics_chunk_size", "user_topic", "generation_mode")
+
+
+def expand_grid(grid, defaults):
+    """
+    Lists the configurations of a parameter grid.
+
+    Args:
+        grid (dict): Some of `SWEEP_KEYS` mapped to the list of values to try.
+        defaults (dict): Value of every key of `SWEEP_KEYS` that is not swept.
+
+    Returns:
+        list: One dict per cell of the cartesian product, with every key of `SWEEP_KEYS`.
+
+    Raises:
+        ValueError: If the grid has an unknown key, or a cell has not one chunk size per topic.
+    """
+    unknown = set(grid) - set(SWEEP_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown sweep parameters: {', '.join(sorted(unknown))}. Available: {', '.join(SWEEP_KEYS)}")
+    keys = list(SWEEP_KEYS)
+    values = [grid.get(key) or [defaults[key]] for key in keys]
+    cells = []
+    for combination in itertools.product(*values):
+        cell = dict(zip(keys, combination))
+        if len(cell["topics"]) != len(cell["topics_chunk_size"]):
+            raise ValueError(f"{len(cell['topics'])} topics but {len(cell['topics_chunk_size'])} chunk sizes in a sweep cell")
+        cells.append(cell)
+    return cells
+
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    if not values:
+        return None
+    position = fraction * (len(values) - 1)
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def run_sweep(grid, controller_factory, max_workers=4, requests_per_minute=None, tokens_per_minute=None,
+              row_timeout=None, metrics=None, defaults=None):
+    """
+    Evaluates every cell of a parameter grid, sharing all the work the cells have in common.
+
+    The evaluation dataset is built and read once. Every cell's Controller shares the process-wide index, and
+    each distinct (topics, chunk sizes, user topic) context is retrieved once before generation starts.
+    The generation requests of all cells then run on one `EvalRunner`: a single bounded pool under a single
+    rate limit. As in `Controller.process_eval`, each cell appends to the `RunLog` of its configuration, so
+    rows already evaluated by an earlier run or sweep of the same configuration are not generated again,
+    and its generated briefs are stored in the evaluation store.
+
+    Args:
+        grid (dict): Some of `SWEEP_KEYS` mapped to the list of values to try.
+        controller_factory (callable): Builds the Controller of a cell from its 'openai_model_name',
+                                       'temperature', 'topics', 'topics_chunk_size' and 'generation_mode'
+                                       keyword arguments.
+        max_workers (int, optional): Maximum number of concurrent requests, over all cells. Default is 4.
+        requests_per_minute (float, optional): Request budget per minute, over all cells. Default is no limit.
+        tokens_per_minute (float, optional): Token budget per minute, over all cells. Default is no limit.
+        row_timeout (float, optional): Time limit per article in seconds, retries included. Default is no limit.
+        metrics (tuple, optional): Names of the metrics in `metrics.registry`. Default is ROUGE, BLEU and METEOR.
+        defaults (dict, optional): Values of the keys that are not swept. Defaults to the settings of `config.py`.
+
+    Returns:
+        pd.DataFrame: One row per cell with its parameters, run id, number of evaluated and failed rows,
+                      aggregated metrics, p50/p95 generation latency and mean prompt and completion tokens.
+    """
+    import pandas as pd
+    from tqdm import tqdm
+    from evaluator import Evaluator
+    from eval_runner import EvalRunner
+    from run_log import RunLog, text_hash
+
+    if defaults is None:
+        import config
+
+        defaults = {
+            "openai_model_name": config.openai_model_name,
+            "temperature": config.temperature,
+            "topics": config.topics,
+            "topics_chunk_size": config.topics_chunk_size,
+            "user_topic": "",
+            "generation_mode": config.generation_mode,
+        }
+    cells = expand_grid(grid, defaults)
+    eval = Evaluator(metrics) if metrics else Evaluator()
+    rows = None
+    contexts = {}
+    for cell in cells:
+        cell["controller"] = controller_factory(
+            openai_model_name=cell["openai_model_name"],
+            temperature=cell["temperature"],
+            topics=cell["topics"],
+            topics_chunk_size=cell["topics_chunk_size"],
+            generation_mode=cell["generation_mode"],
+        )
+        if rows is None:
+            eval.create_eval_dataset(cell["controller"].data_loader)
+            rows = list(eval.iter_eval_dataset())
+            for row in rows:
+                row["article_hash"] = text_hash(row["article"])
+        context_key = json.dumps([cell["topics"], cell["topics_chunk_size"], cell["user_topic"]])
+        if context_key not in contexts:
+            # memoized by the retriever's context cache, where the cells' requests find it again
+            contexts[context_key] = cell["controller"].vector_db.get_context(
+                cell["topics"], cell["topics_chunk_size"], cell["user_topic"]
+            )
+        cell["run_log"] = RunLog(cell["controller"].eval_run_config(cell["user_topic"], eval.scorer.signature()))
+        cell["scores"] = eval.running_scores()
+        cell["latencies"], cell["tokens"], cell["failed"] = [], [], 0
+        completed = set()
+        for record in cell["run_log"].iter_records():
+            completed.add(record["article_hash"])
+            cell["scores"].add(record["scores"])
+            cell["tokens"].append(record.get("tokens", {}))
+            if "latency" in record:
+                cell["latencies"].append(record["latency"])
+        cell["pending"] = [row for row in rows if row["article_hash"] not in completed]
+    print(f"Varredura: {len(cells)} configurações, {len(rows or [])} artigos, {len(contexts)} contextos distintos, "
+          f"{sum(len(cell['pending']) for cell in cells)} briefings para gerar.")
+
+    def work_items():
+        # interleave the cells, so partial results cover every configuration
+        for items in itertools.zip_longest(*[[(cell, row) for row in cell["pending"]] for cell in cells]):
+            yield from (item for item in items if item is not None)
+
+    def generate(item):
+        cell, row = item
+        token_report = {}
+        start = time.perf_counter()
+        generated_brief = cell["controller"].process(
+            user_topic=cell["user_topic"], paper_content=row["article"], token_report=token_report
+        )
+        return generated_brief, token_report, time.perf_counter() - start
+
+    runner = EvalRunner(
+        max_workers=max_workers,
+        requests_per_minute=requests_per_minute,
+        tokens_per_minute=tokens_per_minute,
+        row_timeout=row_timeout,
+        request_level=True
+    )
+    start = time.perf_counter()
+    progress = tqdm(total=sum(len(cell["pending"]) for cell in cells), desc="Varredura")
+    for _, (cell, row), result, error in runner.run_iter(generate, work_items()):
+        progress.update(1)
+        if error is not None:
+            cell["failed"] += 1
+            print(f"Aviso: Falha ao gerar o briefing da linha {row['row']} ({cell['openai_model_name']}): {error}")
+            continue
+        generated_brief, token_report, latency = result
+        row_scores = eval.score_row(generated_brief, row["brief"])
+        cell["run_log"].append({
+            'row': row['row'],
+            'id': row['id'],
+            'article_hash': row['article_hash'],
+            'generated_brief': generated_brief,
+            'scores': row_scores,
+            'tokens': token_report,
+            'latency': latency,
+        })
+        cell["scores"].add(row_scores)
+        cell["latencies"].append(latency)
+        cell["tokens"].append(token_report)
+    progress.close()
+    print(f"Varredura concluída em {time.perf_counter() - start:.1f} s.")
+
+    table = []
+    for cell in cells:
+        run_log = cell["run_log"]
+        records = list(run_log.iter_records())
+        if records:
+            eval.store.write_inference(run_log.config_hash[:16], {
+                record['id']: record['generated_brief'] for record in records if 'id' in record
+            })
+        entry = {
+            'run_id': run_log.config_hash[:16],
+            'openai_model_name': cell["openai_model_name"],
+            'temperature': cell["temperature"],
+            'topics': len(cell["topics"]),
+            'topics_chunk_size': ",".join(str(size) for size in cell["topics_chunk_size"]),
+            'user_topic': cell["user_topic"],
+            'generation_mode': cell["generation_mode"],
+            'rows': len(records),
+            'failed': cell["failed"],
+        }
+        for group in cell["scores"].aggregated().values():
+            entry.update({key: value for key, value in group.items() if isinstance(value, (int, float))})
+        latencies = cell["latencies"]
+        entry['latency_p50'] = _percentile(latencies, 0.5)
+        entry['latency_p95'] = _percentile(latencies, 0.95)
+        tokens = cell["tokens"] or [{}]
+        entry['prompt_tokens'] = sum(report.get('system', 0) + report.get('human', 0) for report in tokens) / len(tokens)
+        entry['completion_tokens'] = sum(report.get('completion', 0) for report in tokens) / len(tokens)
+        table.append(entry)
+    return pd.DataFrame(table)
+
+
+def _csv(values, cast=str):
+    return [cast(value.strip()) for value in values.split(",")]
+
+
+def main(argv=None):
+    import config
+    import pandas as pd
+    from resources import configured_options, get_controller
+
+    parser = argparse.ArgumentParser(description="Avalia uma grade de configurações compartilhando índice, artigos e contextos.")
+    parser.add_argument("--grid", help="arquivo JSON com listas de valores por parâmetro: " + ", ".join(SWEEP_KEYS))
+    parser.add_argument("--models", type=_csv, help="modelos separados por vírgula (openai_model_name)")
+    parser.add_argument("--temperatures", type=lambda values: _csv(values, float), help="temperaturas separadas por vírgula")
+    parser.add_argument("--chunk-sizes", action="append", type=lambda values: _csv(values, int),
+                        help="tamanhos por tópico separados por vírgula; repita a opção para cada configuração")
+    parser.add_argument("--user-topics", action="append", help="tópico do usuário; repita a opção para cada valor")
+    parser.add_argument("--generation-modes", type=_csv, help="modos de geração separados por vírgula: single, sections")
+    parser.add_argument("-w", "--workers", type=int, default=config.eval_max_workers,
+                        help="requisições paralelas, somando todas as configurações")
+    parser.add_argument("-o", "--output", default="sweep_results.csv", help="arquivo CSV da tabela comparativa")
+    parser.add_argument("--fake-model", action="store_true", help="usa o FakeChatModel (sem chamadas à API)")
+    parser.add_argument("--refresh-cache", action="store_true",
+                        help="ignora as respostas em cache e as substitui por novas")
+    args = parser.parse_args(argv)
+
+    grid = {}
+    if args.grid:
+        with open(args.grid, "r", encoding="utf-8") as f:
+            grid = json.load(f)
+    for key, values in (("openai_model_name", args.models), ("temperature", args.temperatures),
+                        ("topics_chunk_size", args.chunk_sizes), ("user_topic", args.user_topics),
+                        ("generation_mode", args.generation_modes)):
+        if values:
+            grid[key] = values
+
+    options = configured_options()
+    # model, temperature, topics and generation mode come from each cell of the grid
+    for key in ("temperature", "generation_mode"):
+        options.pop(key)
+    if args.refresh_cache:
+        options["refresh_cache"] = True
+
+    def controller_factory(openai_model_name, temperature, topics, topics_chunk_size, generation_mode):
+        chat_model = None
+        if args.fake_model:
+            from fake_model import FakeChatModel
+            # a distinct name keeps the fake runs apart from the real ones in the run logs
+            chat_model = FakeChatModel(model_name=f"fake:{openai_model_name}", temperature=temperature)
+        return get_controller(
+            config.directory_path, config.embedding_model, openai_model_name, config.get_openai_api_key(),
+            topics, topics_chunk_size, temperature=temperature, chat_model=chat_model, generation_mode=generation_mode,
+            **options
+        )
+
+    results = run_sweep(
+        grid, controller_factory,
+        max_workers=args.workers,
+        requests_per_minute=config.eval_requests_per_minute,
+        tokens_per_minute=config.eval_tokens_per_minute,
+        row_timeout=config.eval_row_timeout,
+        metrics=config.eval_metrics
+    )
+    results.to_csv(args.output, index=False)
+    with pd.option_context('display.max_columns', None, 'display.width', 200):
+        print(results)
+    print(f"Tabela comparativa salva em: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+import time
+import unittest
+from eval_runner import EvalRunner, model_request, retried_by_runner
+from fake_model import FakeAPIError, FakeChatModel
+
+
+class EvalRunnerTest(unittest.TestCase):
+    """
+    Exercises the EvalRunner offline with the FakeChatModel: ordering, throttling, retries and row timeouts.
+    """
+
+    def test_results_keep_input_order_under_concurrency(self):
+        model = FakeChatModel(latency=0.05)
+
+        def generate(item):
+            # the first items finish last
+            time.sleep(0.01 * (8 - item))
+            return item, model.talk_to_model("system", f"paper {item}")
+
+        runner = EvalRunner(max_workers=4)
+        results = runner.run(generate, range(8))
+
+        self.assertEqual([item for item, _ in results], list(range(8)))
+        self.assertEqual(results[3][1], FakeChatModel().talk_to_model("system", "paper 3"))
+        self.assertEqual(model.calls, 8)
+        self.assertEqual(model.max_concurrency, 4)
+        self.assertEqual(runner.errors, {})
+
+    def test_requests_per_minute_throttle_rows(self):
+        runner = EvalRunner(max_workers=4, requests_per_minute=240)
+        for _ in range(240):
+            runner.rate_limiter.acquire()  # empties the bucket: one request every 0.25 s from now on
+
+        start = time.monotonic()
+        runner.run(lambda item: item, range(4))
+        elapsed = time.monotonic() - start
+
+        self.assertGreaterEqual(elapsed, 0.9)
+        self.assertLess(elapsed, 2.0)
+
+    def test_tokens_per_minute_throttle_each_request_of_a_row(self):
+        model = FakeChatModel()
+        runner = EvalRunner(max_workers=4, tokens_per_minute=12000, request_level=True)
+        runner.rate_limiter.acquire(12000)  # empties the bucket: 50 tokens every 0.25 s from now on
+
+        def generate(item):
+            return [model_request(model.talk_to_model, "system", f"part {part}", tokens=50) for part in range(2)]
+
+        start = time.monotonic()
+        results = runner.run(generate, range(2))
+        elapsed = time.monotonic() - start
+
+        self.assertEqual(model.calls, 4)
+        self.assertTrue(all(len(parts) == 2 for parts in results))
+        self.assertGreaterEqual(elapsed, 0.9)
+        self.assertLess(elapsed, 2.0)
+
+    def test_retry_honors_retry_after(self):
+        model = FakeChatModel(errors=[(429, 0.3)])
+        # without the header, the first backoff would take at least 5 s
+        runner = EvalRunner(max_workers=1, base_delay=10.0)
+
+        start = time.monotonic()
+        results = runner.run(lambda item: model.talk_to_model("system", item), ["paper"])
+        elapsed = time.monotonic() - start
+
+        self.assertEqual(results, [FakeChatModel().talk_to_model("system", "paper")])
+        self.assertEqual(model.calls, 2)
+        self.assertGreaterEqual(elapsed, 0.3)
+        self.assertLess(elapsed, 2.0)
+
+    def test_server_errors_are_retried_and_client_errors_are_not(self):
+        model = FakeChatModel(errors=[503, 500, 400])
+        runner = EvalRunner(max_workers=1, base_delay=0.01, request_level=True)
+
+        results = runner.run(lambda item: model_request(model.talk_to_model, "system", item), ["paper"])
+
+        self.assertEqual(results, [None])
+        self.assertIsInstance(runner.errors[0], FakeAPIError)
+        self.assertEqual(runner.errors[0].status_code, 400)
+        self.assertEqual(model.calls, 3)
+
+    def test_row_timeout_stops_the_retries(self):
+        model = FakeChatModel(errors=[503] * 100)
+        runner = EvalRunner(max_workers=1, max_retries=100, base_delay=0.1, max_delay=0.1, row_timeout=0.5)
+
+        start = time.monotonic()
+        results = runner.run(lambda item: model.talk_to_model("system", item), ["paper"])
+        elapsed = time.monotonic() - start
+
+        self.assertEqual(results, [None])
+        self.assertIsInstance(runner.errors[0], TimeoutError)
+        self.assertLess(elapsed, 1.0)
+        self.assertLess(model.calls, 100)
+
+    def test_retry_after_beyond_the_deadline_times_out_at_once(self):
+        model = FakeChatModel(errors=[(429, 30)])
+        runner = EvalRunner(max_workers=1, row_timeout=1.0)
+
+        start = time.monotonic()
+        runner.run(lambda item: model.talk_to_model("system", item), ["paper"])
+
+        self.assertIsInstance(runner.errors[0], TimeoutError)
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertEqual(model.calls, 1)
+
+    def test_model_clients_leave_retries_to_the_runner(self):
+        seen = []
+
+        def generate(item):
+            seen.append(("row", retried_by_runner()))
+            return model_request(lambda: seen.append(("request", retried_by_runner())))
+
+        EvalRunner(max_workers=1, request_level=True).run(generate, ["paper"])
+        EvalRunner(max_workers=1).run(lambda item: seen.append(("whole row", retried_by_runner())), ["paper"])
+
+        self.assertEqual(seen, [("row", False), ("request", True), ("whole row", True)])
+        self.assertFalse(retried_by_runner())
+
+
+if __name__ == "__main__":
+    unittest.main()
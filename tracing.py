@@ -0,0 +1,397 @@
+import os
+import json
+import time
+import uuid
+import contextlib
+import threading
+import contextvars
+from collections import deque
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class _NullSpan:
+    """
+    Span returned while tracing is disabled: entering, annotating and leaving it does nothing.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def set(self, **attributes):
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Span:
+    """
+    Timed stage of the pipeline, e.g. "parse_pdf", "retrieve", "build_prompt", "llm" or "score".
+
+    Spans opened while another span is active in the same thread become its children and share its trace id.
+
+    Attributes:
+        name (str): Name of the stage.
+        trace_id (str): Id shared by every span of the same request.
+        span_id (str): Id of the span.
+        parent_id (str): Id of the enclosing span, or None for the root of a trace.
+        start (float): Wall-clock start time, in seconds since the epoch.
+        duration (float): Duration in seconds, set when the span ends.
+        attributes (dict): Annotations such as 'prompt_tokens', 'completion_tokens' or 'cache_hit'.
+    """
+
+    __slots__ = ("tracer", "name", "trace_id", "span_id", "parent_id", "start", "duration", "attributes",
+                 "_started", "_token", "_parent")
+
+    def __init__(self, tracer, name, attributes):
+        parent = _current_span.get()
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = parent.trace_id if parent is not None else uuid.uuid4().hex[:16]
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent is not None else None
+        self.attributes = attributes
+        self.duration = None
+        self._token = None
+        self._parent = parent
+
+    def __enter__(self):
+        self.start = time.time()
+        self._started = time.perf_counter()
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.duration = time.perf_counter() - self._started
+        if exc_type is not None:
+            self.attributes["error"] = exc_type.__name__
+        try:
+            _current_span.reset(self._token)
+        except ValueError:
+            # a generator resumed in another context left the span: restore its parent there
+            _current_span.set(self._parent)
+        self.tracer._finish(self)
+        return False
+
+    def set(self, **attributes):
+        """
+        Adds annotations to the span.
+        """
+        self.attributes.update(attributes)
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.start,
+            "duration": self.duration,
+            "attributes": self.attributes,
+        }
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    position = fraction * (len(sorted_values) - 1)
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+class StageStats:
+    """
+    Per-stage statistics of finished spans: latency percentiles and token and cache-hit totals.
+
+    Attributes:
+        max_samples (int): Latest durations kept per stage for the percentiles.
+    """
+
+    TOKEN_ATTRIBUTES = ("prompt_tokens", "completion_tokens")
+
+    def __init__(self, max_samples=10000):
+        self.max_samples = max_samples
+        self._lock = threading.Lock()
+        self._stages = {}
+
+    def add(self, span):
+        """
+        Records a finished span.
+        """
+        with self._lock:
+            stage = self._stages.get(span.name)
+            if stage is None:
+                stage = self._stages[span.name] = {
+                    "durations": deque(maxlen=self.max_samples), "count": 0, "seconds": 0.0, "cache_hits": 0,
+                    **{attribute: 0 for attribute in self.TOKEN_ATTRIBUTES},
+                }
+            stage["durations"].append(span.duration)
+            stage["count"] += 1
+            stage["seconds"] += span.duration
+            stage["cache_hits"] += bool(span.attributes.get("cache_hit"))
+            for attribute in self.TOKEN_ATTRIBUTES:
+                stage[attribute] += span.attributes.get(attribute) or 0
+
+    def reset(self):
+        """
+        Forgets the statistics.
+        """
+        with self._lock:
+            self._stages = {}
+
+    def stage_stats(self):
+        """
+        Returns:
+            dict: Stage name mapped to its 'count', 'p50' and 'p95' latency in seconds, total 'seconds',
+                  'cache_hits', 'prompt_tokens' and 'completion_tokens'.
+        """
+        with self._lock:
+            stages = {name: dict(stage, durations=sorted(stage["durations"])) for name, stage in self._stages.items()}
+        return {
+            name: {
+                "count": stage["count"],
+                "p50": _percentile(stage["durations"], 0.5),
+                "p95": _percentile(stage["durations"], 0.95),
+                "seconds": stage["seconds"],
+                "cache_hits": stage["cache_hits"],
+                **{attribute: stage[attribute] for attribute in self.TOKEN_ATTRIBUTES},
+            }
+            for name, stage in stages.items()
+        }
+
+    def summary(self):
+        """
+        Formats the per-stage statistics as a table, slowest stage first.
+
+        Returns:
+            str: Human readable latency breakdown.
+        """
+        stats = sorted(self.stage_stats().items(), key=lambda item: item[1]["seconds"], reverse=True)
+        lines = [
+            "--- LATÊNCIA POR ETAPA ---",
+            f"{'etapa':<22} {'n':>6} {'p50 ms':>10} {'p95 ms':>10} {'total s':>9} {'cache':>6} {'tok. prompt':>12} {'tok. resp.':>11}",
+        ]
+        for name, stage in stats:
+            lines.append(
+                f"{name:<22} {stage['count']:>6} {stage['p50'] * 1000:>10.1f} {stage['p95'] * 1000:>10.1f} "
+                f"{stage['seconds']:>9.1f} {stage['cache_hits']:>6} {stage['prompt_tokens']:>12} "
+                f"{stage['completion_tokens']:>11}"
+            )
+        return "\n".join(lines)
+
+
+class Tracer:
+    """
+    Records how long each stage of the briefing pipeline takes, with its token counts and cache hits.
+
+    Finished spans are appended to a JSONL file, if one is configured, and summarized per stage in memory:
+    latency percentiles and token and cache-hit totals, which are also exported in the Prometheus text format.
+    While disabled, `span` returns a shared no-op span, so instrumented code pays a single attribute check.
+
+    Attributes:
+        enabled (bool): Whether spans are recorded: configured, or forced by an active `collect` block.
+        jsonl_path (str): File the finished spans are appended to, or None to keep them in memory only.
+        max_samples (int): Latest durations kept per stage for the percentiles.
+    """
+
+    TOKEN_ATTRIBUTES = StageStats.TOKEN_ATTRIBUTES
+
+    def __init__(self, enabled=False, jsonl_path=None, max_samples=10000):
+        self.jsonl_path = jsonl_path
+        self.max_samples = max_samples
+        self._enabled = enabled
+        self._forced = 0
+        self._lock = threading.Lock()
+        self._jsonl_file = None
+        self._stats = StageStats(max_samples)
+        self._collectors = []
+
+    @property
+    def enabled(self):
+        return self._enabled or self._forced > 0
+
+    def configure(self, enabled=None, jsonl_path=None):
+        """
+        Changes the settings of the tracer; arguments left as None are kept.
+
+        Args:
+            enabled (bool, optional): Whether spans are recorded.
+            jsonl_path (str, optional): File the finished spans are appended to.
+        """
+        with self._lock:
+            if enabled is not None:
+                self._enabled = enabled
+            if jsonl_path is not None and jsonl_path != self.jsonl_path:
+                if self._jsonl_file is not None:
+                    self._jsonl_file.close()
+                    self._jsonl_file = None
+                self.jsonl_path = jsonl_path
+
+    def span(self, name, **attributes):
+        """
+        Opens a span, to be used as a context manager: `with tracer.span("retrieve") as span: ...`.
+
+        Args:
+            name (str): Name of the stage.
+            **attributes: Initial annotations of the span.
+
+        Returns:
+            Span: The new span, or `NULL_SPAN` while tracing is disabled.
+        """
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name, attributes)
+
+    def _finish(self, span):
+        self._stats.add(span)
+        with self._lock:
+            for collector in self._collectors:
+                collector.add(span)
+            if self.jsonl_path is not None:
+                if self._jsonl_file is None:
+                    os.makedirs(os.path.dirname(self.jsonl_path) or ".", exist_ok=True)
+                    self._jsonl_file = open(self.jsonl_path, "a", encoding="utf-8")
+                self._jsonl_file.write(json.dumps(span.to_dict(), ensure_ascii=False, default=str) + "\n")
+                self._jsonl_file.flush()
+
+    @contextlib.contextmanager
+    def collect(self, enabled=True):
+        """
+        Records the statistics of the spans finished while the block runs in a separate `StageStats`, e.g. for
+        the summary of one evaluation run. The statistics of the tracer itself are kept and keep growing.
+
+        Args:
+            enabled (bool, optional): Enable tracing while the block runs, whatever the configured setting, which
+                                      is in effect again once the block ends, even on error. Default is True.
+
+        Yields:
+            StageStats: Statistics of the spans of the block.
+        """
+        collector = StageStats(self.max_samples)
+        with self._lock:
+            self._forced += bool(enabled)
+            self._collectors.append(collector)
+        try:
+            yield collector
+        finally:
+            with self._lock:
+                self._collectors.remove(collector)
+                self._forced -= bool(enabled)
+
+    def reset(self):
+        """
+        Forgets the per-stage statistics.
+        """
+        self._stats.reset()
+
+    def stage_stats(self):
+        """
+        Returns:
+            dict: Stage name mapped to its 'count', 'p50' and 'p95' latency in seconds, total 'seconds',
+                  'cache_hits', 'prompt_tokens' and 'completion_tokens'.
+        """
+        return self._stats.stage_stats()
+
+    def summary(self):
+        """
+        Formats the per-stage statistics as a table, slowest stage first.
+
+        Returns:
+            str: Human readable latency breakdown.
+        """
+        return self._stats.summary()
+
+    def prometheus_text(self):
+        """
+        Exports the per-stage statistics in the Prometheus text exposition format.
+
+        Returns:
+            str: Latency summaries, cache-hit counters and token counters labeled by stage.
+        """
+        stats = self.stage_stats()
+        lines = [
+            "# HELP briefing_stage_seconds Latency of the stages of the briefing pipeline.",
+            "# TYPE briefing_stage_seconds summary",
+        ]
+        for name, stage in stats.items():
+            lines.append(f'briefing_stage_seconds{{stage="{name}",quantile="0.5"}} {stage["p50"]:.6f}')
+            lines.append(f'briefing_stage_seconds{{stage="{name}",quantile="0.95"}} {stage["p95"]:.6f}')
+            lines.append(f'briefing_stage_seconds_sum{{stage="{name}"}} {stage["seconds"]:.6f}')
+            lines.append(f'briefing_stage_seconds_count{{stage="{name}"}} {stage["count"]}')
+        lines += [
+            "# HELP briefing_stage_cache_hits_total Stage executions answered from a cache.",
+            "# TYPE briefing_stage_cache_hits_total counter",
+        ]
+        lines += [f'briefing_stage_cache_hits_total{{stage="{name}"}} {stage["cache_hits"]}' for name, stage in stats.items()]
+        lines += [
+            "# HELP briefing_tokens_total Prompt and completion tokens by stage.",
+            "# TYPE briefing_tokens_total counter",
+        ]
+        for name, stage in stats.items():
+            for kind in ("prompt", "completion"):
+                lines.append(f'briefing_tokens_total{{stage="{name}",kind="{kind}"}} {stage[kind + "_tokens"]}')
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """
+        Writes `prometheus_text` to `path` atomically, e.g. for the textfile collector of the node exporter.
+        """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp_path, path)
+
+
+tracer = Tracer()
+
+
+def current_span():
+    """
+    Returns:
+        Span: The innermost active span of the calling context, or `NULL_SPAN`, so callees can annotate the
+              span of their caller (e.g. with a cache hit) without knowing whether tracing is enabled.
+    """
+    return _current_span.get() or NULL_SPAN
+
+
+def serve_prometheus(port, host="0.0.0.0"):
+    """
+    Serves the metrics of `tracer` at http://<host>:<port>/metrics from a daemon thread, once per process.
+
+    Args:
+        port (int): Port of the endpoint.
+        host (str, optional): Interface to listen on. Default is every interface.
+
+    Returns:
+        ThreadingHTTPServer: The running server.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from resources import get_resource
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = tracer.prometheus_text().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    def start():
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=server.serve_forever, name="prometheus-metrics", daemon=True).start()
+        return server
+
+    return get_resource(("PrometheusServer", host, port), start)
@@ -0,0 +1,384 @@
+import os
+import json
+import uuid
+import threading
+from resources import startup_report
+
+VECTOR_STORES = ("chroma", "numpy")
+
+
+class VectorStore:
+    """
+    Interface of the vector stores used by `IndexManager` and `Retriever`.
+
+    A store keeps one vector per page, embedded with the store's embedding function, along with the page text
+    and its metadata. Every store ranks by squared L2 distance, the metric of the Chroma collections.
+    """
+
+    def add(self, ids, texts, metadatas):
+        """
+        Embeds and stores pages, replacing the pages that already have the same id.
+
+        Args:
+            ids (list): Unique id of each page.
+            texts (list): Text of each page.
+            metadatas (list): Metadata dict of each page.
+        """
+        raise NotImplementedError
+
+    def delete(self, ids):
+        """
+        Removes the pages with the given ids; unknown ids are ignored.
+        """
+        raise NotImplementedError
+
+    def reset(self):
+        """
+        Removes every page.
+        """
+        raise NotImplementedError
+
+    def query(self, query_embeddings, k, filters=None, include_embeddings=False):
+        """
+        Finds the `k` nearest pages of each query embedding.
+
+        Args:
+            query_embeddings (list): One embedding per query.
+            k (int): Number of pages per query.
+            filters (list, optional): One metadata filter per query, e.g. {"section": "Main Findings"}, or None
+                                      to search every page. Default is no filter.
+            include_embeddings (bool, optional): Also return the stored embedding of each hit. Default is False.
+
+        Returns:
+            list: One list of hits per query, nearest first. A hit is a dict with the page 'text', its
+                  'metadata' and, if requested, its 'embedding'.
+        """
+        raise NotImplementedError
+
+    def get_embeddings(self, ids):
+        """
+        Reads the stored embeddings of pages by id.
+
+        Args:
+            ids (list): Ids of the pages.
+
+        Returns:
+            list: The embedding of each page in the order of `ids`, or None for an unknown id.
+        """
+        raise NotImplementedError
+
+    def count(self):
+        raise NotImplementedError
+
+    def flush(self):
+        """
+        Makes the changes durable; called once at the end of an index sync.
+        """
+
+
+class ChromaStore(VectorStore):
+    """
+    Vector store backed by a persistent Chroma collection.
+
+    Attributes:
+        persist_directory (str): Directory of the Chroma database.
+        collection_name (str): Name of the Chroma collection.
+    """
+
+    def __init__(self, persist_directory, embedding, collection_name="briefings"):
+        self.persist_directory = persist_directory
+        self.embedding = embedding
+        self.collection_name = collection_name
+        self._chroma = self._open()
+
+    def _open(self):
+        with startup_report.timed("import:chromadb"):
+            from langchain_community.vectorstores import Chroma
+        return Chroma(
+            collection_name=self.collection_name,
+            embedding_function=self.embedding,
+            persist_directory=self.persist_directory,
+        )
+
+    def add(self, ids, texts, metadatas):
+        self._chroma.add_texts(texts=texts, metadatas=metadatas, ids=ids)
+
+    def delete(self, ids):
+        if ids:
+            self._chroma.delete(ids=list(ids))
+
+    def reset(self):
+        self._chroma.delete_collection()
+        self._chroma = self._open()
+
+    def query(self, query_embeddings, k, filters=None, include_embeddings=False):
+        filters = filters or [None] * len(query_embeddings)
+        include = ["documents", "metadatas"] + (["embeddings"] if include_embeddings else [])
+        hits = [None] * len(query_embeddings)
+        # Chroma takes one filter per call: queries sharing a filter are searched together
+        groups = {}
+        for position, where in enumerate(filters):
+            groups.setdefault(json.dumps(where, sort_keys=True), []).append(position)
+        for key, positions in groups.items():
+            results = self._chroma._collection.query(
+                query_embeddings=[query_embeddings[position] for position in positions],
+                n_results=k,
+                where=json.loads(key),
+                include=include
+            )
+            for row, position in enumerate(positions):
+                embeddings = results["embeddings"][row] if include_embeddings else [None] * len(results["documents"][row])
+                hits[position] = [
+                    {"text": text, "metadata": metadata, "embedding": embedding}
+                    for text, metadata, embedding in zip(results["documents"][row], results["metadatas"][row], embeddings)
+                ]
+        return hits
+
+    def get_embeddings(self, ids):
+        if not ids:
+            return []
+        results = self._chroma._collection.get(ids=list(ids), include=["embeddings"])
+        by_id = dict(zip(results["ids"], results["embeddings"]))
+        return [by_id.get(page_id) for page_id in ids]
+
+    def count(self):
+        return self._chroma._collection.count()
+
+
+class NumpyStore(VectorStore):
+    """
+    In-process vector store: a float32 matrix saved as a `.npy` file and a JSON sidecar with the page ids,
+    texts and metadata. Queries are exact: all distances come from a single matrix product.
+
+    The matrix is opened memory-mapped and read-only, so several processes serving the same index share it
+    through the page cache. Changes are written to a new matrix file and published by atomically replacing
+    the sidecar, which names the current matrix; readers that still map the previous file keep a consistent
+    view and pick up the new one on their next query. Superseded matrices are deleted after each flush, or on
+    the next open or flush when a reader still maps them (Windows cannot delete a mapped file).
+
+    Attributes:
+        directory (str): Directory of the index files.
+        name (str): Base name of the sidecar, "<name>.json".
+    """
+
+    def __init__(self, directory, embedding, name="briefings"):
+        self.directory = directory
+        self.embedding = embedding
+        self.name = name
+        self._lock = threading.Lock()
+        self._sidecar_mtime = None
+        self._matrix = None
+        self._square_norms = None
+        self._ids, self._texts, self._metadatas = [], [], []
+        self._dirty = False
+        self._masks = {}
+        self._load()
+        self._remove_stale_matrices()
+
+    @property
+    def sidecar_path(self):
+        return os.path.join(self.directory, f"{self.name}.json")
+
+    def _load(self):
+        import numpy as np
+
+        if not os.path.isfile(self.sidecar_path):
+            self._sidecar_mtime = None
+            self._matrix = None
+            self._ids, self._texts, self._metadatas = [], [], []
+            self._square_norms = None
+            return
+        for attempt in range(3):
+            mtime = os.stat(self.sidecar_path).st_mtime_ns
+            with open(self.sidecar_path, "r", encoding="utf-8") as f:
+                sidecar = json.load(f)
+            try:
+                matrix = np.load(os.path.join(self.directory, sidecar["matrix"]), mmap_mode="r") if sidecar["ids"] else None
+                break
+            except FileNotFoundError:
+                # a writer replaced the index between reading the sidecar and opening its matrix
+                if attempt == 2:
+                    raise
+        self._ids, self._texts, self._metadatas = sidecar["ids"], sidecar["documents"], sidecar["metadatas"]
+        self._masks = {}
+        self._matrix = matrix
+        self._square_norms = None if matrix is None else np.einsum("ij,ij->i", matrix, matrix)
+        self._sidecar_mtime = mtime
+
+    def _remove_stale_matrices(self):
+        """
+        Deletes the matrix files that the sidecar no longer names. A file still mapped by a reader cannot be
+        removed on Windows; it is left for the next open or flush. Files newer than the sidecar are kept too:
+        they may belong to a writer about to publish them.
+        """
+        if not os.path.isfile(self.sidecar_path):
+            return
+        try:
+            with open(self.sidecar_path, "r", encoding="utf-8") as f:
+                current = json.load(f).get("matrix")
+            published = os.stat(self.sidecar_path).st_mtime_ns
+            names = os.listdir(self.directory)
+        except (OSError, ValueError):
+            return
+        for name in names:
+            if not (name.startswith(f"{self.name}-") and name.endswith(".npy")) or name == current:
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                if os.stat(path).st_mtime_ns < published:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def _refresh(self):
+        # reload when another process published a new version of the index
+        if self._dirty:
+            return
+        mtime = os.stat(self.sidecar_path).st_mtime_ns if os.path.isfile(self.sidecar_path) else None
+        if mtime != self._sidecar_mtime:
+            self._load()
+
+    def _writable(self):
+        import numpy as np
+
+        # the mapping is read-only: copy it before the first change
+        if not self._dirty:
+            self._matrix = None if self._matrix is None else np.array(self._matrix, dtype=np.float32)
+            self._dirty = True
+
+    def add(self, ids, texts, metadatas):
+        import numpy as np
+
+        if not ids:
+            return
+        vectors = np.asarray(self.embedding.embed_documents(list(texts)), dtype=np.float32)
+        with self._lock:
+            self._delete(set(ids))
+            self._matrix = vectors if self._matrix is None else np.vstack([self._matrix, vectors])
+            self._masks = {}
+            self._ids.extend(ids)
+            self._texts.extend(texts)
+            self._metadatas.extend(metadatas)
+            self._square_norms = np.einsum("ij,ij->i", self._matrix, self._matrix)
+
+    def _delete(self, ids):
+        import numpy as np
+
+        self._writable()
+        self._masks = {}
+        keep = [i for i, page_id in enumerate(self._ids) if page_id not in ids]
+        if len(keep) == len(self._ids):
+            return
+        self._ids = [self._ids[i] for i in keep]
+        self._texts = [self._texts[i] for i in keep]
+        self._metadatas = [self._metadatas[i] for i in keep]
+        self._matrix = self._matrix[keep] if keep else None
+        self._square_norms = None if self._matrix is None else np.einsum("ij,ij->i", self._matrix, self._matrix)
+
+    def delete(self, ids):
+        if ids:
+            with self._lock:
+                self._delete(set(ids))
+
+    def reset(self):
+        with self._lock:
+            self._writable()
+            self._matrix, self._square_norms = None, None
+            self._ids, self._texts, self._metadatas = [], [], []
+            self._masks = {}
+
+    def _mask(self, where):
+        import numpy as np
+
+        # rows allowed by a metadata filter, cached until the index changes
+        key = json.dumps(where, sort_keys=True)
+        if key not in self._masks:
+            self._masks[key] = np.array([
+                all(metadata.get(field) == value for field, value in where.items()) for metadata in self._metadatas
+            ], dtype=bool)
+        return self._masks[key]
+
+    def query(self, query_embeddings, k, filters=None, include_embeddings=False):
+        import numpy as np
+
+        with self._lock:
+            self._refresh()
+            matrix, square_norms = self._matrix, self._square_norms
+            texts, metadatas = self._texts, self._metadatas
+            masks = [None if not where else self._mask(where) for where in (filters or [None] * len(query_embeddings))]
+        if matrix is None:
+            return [[] for _ in query_embeddings]
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        # squared L2 distance without the query norm, which does not change the ranking of a query
+        distances = square_norms[None, :] - 2 * (queries @ matrix.T)
+        for row, mask in enumerate(masks):
+            if mask is not None:
+                distances[row, ~mask] = np.inf
+        k = min(k, matrix.shape[0])
+        top = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        order = np.take_along_axis(distances, top, axis=1).argsort(axis=1, kind="stable")
+        top = np.take_along_axis(top, order, axis=1)
+        return [
+            [
+                {"text": texts[i], "metadata": metadatas[i], "embedding": matrix[i] if include_embeddings else None}
+                for i in row if np.isfinite(distances[query, i])
+            ]
+            for query, row in enumerate(top)
+        ]
+
+    def get_embeddings(self, ids):
+        with self._lock:
+            self._refresh()
+            matrix, positions = self._matrix, {page_id: i for i, page_id in enumerate(self._ids)}
+        return [matrix[positions[page_id]] if page_id in positions else None for page_id in ids]
+
+    def count(self):
+        with self._lock:
+            self._refresh()
+            return len(self._ids)
+
+    def flush(self):
+        import numpy as np
+
+        with self._lock:
+            if not self._dirty:
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            matrix_name = f"{self.name}-{uuid.uuid4().hex[:12]}.npy"
+            matrix = self._matrix if self._matrix is not None else np.zeros((0, 0), dtype=np.float32)
+            np.save(os.path.join(self.directory, matrix_name), matrix)
+            tmp_path = self.sidecar_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({
+                    "matrix": matrix_name,
+                    "ids": self._ids,
+                    "documents": self._texts,
+                    "metadatas": self._metadatas,
+                }, f)
+            os.replace(tmp_path, self.sidecar_path)
+            self._dirty = False
+            self._load()
+            self._remove_stale_matrices()
+
+
+def open_vector_store(kind, persist_directory, embedding, collection_name="briefings"):
+    """
+    Opens the vector store selected by configuration.
+
+    Args:
+        kind (str): "chroma" or "numpy".
+        persist_directory (str): Directory of the persisted index.
+        embedding: Embedding function of the store.
+        collection_name (str, optional): Name of the collection. Default is "briefings".
+
+    Returns:
+        VectorStore: The opened store.
+
+    Raises:
+        ValueError: If `kind` is not one of `VECTOR_STORES`.
+    """
+    if kind == "chroma":
+        return ChromaStore(persist_directory, embedding, collection_name)
+    if kind == "numpy":
+        return NumpyStore(persist_directory, embedding, collection_name)
+    raise ValueError(f"Unknown vector store '{kind}'. Available: {', '.join(VECTOR_STORES)}")
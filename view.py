@@ -1,7 +1,6 @@
 import streamlit as st
-import matplotlib.pyplot as plt
-import seaborn as sns
 import os
+import uuid
 
 class View:
     """
@@ -10,33 +9,60 @@ class View:
     Allows uploading of PDF files, selection of processable files, input of an optional category,
     and display of the results generated as evidence briefings.
 
+    The briefings are generated in the background by a `JobQueue` shared by every session, so several files
+    can be queued at once and the page stays responsive; the jobs of a browser are kept in the job table and
+    found again after a reload through the "client" query parameter.
+
     Attributes:
         controller: Instance of the controller that manages file processing and communication
                     with the other system components.
+        job_queue (JobQueue): Background queue that generates the briefings.
     """
 
-    def __init__(self, controller) -> None:
+    STATUS_LABELS = {
+        "queued": "Na fila",
+        "running": "Gerando",
+        "done": "Concluído",
+        "failed": "Falhou",
+    }
+
+    def __init__(self, controller, job_queue) -> None:
         """
         Initializes the View class with the controller required to process the files.
 
         Args:
             controller: Instance of a controller object that handles file processing
                     and manages interactions between system modules.
+            job_queue (JobQueue): Background queue that generates the briefings.
         """
 
         self.controller = controller
+        self.job_queue = job_queue
         st.set_page_config(layout="wide", page_title="Gerador de Evidence Briefings")
 
+    def client_id(self):
+        """
+        Identifies the browser across reloads with the "client" query parameter, created on the first visit.
+
+        Returns:
+            str: Id of the client, used as owner of its jobs.
+        """
+        client = st.query_params.get("client")
+        if not client:
+            client = st.query_params["client"] = uuid.uuid4().hex
+        return client
+
     def run(self):
         """
         Renders the user interface using Streamlit.
 
         Features:
-            - Displays an interface with two columns: file management and result display.
+            - Displays an interface with two columns: file management and job display.
             - Allows uploading of PDF files and saves them locally.
-            - Lists available PDF files for selection.
+            - Lists available PDF files for selection; several can be queued at once.
             - Allows optional category input for the article.
-            - Processes the selected file upon button click and displays the result.
+            - Queues the selected files upon button click, without waiting for the briefings.
+            - Shows the progress of the queued jobs and the finished briefings, refreshed every few seconds.
             - Shows a warning message if no files are available.
 
         Returns:
@@ -51,6 +77,7 @@ class View:
             unsafe_allow_html=True,
         )
         st.markdown("<div style='margin-top: 30px;'></div>", unsafe_allow_html=True)
+        client = self.client_id()
 
         # creating two collumns
         _, col1, _, col2, _ = st.columns([0.2, 1.5, 0.5, 2, 0.2])
@@ -68,55 +95,93 @@ class View:
             st.markdown("<div style='margin-top: 15px;'></div>", unsafe_allow_html=True)
 
             # file upload
-            uploaded_file = st.file_uploader("Upload do arquivo", type="pdf")
-            if uploaded_file is not None:
+            uploaded_files = st.file_uploader("Upload dos arquivos", type="pdf", accept_multiple_files=True)
+            for uploaded_file in uploaded_files or []:
                 with open(f"./files/{uploaded_file.name}", "wb") as f:
                     f.write(uploaded_file.getbuffer())
                 st.success(f"Arquivo {uploaded_file.name} salvo com sucesso!")
 
             # list available files
             path = "./files"
-            pdf_files = [f for f in os.listdir(path) if f.endswith(".pdf")]
+            pdf_files = sorted(f for f in os.listdir(path) if f.endswith(".pdf"))
             st.markdown("<div style='margin-top: 15px;'></div>", unsafe_allow_html=True)
             if pdf_files:
-                st.subheader("Selecione um arquivo para processar")
+                st.subheader("Selecione os arquivos para processar")
                 st.markdown("<div style='margin-top: 15px;'></div>", unsafe_allow_html=True)
-                selected_file = st.selectbox("Arquivos disponíveis:", pdf_files)
+                selected_files = st.multiselect("Arquivos disponíveis:", pdf_files)
 
                 # optional category input
                 st.markdown("<div style='margin-top: 20px;'></div>", unsafe_allow_html=True)
                 article_category = st.text_input("Categoria do Artigo (opcional):")
 
-                # process file button
-                if st.button("Processar arquivo selecionado"):
-                    file_path = os.path.join(path, selected_file)
-                    with st.spinner(f"Processando {selected_file}..."):
-                        result = self.controller.process(file_path, article_category)
-                    st.session_state["last_result"] = result
-                    st.success(f"Arquivo {selected_file} processado com sucesso!")
+                # queue button: the briefings are generated in the background and listed in the right column
+                if st.button("Adicionar à fila", disabled=not selected_files):
+                    for selected_file in selected_files:
+                        self.job_queue.submit(client, os.path.join(path, selected_file), article_category)
+                    st.success(f"{len(selected_files)} arquivo(s) adicionado(s) à fila.")
             else:
                 st.warning("Nenhum arquivo PDF encontrado na pasta 'files'.")
 
-        # right collumn : result display
+        # right collumn : job display
         with col2:
             st.markdown(
                 """
                 <h2 style='text-align: center;'>
-                    Briefing Gerado
+                    Briefings Gerados
                 </h2>
                 """,
                 unsafe_allow_html=True,
             )
             st.markdown("<div style='margin-top: 15px;'></div>", unsafe_allow_html=True)
-            if "last_result" in st.session_state and st.session_state["last_result"]:
-                st.text_area("Resultado:", value=st.session_state["last_result"], height=500)
-            else:
-                st.info("Nenhum resultado disponível.")
+            self.show_jobs(client)
+
+    @st.fragment(run_every=2)
+    def show_jobs(self, client):
+        """
+        Lists the jobs of `client`, newest first; only this fragment is re-run to refresh their progress.
+
+        Args:
+            client (str): Id of the client whose jobs are shown.
+        """
+        jobs = self.job_queue.store.list(client)
+        if not jobs:
+            st.info("Nenhum resultado disponível.")
+            return
+        for job in jobs:
+            name = os.path.basename(job["file_path"])
+            label = self.STATUS_LABELS.get(job["status"], job["status"])
+            with st.expander(f"{name} · {label}", expanded=job["status"] in ("running", "done")):
+                if job["user_topic"]:
+                    st.caption(f"Categoria: {job['user_topic']}")
+                if job["status"] == "queued":
+                    st.write("Aguardando um gerador livre...")
+                elif job["status"] == "running":
+                    st.markdown(job["partial"] or "Recuperando o contexto...")
+                elif job["status"] == "failed":
+                    st.error(f"Falha ao gerar o briefing: {job['error']}")
+                else:
+                    st.text_area("Resultado:", value=job["result"], height=500, key=f"result-{job['id']}")
+                    st.download_button(
+                        "Baixar briefing", job["result"], file_name=os.path.splitext(name)[0] + ".md",
+                        key=f"download-{job['id']}"
+                    )
+                    stats = job["stats"]
+                    if stats.get("time_to_first_token") is not None:
+                        st.caption(
+                            f"Primeiro token em {stats['time_to_first_token']:.2f}s · "
+                            f"{stats['tokens_per_second']:.1f} tokens/s · total {stats['total_time']:.1f}s"
+                        )
+                if job["status"] in ("done", "failed") and st.button("Remover", key=f"remove-{job['id']}"):
+                    self.job_queue.store.delete(job["id"])
+                    st.rerun(scope="fragment")
 
     def plot_aggregated_scores(aggregated_scores, output_path="aggregated_scores.png"):
         """
         Creates an img of the aggregated scores (eval)
         """
+        import matplotlib.pyplot as plt
+        import seaborn as sns
+
         sns.set_style("whitegrid")
         metrics = {
             'ROUGE-L': aggregated_scores['ROUGE']['rougeL'],